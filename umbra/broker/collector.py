@@ -1,17 +1,32 @@
+import os
+import sys
+import json
+import time
 import logging
 import aiohttp
 import asyncio
 import copy
+from array import array
 
 from google.protobuf import json_format
 from influxdb import InfluxDBClient
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from umbra.common.protobuf.umbra_pb2 import Status
 from umbra.broker.visualization import dashboard_template, panels_template
 
 
 logger = logging.getLogger(__name__)
 
+NAN = float("nan")
+
+# database where the results of the experiment events are stored
+EVENTS_DATABASE = "events"
+
 
 class GraphanaInterface:
     def __init__(self):
@@ -204,12 +219,35 @@ class GraphanaInterface:
         return reply
 
 
-class Collector:
+class Storage:
+    """Interface of the storage backends used by the Collector
+    to persist the measurements of each environment (database)
+
+    Points follow the influxdb write format, i.e., dicts with keys
+    measurement, tags, fields and (optional) time in ms.
+    """
+
     def __init__(self, info):
         self.info = info
+
+    async def init(self, database):
+        pass
+
+    def write(self, points, database):
+        return False, "Storage write not implemented"
+
+    def end(self, database):
+        pass
+
+    def close(self):
+        pass
+
+
+class InfluxDBStorage(Storage):
+    def __init__(self, info):
+        Storage.__init__(self, info)
         self.address = None
         self.influx_client = None
-        self.databases = {}
         self._is_connected = False
         self._gi = GraphanaInterface()
         self._lock = asyncio.Lock()
@@ -252,13 +290,23 @@ class Collector:
         if dbname in self.dbs():
             self.influx_client.drop_database(dbname)
 
-    def write(self, info, database):
+    async def init(self, database):
+        self.init_db(database)
+        logger.debug(f"New database: {database}")
+
+        await self.datasource(database)
+        logger.debug(f"New datasource: {database}")
+
+    def end(self, database):
+        self.end_db(database)
+
+    def write(self, points, database):
         if not self._is_connected:
             self.connect()
 
         if self._is_connected:
             self.influx_client.write_points(
-                info, database=database, time_precision="ms"
+                points, database=database, time_precision="ms"
             )
             err = ""
             return True, err
@@ -266,6 +314,324 @@ class Collector:
             err = "Could not write points do DB - not connected"
             return False, err
 
+    async def datasource(self, database):
+        async with self._lock:
+            info = {
+                "address": self.address,
+                "database": database,
+            }
+
+            await self._gi.add_datasource(info)
+            await self._gi.add_dashboard(info)
+
+
+class LocalSegment:
+    """Columnar buffer of one measurement time partition
+
+    Columns are kept as typed arrays and appended to one file
+    per column inside folder, so all the column files of a
+    partition have the same amount of rows:
+    - time.col: int64 (ms)
+    - <field>.col: float64 (NaN when the field is missing in a row)
+    - <name>.codes: int32 codes of dictionary encoded columns (tags
+    and non numeric fields), their values are listed in schema.json
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.rows = 0
+        self.schema = {
+            "byteorder": sys.byteorder,
+            "rows": 0,
+            "numeric": [],
+            "dictionary": {},
+        }
+        self._buffer_rows = 0
+        self._numeric = {}
+        self._codes = {}
+        self._time = array("q")
+        self._load()
+
+    def _path(self, filename):
+        return os.path.join(self.folder, filename)
+
+    def _load(self):
+        try:
+            os.makedirs(self.folder)
+        except FileExistsError:
+            try:
+                with open(self._path("schema.json"), "r") as f:
+                    self.schema = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Could not load segment schema {self.folder} - {e}")
+
+        self.rows = self.schema.get("rows", 0)
+        self._time = array("q")
+        self._numeric = {name: array("d") for name in self.schema["numeric"]}
+        self._codes = {name: array("i") for name in self.schema["dictionary"]}
+
+    def _new_numeric(self, name):
+        self.schema["numeric"].append(name)
+        self._numeric[name] = array("d", [NAN] * self._buffer_rows)
+
+        if self.rows:
+            with open(self._path(name + ".col"), "wb") as f:
+                array("d", [NAN] * self.rows).tofile(f)
+
+    def _new_dictionary(self, name):
+        self.schema["dictionary"][name] = []
+        self._codes[name] = array("i", [-1] * self._buffer_rows)
+
+        if self.rows:
+            with open(self._path(name + ".codes"), "wb") as f:
+                array("i", [-1] * self.rows).tofile(f)
+
+    def _encode(self, name, value):
+        values = self.schema["dictionary"][name]
+        try:
+            return values.index(value)
+        except ValueError:
+            values.append(value)
+            return len(values) - 1
+
+    def append(self, timestamp, tags, fields):
+        numeric, dictionary = {}, dict(tags)
+
+        for name, value in fields.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                numeric[name] = float(value)
+            else:
+                dictionary["field_" + name] = str(value)
+
+        for name in numeric:
+            if name not in self._numeric:
+                self._new_numeric(name)
+
+        for name in dictionary:
+            if name not in self._codes:
+                self._new_dictionary(name)
+
+        self._time.append(timestamp)
+
+        for name, column in self._numeric.items():
+            column.append(numeric.get(name, NAN))
+
+        for name, column in self._codes.items():
+            value = dictionary.get(name)
+            column.append(self._encode(name, value) if value is not None else -1)
+
+        self._buffer_rows += 1
+
+    def buffered(self):
+        return self._buffer_rows
+
+    def flush(self):
+        if not self._buffer_rows:
+            return
+
+        columns = [("time.col", self._time)]
+        columns.extend((name + ".col", col) for name, col in self._numeric.items())
+        columns.extend((name + ".codes", col) for name, col in self._codes.items())
+
+        for filename, column in columns:
+            with open(self._path(filename), "ab") as f:
+                column.tofile(f)
+            del column[:]
+
+        self.rows += self._buffer_rows
+        self._buffer_rows = 0
+        self.schema["rows"] = self.rows
+
+        with open(self._path("schema.json"), "w") as f:
+            json.dump(self.schema, f)
+
+
+class LocalStorage(Storage):
+    """Stores measurements in local columnar segments,
+    without the need of an influxdb instance
+
+    Layout: <folder>/<environment>/<measurement>/<partition>/
+    where partition is the start time (ms) of a time window
+    of PARTITION_SECONDS. See LocalSegment for the columns format
+    and read() to load them back (as numpy memmaps if numpy is
+    available, zero-copy, or python arrays otherwise).
+    """
+
+    FOLDER = "/tmp/umbra/metrics/"
+    PARTITION_SECONDS = 3600
+    FLUSH_ROWS = 1024
+    FLUSH_INTERVAL = 5.0
+
+    def __init__(self, info, folder=None):
+        Storage.__init__(self, info)
+        self.folder = folder if folder else info.get("storage_folder", self.FOLDER)
+        self._segments = {}
+        self._last_flush = time.monotonic()
+
+    def _partition(self, timestamp):
+        window = self.PARTITION_SECONDS * 1000
+        return timestamp - (timestamp % window)
+
+    def _segment(self, database, measurement, partition):
+        key = (database, measurement, partition)
+
+        if key not in self._segments:
+            folder = os.path.join(self.folder, database, measurement, str(partition))
+            self._segments[key] = LocalSegment(folder)
+
+        return self._segments[key]
+
+    def write(self, points, database):
+        now = int(time.time() * 1000)
+
+        try:
+            for point in points:
+                timestamp = point.get("time", now)
+                partition = self._partition(timestamp)
+                segment = self._segment(database, point.get("measurement"), partition)
+                segment.append(timestamp, point.get("tags", {}), point.get("fields"))
+
+            elapsed = time.monotonic() - self._last_flush
+            self.flush(force=elapsed >= self.FLUSH_INTERVAL)
+
+        except Exception as e:
+            err = f"Could not write points to local storage - {repr(e)}"
+            logger.debug(err)
+            return False, err
+
+        return True, ""
+
+    def flush(self, force=False):
+        for key, segment in list(self._segments.items()):
+            if force or segment.buffered() >= self.FLUSH_ROWS:
+                segment.flush()
+
+            current = self._partition(int(time.time() * 1000))
+            if key[2] < current and not segment.buffered():
+                del self._segments[key]
+
+        if force:
+            self._last_flush = time.monotonic()
+
+    def end(self, database):
+        for key, segment in list(self._segments.items()):
+            if key[0] == database:
+                segment.flush()
+                del self._segments[key]
+
+    def close(self):
+        self.flush(force=True)
+
+    def measurements(self, database):
+        folder = os.path.join(self.folder, database)
+        try:
+            return sorted(os.listdir(folder))
+        except OSError:
+            return []
+
+    def read(self, database, measurement, start=None, stop=None):
+        """Loads the columns of a measurement
+
+        Arguments:
+            database {string} -- The environment name
+            measurement {string} -- The measurement name
+
+        Keyword Arguments:
+            start {int} -- Only partitions holding time >= start (ms)
+            stop {int} -- Only partitions holding time < stop (ms)
+
+        Returns:
+            list -- One dict per partition (sorted by time) with keys
+            time, numeric (name: column), dictionary (name: (codes, values))
+        """
+        self.flush(force=True)
+
+        window = self.PARTITION_SECONDS * 1000
+        folder = os.path.join(self.folder, database, measurement)
+        partitions = []
+
+        try:
+            names = sorted(os.listdir(folder), key=int)
+        except OSError:
+            names = []
+
+        for name in names:
+            partition = int(name)
+            if start is not None and partition + window <= start:
+                continue
+            if stop is not None and partition >= stop:
+                continue
+
+            segment_folder = os.path.join(folder, name)
+            with open(os.path.join(segment_folder, "schema.json"), "r") as f:
+                schema = json.load(f)
+
+            rows = schema.get("rows", 0)
+            loaded = {
+                "time": self._load_column(segment_folder, "time.col", "q", rows),
+                "numeric": {},
+                "dictionary": {},
+            }
+
+            for column in schema.get("numeric", []):
+                loaded["numeric"][column] = self._load_column(
+                    segment_folder, column + ".col", "d", rows
+                )
+
+            for column, values in schema.get("dictionary", {}).items():
+                codes = self._load_column(segment_folder, column + ".codes", "i", rows)
+                loaded["dictionary"][column] = (codes, values)
+
+            partitions.append(loaded)
+
+        return partitions
+
+    def _load_column(self, folder, filename, typecode, rows):
+        path = os.path.join(folder, filename)
+
+        if np is not None:
+            dtypes = {"q": np.int64, "d": np.float64, "i": np.int32}
+            if rows == 0:
+                return np.empty(0, dtype=dtypes[typecode])
+            return np.memmap(path, dtype=dtypes[typecode], mode="r", shape=(rows,))
+
+        column = array(typecode)
+        with open(path, "rb") as f:
+            column.fromfile(f, rows)
+        return column
+
+
+class Collector:
+    STORAGES = {
+        "influxdb": InfluxDBStorage,
+        "local": LocalStorage,
+    }
+
+    def __init__(self, info):
+        self.info = info
+        self.databases = {}
+        self.storage = None
+        self.clocks = None
+        self.load_storage()
+
+    def set_clocks(self, clocks):
+        """Sets the clocks (see umbra.common.clock Clocks) of the
+        environments, so the timestamps of their samples are stored
+        in the broker clock
+        """
+        self.clocks = clocks
+
+    def load_storage(self):
+        name = self.info.get("storage") or "influxdb"
+        storage_cls = self.STORAGES.get(name)
+
+        if not storage_cls:
+            logger.info(f"Unknown storage {name} - using influxdb")
+            storage_cls = InfluxDBStorage
+
+        self.storage = storage_cls(self.info)
+        logger.info(f"Collector storage: {storage_cls.__name__}")
+
     async def parse_message(self, message):
         data = []
 
@@ -273,25 +639,29 @@ class Collector:
         environment = message["environment"]
 
         if environment not in self.databases:
-            self.init_db(environment)
-            logger.debug(f"New database: {environment}, {source}")
-
-            await self.datasource(environment)
-            logger.debug(f"New datasource: {environment}")
+            await self.storage.init(environment)
 
         self.databases[environment] = source
 
+        offset = 0
+        if self.clocks:
+            offset = int(self.clocks.offset(environment) * 1000)
+
         measurements = message.get("measurements", [])
         for measurement in measurements:
             frmt_measurement = {}
 
             fields = measurement.get("fields")
             frmt_fields = {}
+            timestamp = None
             for f, v in fields.items():
                 vvalue = v.get("value")
                 vtype = v.get("type")
 
-                if vtype == "int":
+                if vtype == "timestamp":
+                    timestamp = int(vvalue) - offset
+                    continue
+                elif vtype == "int":
                     value = int(vvalue)
                 elif vtype == "float":
                     value = float(vvalue)
@@ -309,6 +679,9 @@ class Collector:
                 "fields": frmt_fields,
             }
 
+            if timestamp is not None:
+                frmt_measurement["time"] = timestamp
+
             logger.debug(
                 f"Parsing measurement - database {environment} - measurement {measurement.get('name')}"
             )
@@ -317,15 +690,50 @@ class Collector:
 
         return data, environment
 
-    async def datasource(self, database):
-        async with self._lock:
-            info = {
-                "address": self.address,
-                "database": database,
-            }
+    def format_event(self, record):
+        fields = {
+            name: record.get(name)
+            for name in ["iteration", "duration", "lateness", "size"]
+        }
+        fields["scheduled"] = record.get("scheduled")
+        fields["finished"] = record.get("finished")
+
+        frmt_event = {
+            "measurement": "events",
+            "tags": {
+                "id": str(record.get("id")),
+                "category": str(record.get("category")),
+                "action": str(record.get("action")),
+                "outcome": str(record.get("outcome")),
+            },
+            "fields": fields,
+            "time": record.get("started"),
+        }
+        return frmt_event
 
-            await self._gi.add_datasource(info)
-            await self._gi.add_dashboard(info)
+    async def events(self, records, database=EVENTS_DATABASE):
+        """Stores the results of the experiment events (see EventsResults)
+
+        Arguments:
+            records {list} -- Event iteration records
+
+        Keyword Arguments:
+            database {string} -- Database name (default: {EVENTS_DATABASE})
+
+        Returns:
+            tuple -- (ack, error) of the storage write
+        """
+        if database not in self.databases:
+            await self.storage.init(database)
+            self.databases[database] = "broker"
+
+        data = [self.format_event(record) for record in records]
+        ack, err = self.storage.write(data, database)
+
+        if not ack:
+            logger.debug(f"Could not store events results - {err}")
+
+        return ack, err
 
     async def collect(self, message):
         msg = json_format.MessageToDict(message, preserving_proto_field_name=True)
@@ -334,7 +742,7 @@ class Collector:
         # logger.debug(f"{msg}")
 
         data, database = await self.parse_message(msg)
-        ack, err = self.write(data, database)
+        ack, err = self.storage.write(data, database)
 
         reply = Status(info=str(ack).encode("utf-8"), error=err)
         return reply
@@ -16,6 +16,8 @@ class Broker(BrokerBase):
         self.info = info
         self.operator = Operator(info)
         self.collector = Collector(info)
+        self.operator.events_results.set_sink(self.collector.events)
+        self.collector.set_clocks(self.operator.clocks)
 
     async def Execute(self, stream):
         request = await stream.recv_message()
@@ -1,3 +1,5 @@
+import time
+import heapq
 import logging
 import json
 import asyncio
@@ -12,9 +14,11 @@ from google.protobuf import json_format
 from umbra.common.protobuf.umbra_grpc import ScenarioStub, MonitorStub
 from umbra.common.protobuf.umbra_pb2 import Report, Workflow, Directrix, Status
 
-from umbra.common.scheduler import Handler
+from umbra.common.clock import Clocks
+from umbra.common.scheduler import Handler, QueueHandler
 from umbra.design.basis import Topology, Experiment
 
+from umbra.broker.results import EventsResults
 from umbra.broker.plugins.scenario import ScenarioEvents
 
 from umbra.broker.plugins.fabric import FabricEvents
@@ -23,17 +27,41 @@ from umbra.broker.plugins.iroha import IrohaEvents
 logger = logging.getLogger(__name__)
 
 
+# max seconds the scenarios wait for their nodes to be ready
+READINESS_TIMEOUT = 120.0
+
+# seconds between retrievals of the scenario events executed ahead of time
+DISPATCH_POLL = 5.0
+# max seconds waiting for the executions after the last trigger time
+DISPATCH_MARGIN = 30.0
+
+
 class Operator:
+    HANDLERS = {
+        "default": Handler,
+        "queue": QueueHandler,
+    }
+
     def __init__(self, info):
         self.info = info
         self.experiment = None
         self.topology = None
         self.plugins = {}
-        self.events_handler = Handler()
+        self.events_handler = self.load_handler()
         self.events_fabric = FabricEvents()
         self.events_iroha = IrohaEvents()
-        self.events_scenario = ScenarioEvents()
-        self.events_results = {}
+        self.clocks = Clocks()
+        self.events_scenario = ScenarioEvents(self.clocks)
+        self.events_results = EventsResults()
+        self.readiness = {}
+        self.timelines = {}
+        self.restored = None
+
+    def load_handler(self):
+        name = self.info.get("scheduler") or "default"
+        handler_cls = self.HANDLERS.get(name, Handler)
+        logger.info(f"Events scheduler: {handler_cls.__name__}")
+        return handler_cls()
 
     def parse_bytes(self, msg):
         msg_dict = {}
@@ -54,7 +82,7 @@ class Operator:
 
         return msg_bytes
 
-    async def call_monitor(self, address, data):
+    async def call_monitor(self, address, data, env=None):
         logger.info(f"Calling Monitor - {address}")
 
         directrix = json_format.ParseDict(data, Directrix())
@@ -63,7 +91,9 @@ class Operator:
         try:
             channel = Channel(host, port)
             stub = MonitorStub(channel)
+            sent = time.time()
             status = await stub.Measure(directrix)
+            self.clocks.sample(env, sent, time.time(), status)
 
         except Exception as e:
             ack = False
@@ -141,14 +171,16 @@ class Operator:
         for env, info in stats.items():
             data = self.build_monitor_directrix(env, info, action)
             address = self.get_monitor_env_address(env)
-            ack, info = await self.call_monitor(address, data)
+            ack, info = await self.call_monitor(address, data, env=env)
             all_acks[env] = ack
 
         all_monitors_ack = all(all_acks.values())
         logger.info(f"Call monitors - action {action} - status: {all_monitors_ack}")
         return all_monitors_ack
 
-    async def call_scenario(self, uid, action, topology, address):
+    async def call_scenario(
+        self, uid, action, topology, address, timeout=None, env=None
+    ):
         logger.info(f"Calling Experiment - {action}")
 
         scenario = self.serialize_bytes(topology)
@@ -160,7 +192,9 @@ class Operator:
         try:
             channel = Channel(host, port)
             stub = ScenarioStub(channel)
-            status = await stub.Establish(deploy)
+            sent = time.time()
+            status = await stub.Establish(deploy, timeout=timeout)
+            self.clocks.sample(env, sent, time.time(), status)
 
         except Exception as e:
             ack = False
@@ -185,7 +219,7 @@ class Operator:
 
         return ack, info
 
-    async def call_scenarios(self, uid, topology, action):
+    async def call_scenarios(self, uid, topology, action, snapshot=None):
         envs = topology.get_environments()
         topo_envs = topology.build_environments()
 
@@ -205,9 +239,13 @@ class Operator:
                 env_address = scenario_component.get("address")
 
                 env_topo = topo_envs.get(env)
+                if snapshot:
+                    env_topo = dict(env_topo, snapshot=snapshot)
+                if env_data.get("cpusets") and action == "start":
+                    env_topo = dict(env_topo, cpusets=env_data.get("cpusets"))
 
                 ack, topo_info = await self.call_scenario(
-                    uid, action, env_topo, env_address
+                    uid, action, env_topo, env_address, env=env
                 )
 
                 acks[env] = ack
@@ -235,9 +273,74 @@ class Operator:
         finally:
             return ack
 
+    async def restore_phase(self, uid, topology):
+        """Gets the latest setup phase (see Experiment snapshot) whose
+        snapshot is available in all the environments scenarios
+
+        Arguments:
+            uid {string} -- The experiment id
+            topology {Topology} -- The experiment topology
+
+        Returns:
+            string -- The phase name (None if no snapshot is available)
+        """
+        phases = [
+            snapshot.get("phase")
+            for snapshot in self.experiment.snapshots
+            if snapshot.get("restore")
+        ]
+
+        if not phases:
+            return None
+
+        acks, infos = await self.call_scenarios(
+            uid, topology, "snapshots", snapshot={"phases": phases}
+        )
+
+        if not all(acks.values()):
+            return None
+
+        available = [
+            phase
+            for phase in phases
+            if all(phase in info.get("available", []) for info in infos.values())
+        ]
+
+        phase = available[-1] if available else None
+        logger.info(f"Snapshot phases available: {available} - restoring {phase}")
+        return phase
+
+    def skipped_events(self):
+        """Gets the ids of the events not scheduled, as they belong
+        to the phases up to the restored one (and their snapshots)
+        """
+        skipped = set()
+
+        if self.restored:
+            for snapshot in self.experiment.snapshots:
+                skipped.update(str(ev_id) for ev_id in snapshot.get("events", []))
+                skipped.add(str(snapshot.get("event")))
+
+                if snapshot.get("phase") == self.restored:
+                    break
+
+        return skipped
+
     async def start(self, uid):
         topology = self.experiment.get_topology()
-        acks, stats = await self.call_scenarios(uid, topology, "start")
+
+        phase = await self.restore_phase(uid, topology)
+        snapshot = {"restore": phase} if phase else None
+        acks, stats = await self.call_scenarios(
+            uid, topology, "start", snapshot=snapshot
+        )
+
+        self.restored = None
+        if phase:
+            if all(env_info.get("restored") == phase for env_info in stats.values()):
+                self.restored = phase
+            else:
+                logger.info(f"Snapshot {phase} not restored in all environments")
 
         info, error = {}, {}
         if all(acks.values()):
@@ -268,12 +371,27 @@ class Operator:
         report = Report(id=uid, info=info_msg, error=error_msg)
         return report
 
+    def results(self, uid, config_message):
+        options = self.parse_bytes(config_message)
+        since = options.get("since", 0)
+        info = {
+            "events": self.events_results.export(since),
+            "scheduler": self.events_handler.stats(),
+            "readiness": self.readiness,
+            "clocks": self.clocks.info(),
+        }
+        report = self.build_report(uid, info, {})
+        return report
+
     async def execute(self, config):
         uid = config.id
         action = config.action
         scenario = config.scenario
 
-        if self.load(scenario):
+        if action == "results":
+            report = self.results(uid, scenario)
+
+        elif self.load(scenario):
 
             info, error = {}, {}
 
@@ -281,7 +399,7 @@ class Operator:
                 info, error = await self.start(uid)
 
                 if not error:
-                    await self.call_events(info)
+                    await self.call_events(uid, info)
 
             elif action == "stop":
                 info, error = await self.stop(uid)
@@ -327,27 +445,188 @@ class Operator:
         self.plugins["scenario"] = self.events_scenario
 
     async def handle_events(self, events):
-        events_calls = {}
-
-        for evs in events.values():
-            evs_formatted = {ev_id: ev for ev_id, ev in evs.items()}
-            events_calls.update(evs_formatted)
+        def begin(event_call):
+            _, (_, sched) = event_call
+            return sched.get("from", 0)
+
+        events_calls = heapq.merge(*events.values(), key=begin)
+
+        if not isinstance(self.events_handler, QueueHandler):
+            events_calls = dict(events_calls)
+
+        # events of the restored phase are not scheduled, but the ones
+        # after them (after/when) must still be released
+        await self.events_handler.run(
+            events_calls,
+            record=self.events_results.add,
+            completed=sorted(self.skipped_events()),
+        )
+
+    def schedule_events(self, name, plugin, events):
+        """Lazily expands (see Events.expand) and schedules the
+        events of a plugin
+
+        Arguments:
+            name {string} -- The plugin name (events category)
+            plugin {object} -- The plugin that creates the events calls
+            events {list} -- The plugin events
+
+        Returns:
+            generator -- Tuples (event id, (call, schedule)) in order of
+            schedule from
+        """
+        for event in self.experiment.events.expand(events):
+            action = event.get("event", {}).get("action")
+            self.events_results.register(event.get("id"), name, action)
+
+            plugin_sched_evs = plugin.schedule([event])
+            for ev_id, ev_call in plugin_sched_evs.items():
+                yield ev_id, ev_call
+
+    def dispatch_ahead(self, events, start):
+        """Splits the scenario events into the ones dispatched ahead
+        of time to the scenarios (with absolute trigger times) and the
+        ones that must be called by the scheduler, i.e., the events
+        with dependencies (after/when) or that other events depend on
+
+        Arguments:
+            events {list} -- The scenario events
+            start {float} -- Time (epoch seconds) the events begin
+
+        Returns:
+            list -- The events to be called by the scheduler
+        """
+        referred = set()
+        for event in self.experiment.events.get().values():
+            after = event.get("schedule", {}).get("after")
+            after = after if isinstance(after, list) else [after]
+            referred.update(str(dep) for dep in after if dep is not None)
+
+        ahead, called = [], []
+        for event in self.experiment.events.expand(events):
+            sched = event.get("schedule", {})
+            depends = sched.get("after") or sched.get("when")
+            depends = depends or event.get("event", {}).get("group") == "snapshot"
+
+            if depends or str(event.get("id")) in referred:
+                called.append(event)
+            else:
+                action = event.get("event", {}).get("action")
+                self.events_results.register(event.get("id"), "scenario", action)
+                ahead.append(event)
 
-        self.events_results = await self.events_handler.run(events_calls)
+        self.timelines = self.events_scenario.timeline(ahead, start)
+        logger.info(
+            f"Scenario events dispatched ahead: {len(ahead)} - called: {len(called)}"
+        )
+        return called
 
-    def schedule_plugins(self):
+    def schedule_plugins(self, start=None):
         sched_events = {}
+        dispatch = self.info.get("dispatch") or "call"
+        skipped = self.skipped_events()
 
         for name, plugin in self.plugins.items():
             logger.info("Scheduling plugin %s events", name)
             events = self.experiment.events.get_by_category(name)
+
+            if skipped:
+                logger.info(f"Events of restored phase {self.restored}: {skipped}")
+                events = [ev for ev in events if str(ev.get("id")) not in skipped]
+
+            if name == "scenario" and dispatch == "ahead":
+                events = self.dispatch_ahead(events, start or time.time())
+
             logger.info(f"Scheduling {len(events)} events: {events}")
-            plugin_sched_evs = plugin.schedule(events)
-            sched_events[plugin] = plugin_sched_evs
+            sched_events[plugin] = self.schedule_events(name, plugin, events)
 
         return sched_events
 
-    async def call_events(self, info_deploy):
+    async def call_readiness(self, uid, topology, timeout=READINESS_TIMEOUT):
+        """Waits (concurrently) for the nodes of all environments
+        to pass their readiness probes, releasing the events waiting
+        on the condition ready (see scheduler Handler release)
+
+        Arguments:
+            uid {string} -- The experiment id
+            topology {Topology} -- The experiment topology
+
+        Keyword Arguments:
+            timeout {float} -- Max seconds to wait for the nodes (default: {READINESS_TIMEOUT})
+
+        Returns:
+            bool -- If all nodes are ready
+        """
+        envs = topology.get_environments()
+        topo_envs = topology.build_environments()
+        options = {"timeout": timeout}
+
+        calls = {}
+        for env in topo_envs:
+            if env in envs:
+                env_components = envs.get(env).get("components")
+                env_address = env_components.get("scenario").get("address")
+                calls[env] = self.call_scenario(
+                    uid, "ready", options, env_address, timeout=timeout + 5, env=env
+                )
+
+        outputs = await asyncio.gather(*calls.values())
+        self.readiness = {
+            env: {"ready": ack, "info": info}
+            for env, (ack, info) in zip(calls, outputs)
+        }
+
+        ready = all(ack for ack, _ in outputs)
+        logger.info(f"Environments readiness: {ready} - {self.readiness}")
+
+        self.events_handler.release("ready", ok=ready)
+        return ready
+
+    async def call_timeline(self, env, entries):
+        """Dispatches the timeline of events to a scenario and
+        retrieves (every DISPATCH_POLL) the records of the events it
+        executed, until all of them are reported or DISPATCH_MARGIN
+        seconds after the last trigger time
+
+        Arguments:
+            env {string} -- The scenario environment
+            entries {list} -- The scenario timeline entries
+
+        Returns:
+            int -- The amount of events executed reported
+        """
+        ack, info = await self.events_scenario.dispatch(env, entries)
+        if not ack:
+            logger.info(f"Could not dispatch events to scenario {env} - {info}")
+            return 0
+
+        deadline = max(entry.get("at") for entry in entries) + DISPATCH_MARGIN
+        since, reported = 0, 0
+
+        while reported < len(entries) and time.time() < deadline:
+            await asyncio.sleep(DISPATCH_POLL)
+            ack, info = await self.events_scenario.executed(env, since)
+
+            if not ack:
+                continue
+
+            for record in info.get("events", []):
+                since = max(since, record.pop("seq"))
+                self.events_results.add(record.pop("id"), record)
+                reported += 1
+
+        logger.info(f"Scenario {env} executed {reported}/{len(entries)} events")
+        return reported
+
+    async def call_timelines(self):
+        calls = [
+            self.call_timeline(env, entries)
+            for env, entries in self.timelines.items()
+            if entries
+        ]
+        await asyncio.gather(*calls)
+
+    async def call_events(self, uid, info_deploy):
         logger.info("Scheduling events")
 
         # info_topology = info_deploy.get("topology")
@@ -357,8 +636,16 @@ class Operator:
         # topo.fill_hosts_config(info_hosts)
         # self.topology = topo
         self.config_plugins()
+        self.events_results.clear()
+        self.events_handler.clear_conditions()
+        self.events_handler.release("deployed")
+        self.readiness = {}
+        asyncio.create_task(self.call_readiness(uid, self.experiment.get_topology()))
+
+        start = time.time()
+        sched_events = self.schedule_plugins(start)
+        asyncio.create_task(self.call_timelines())
 
-        sched_events = self.schedule_plugins()
         # await self.handle_events(sched_events)
         coro_events = self.handle_events(sched_events)
         asyncio.create_task(coro_events)
\ No newline at end of file
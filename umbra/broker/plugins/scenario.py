@@ -1,3 +1,5 @@
+import time
+import asyncio
 import logging
 import json
 from datetime import datetime
@@ -5,6 +7,9 @@ from grpclib.client import Channel
 
 from umbra.common.protobuf.umbra_grpc import ScenarioStub
 from umbra.common.protobuf.umbra_pb2 import Report, Workflow
+from umbra.common.clock import Clocks
+
+from umbra.scenario.timeline import triggers
 
 
 logger = logging.getLogger(__name__)
@@ -17,9 +22,10 @@ class ScenarioEvents:
     and schedule it to run using umbra/common/scheduler component
     """
 
-    def __init__(self):
+    def __init__(self, clocks=None):
         self.topo = None
         self.envs = None
+        self.clocks = clocks if clocks else Clocks()
 
     def config(self, topo):
         logger.info("Configuring scenario plugin")
@@ -53,7 +59,9 @@ class ScenarioEvents:
 
     def get_event_scenario_address(self, event):
         env = self.get_event_environment(event)
+        return self.get_env_scenario_address(env)
 
+    def get_env_scenario_address(self, env):
         if env:
             env_data = self.envs.get(env)
             env_components = env_data.get("components")
@@ -69,6 +77,13 @@ class ScenarioEvents:
         for event in events:
             ev_id = event.get("id")
             ev_data = event.get("event")
+
+            if ev_data.get("group") == "snapshot":
+                logger.info(f"Scheduling scenario snapshot event {event}")
+                action_call = self.call_snapshot(event)
+                evs_sched[ev_id] = (action_call, event.get("schedule"))
+                continue
+
             address = self.get_event_scenario_address(ev_data)
 
             if address:
@@ -82,6 +97,76 @@ class ScenarioEvents:
 
         return evs_sched
 
+    def timeline(self, events, start):
+        """Builds the timeline of the events of each scenario,
+        to be dispatched ahead of time (see umbra.scenario.timeline)
+
+        Arguments:
+            events {list} -- The scenario events
+            start {float} -- Time (epoch seconds) the events timeline begins
+
+        Returns:
+            dict -- The timeline entries (id, iteration, at, event)
+            indexed by environment, with times in the broker clock
+        """
+        timelines = {}
+
+        for event in events:
+            ev_data = event.get("event")
+            env = self.get_event_environment(ev_data)
+
+            if not self.get_env_scenario_address(env):
+                logger.info(
+                    f"Could not dispatch scenario event - environment address not found for {event}"
+                )
+                continue
+
+            entries = timelines.setdefault(env, [])
+            ats = triggers(start, event.get("schedule", {}))
+
+            for iteration, at in enumerate(ats):
+                entry = {
+                    "id": event.get("id"),
+                    "iteration": iteration,
+                    "at": at,
+                    "event": ev_data,
+                }
+                entries.append(entry)
+
+        return timelines
+
+    async def dispatch(self, env, entries):
+        """Dispatches the timeline entries to the environment scenario,
+        with the trigger times converted to the scenario clock
+        """
+        address = self.get_env_scenario_address(env)
+        logger.info(f"Dispatching {len(entries)} scenario events to {address}")
+
+        remote_entries = []
+        for entry in entries:
+            remote_entry = dict(entry)
+            remote_entry["at"] = self.clocks.to_remote(env, entry.get("at"))
+            remote_entries.append(remote_entry)
+
+        data = {"events": remote_entries}
+        return await self.call(address, "timeline", "schedule", data, env=env)
+
+    async def executed(self, env, since=0):
+        """Retrieves the records of the events executed by the
+        environment scenario, with times converted to the broker clock
+        """
+        address = self.get_env_scenario_address(env)
+        data = {"since": since}
+        ack, info = await self.call(address, "timeline", "executed", data, env=env)
+
+        if ack:
+            offset = int(self.clocks.offset(env) * 1000)
+            for record in info.get("events", []):
+                for field in ["scheduled", "started", "finished"]:
+                    record[field] = record.get(field) - offset
+
+        return ack, info
+
     def parse_bytes(self, msg):
         msg_dict = {}
 
@@ -107,22 +192,44 @@ class ScenarioEvents:
 
         logger.debug(f"Event scenario: {ev_data}")
         logger.debug(f"Event scenario to: {address}")
-        
+
+        env = self.get_event_environment(ev_data)
+        return await self.call(address, str(ev_id), "update", ev_data, env=env)
+
+    async def call_snapshot(self, event):
+        """Calls the snapshot of a phase in all the environment scenarios"""
+        ev_id = event.get("id")
+        ev_data = event.get("event")
+
+        calls = {}
+        for env in self.envs:
+            address = self.get_env_scenario_address(env)
+            if address:
+                calls[env] = self.call(address, str(ev_id), "update", ev_data, env=env)
+
+        outputs = await asyncio.gather(*calls.values())
+        ack = all(ack for ack, _ in outputs)
+        info = {env: info for env, (_, info) in zip(calls, outputs)}
+        return ack, info
+
+    async def call(self, address, uid, action, data, env=None):
+        channel = None
+
         try:
-            event_bytes = self.serialize_bytes(ev_data)
-            deploy = Workflow(id=str(ev_id), action="update", scenario=event_bytes)       
+            data_bytes = self.serialize_bytes(data)
+            deploy = Workflow(id=uid, action=action, scenario=data_bytes)
             deploy.timestamp.FromDatetime(datetime.now())
-            
+
             host, port = address.split(":")
             channel = Channel(host, port)
             stub = ScenarioStub(channel)
+            sent = time.time()
             status = await stub.Establish(deploy)
+            self.clocks.sample(env, sent, time.time(), status)
         except Exception as e:
             ack = False
             info = repr(e)
-            logger.info(
-                f"Error - event scenario failed - exceptio {info}"
-            )
+            logger.info(f"Error - event scenario failed - exceptio {info}")
         else:
             if status.error:
                 ack = False
@@ -136,6 +243,7 @@ class ScenarioEvents:
                     info = {}
                 logger.info(f"Event scenario ok: {info}")
         finally:
-            channel.close()
+            if channel:
+                channel.close()
 
         return ack, info
@@ -0,0 +1,81 @@
+import logging
+import asyncio
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+
+# max amount of event iteration records kept by the broker
+RESULTS_MAX_RECORDS = 100000
+
+
+class EventsResults:
+    """Structured log of the results of the experiment events
+
+    Each event iteration executed by the scheduler is kept as a
+    record with: seq (order of arrival), id, category, action,
+    iteration, scheduled/started/finished times (ms), duration (s),
+    lateness (s, started - scheduled), outcome and size (of the
+    event output). Records are kept in memory (bounded by
+    max_records) to be exported by the broker, and handed to a
+    sink (e.g., the collector) as they arrive.
+    """
+
+    def __init__(self, max_records=RESULTS_MAX_RECORDS):
+        self._records = deque(maxlen=max_records)
+        self._events = {}
+        self._seq = 0
+        self._sink = None
+
+    def set_sink(self, sink):
+        self._sink = sink
+
+    def clear(self):
+        self._records.clear()
+        self._events = {}
+
+    def register(self, uid, category, action):
+        self._events[uid] = {"category": category, "action": action}
+
+    def add(self, uid, info):
+        """Adds the record of an event iteration
+
+        Arguments:
+            uid {string} -- The event id
+            info {dict} -- The event iteration timing and outcome
+            (as provided by the scheduler Handler)
+
+        Returns:
+            dict -- The record added
+        """
+        self._seq += 1
+
+        record = {"seq": self._seq, "id": uid}
+        record.update(self._events.get(uid, {}))
+        record.update(info)
+        record["lateness"] = (info.get("started") - info.get("scheduled")) / 1000.0
+
+        self._records.append(record)
+        logger.debug(f"Event result: {record}")
+
+        if self._sink:
+            try:
+                output = self._sink([record])
+                if asyncio.iscoroutine(output):
+                    asyncio.ensure_future(output)
+            except Exception as e:
+                logger.debug(f"Could not sink event result - {repr(e)}")
+
+        return record
+
+    def export(self, since=0):
+        """Exports the records kept
+
+        Keyword Arguments:
+            since {int} -- Only records with seq bigger than since (default: {0})
+
+        Returns:
+            list -- The records
+        """
+        return [record for record in self._records if record["seq"] > since]
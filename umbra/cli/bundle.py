@@ -0,0 +1,299 @@
+import os
+import stat
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tarfile
+import subprocess
+
+import docker
+
+from umbra import __version__
+from umbra.common import dockers
+
+
+logger = logging.getLogger(__name__)
+
+
+BUNDLE_FOLDER = "/tmp/umbra/bundles/"
+# folder the bundles are copied to in the environments hosts
+BUNDLE_REMOTE_FOLDER = "/tmp/umbra/bundles"
+BUNDLE_CHECKSUMS = "SHA256SUMS"
+BUNDLE_MANIFEST = "bundle.json"
+BUNDLE_INSTALL = "install.sh"
+BUNDLE_CHUNK = 1024 * 1024
+BUNDLE_SOURCE_EXCLUDE = [".git", "__pycache__", "build", "dist", ".pytest_cache"]
+
+# python packages installed by deps/deps.sh and deps/deps_<model>.sh from git
+BUNDLE_PACKAGES_DEPS = ["git+https://github.com/raphaelvrosa/containernet"]
+BUNDLE_PACKAGES = {
+    "fabric": ["git+https://github.com/hyperledger/fabric-sdk-py"],
+    "iroha": ["git+https://github.com/hyperledger/iroha-python"],
+}
+# binaries of each model, looked up in the PATH and in deps/<model>
+BUNDLE_BINARIES = {
+    "fabric": ["cryptogen", "configtxgen"],
+}
+# images of the umbra components, besides the ones of the topology nodes
+BUNDLE_IMAGES = ["influxdb:latest", "grafana/grafana:latest"]
+# python of the environments (see deps/), the wheelhouse is built with
+# the same one so the wheels ABI tags match the ones it installs
+BUNDLE_PYTHON = "python3.8"
+
+# runs in the environment host, from the bundle folder (as root)
+BUNDLE_INSTALL_SCRIPT = f"""#!/bin/bash
+set -e
+cd "$(dirname "$0")"
+
+echo "Verifying bundle checksums"
+sha256sum --quiet -c SHA256SUMS
+
+echo "Installing umbra source files"
+mkdir -p /tmp/umbra/source /tmp/umbra/logs
+tar -xzf source.tar.gz -C /tmp/umbra/source
+
+echo "Installing python packages (wheelhouse)"
+{BUNDLE_PYTHON} -m pip install --no-index --find-links wheelhouse wheelhouse/*.whl
+
+if [ -d bin ] && [ -n "$(ls -A bin)" ]; then
+    echo "Installing binaries"
+    install -m 755 bin/* /usr/local/bin/
+fi
+
+if [ -d images ] && [ -n "$(ls -A images)" ]; then
+    echo "Loading docker images"
+    for image in images/*.tar; do
+        docker load -i "$image"
+    done
+fi
+"""
+
+
+def file_digest(filepath):
+    digest = hashlib.sha256()
+
+    with open(filepath, "rb") as infile:
+        for chunk in iter(lambda: infile.read(BUNDLE_CHUNK), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def topology_images(topology):
+    """Lists the docker images of the containers of a topology
+
+    Arguments:
+        topology {Topology} -- The topology (loaded or built)
+
+    Returns:
+        list -- The images names sorted
+    """
+    images = set()
+    graph = getattr(topology, "graph", None)
+
+    if graph is not None:
+        for _, data in graph.nodes(data=True):
+            if data.get("type") == "container" and data.get("image"):
+                images.add(data.get("image"))
+
+    return sorted(images)
+
+
+class Bundle:
+    """Builds a self-contained install artifact of umbra for a
+    model (fabric/iroha), so environments are installed without
+    network access, cloning and building everything in each host
+
+    A bundle folder contains the umbra source files (for the make
+    targets of the environments, e.g., the aux monitor), a
+    wheelhouse with umbra and all its python dependencies, the
+    model binaries (e.g., cryptogen), the docker images (saved
+    tarballs), the install script, and the checksums (sha256sum
+    format) of all of them, verified before installing.
+    The bundle is built once, and reused while its checksums hold
+    and its manifest lists the same images.
+    """
+
+    def __init__(self, model, images=None, folder=BUNDLE_FOLDER, source=None):
+        """
+        Arguments:
+            model {string} -- The model of the topology (fabric/iroha)
+
+        Keyword Arguments:
+            images {list} -- Docker images of the topology (default: {None})
+            folder {string} -- Folder where bundles are built (default: {BUNDLE_FOLDER})
+            source {string} -- Umbra source folder, the one of this
+            package if None (default: {None})
+        """
+        self.model = model if model else ""
+        self.images = sorted(set(BUNDLE_IMAGES + list(images if images else [])))
+        self.source = (
+            source
+            if source
+            else os.path.normpath(os.path.join(os.path.dirname(__file__), "../.."))
+        )
+        images_digest = hashlib.sha256("\n".join(self.images).encode()).hexdigest()
+        self.name = "-".join(
+            filter(None, ["umbra", __version__, self.model, images_digest[:12]])
+        )
+        self.path = os.path.join(folder, self.name)
+
+    def _source(self):
+        def exclude(tarinfo):
+            name = os.path.basename(tarinfo.name)
+            return None if name in BUNDLE_SOURCE_EXCLUDE else tarinfo
+
+        filepath = os.path.join(self.path, "source.tar.gz")
+        with tarfile.open(filepath, "w:gz") as archive:
+            archive.add(self.source, arcname=".", filter=exclude)
+
+    def _wheelhouse(self):
+        wheelhouse = os.path.join(self.path, "wheelhouse")
+        os.makedirs(wheelhouse, exist_ok=True)
+
+        packages = (
+            [self.source] + BUNDLE_PACKAGES_DEPS + BUNDLE_PACKAGES.get(self.model, [])
+        )
+
+        python = shutil.which(BUNDLE_PYTHON)
+        if not python:
+            raise OSError(f"python {BUNDLE_PYTHON} not found")
+
+        args = [python, "-m", "pip", "wheel", "-w", wheelhouse] + packages
+        logger.info(f"Building bundle wheelhouse - {args}")
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+
+    def _binaries(self):
+        folder = os.path.join(self.path, "bin")
+        os.makedirs(folder, exist_ok=True)
+        deps_folder = os.path.join(self.source, "deps", self.model)
+
+        for binary in BUNDLE_BINARIES.get(self.model, []):
+            filepath = shutil.which(binary) or shutil.which(binary, path=deps_folder)
+            if not filepath:
+                raise OSError(f"binary {binary} not found")
+            shutil.copy2(filepath, os.path.join(folder, binary))
+
+    def _images(self):
+        folder = os.path.join(self.path, "images")
+        os.makedirs(folder, exist_ok=True)
+        client = dockers.client()
+
+        for image in self.images:
+            filename = image.replace("/", "_").replace(":", "_") + ".tar"
+            logger.info(f"Saving bundle docker image {image}")
+            with open(os.path.join(folder, filename), "wb") as outfile:
+                for chunk in client.images.get(image).save(named=True):
+                    outfile.write(chunk)
+
+    def _files(self):
+        files = []
+
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                relpath = os.path.relpath(os.path.join(dirpath, filename), self.path)
+                if relpath != BUNDLE_CHECKSUMS:
+                    files.append(relpath)
+
+        return files
+
+    def _checksums(self):
+        lines = [
+            f"{file_digest(os.path.join(self.path, relpath))}  {relpath}\n"
+            for relpath in self._files()
+        ]
+
+        with open(os.path.join(self.path, BUNDLE_CHECKSUMS), "w") as outfile:
+            outfile.writelines(lines)
+
+    def _manifest(self):
+        filepath = os.path.join(self.path, BUNDLE_MANIFEST)
+
+        try:
+            with open(filepath, "r") as infile:
+                return json.load(infile)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Bundle manifest not loaded - exception {repr(e)}")
+            return {}
+
+    def verify(self):
+        """Checks the bundle files against its checksums, and its
+        manifest images against the ones of the bundle
+
+        Returns:
+            bool -- If all the files (and only them) match their
+            checksums, and the bundle has the same images
+        """
+        filepath = os.path.join(self.path, BUNDLE_CHECKSUMS)
+        if not os.path.isfile(filepath):
+            return False
+
+        if self._manifest().get("images") != self.images:
+            return False
+
+        checksums = {}
+        with open(filepath, "r") as infile:
+            for line in infile:
+                digest, relpath = line.rstrip("\n").split("  ", 1)
+                checksums[relpath] = digest
+
+        if sorted(checksums) != sorted(self._files()):
+            return False
+
+        return all(
+            file_digest(os.path.join(self.path, relpath)) == digest
+            for relpath, digest in checksums.items()
+        )
+
+    def build(self, rebuild=False):
+        """Builds the bundle, unless a valid one (same umbra version,
+        model and images) was already built
+
+        Keyword Arguments:
+            rebuild {bool} -- Builds it even if already built (default: {False})
+
+        Returns:
+            tuple -- (bool, string) If the bundle was built, and its
+            folder path or the error
+        """
+        if not rebuild and self.verify():
+            logger.info(f"Bundle {self.name} already built at {self.path}")
+            return True, self.path
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path)
+
+        try:
+            self._source()
+            self._wheelhouse()
+            self._binaries()
+            self._images()
+        except (
+            OSError,
+            subprocess.CalledProcessError,
+            docker.errors.DockerException,
+        ) as e:
+            logger.info(f"Bundle {self.name} not built - exception {repr(e)}")
+            return False, repr(e)
+
+        install_path = os.path.join(self.path, BUNDLE_INSTALL)
+        with open(install_path, "w") as outfile:
+            outfile.write(BUNDLE_INSTALL_SCRIPT)
+        os.chmod(install_path, os.stat(install_path).st_mode | stat.S_IEXEC)
+
+        manifest = {
+            "name": self.name,
+            "version": __version__,
+            "model": self.model,
+            "images": self.images,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(os.path.join(self.path, BUNDLE_MANIFEST), "w") as outfile:
+            json.dump(manifest, outfile, indent=4)
+
+        self._checksums()
+        logger.info(f"Bundle {self.name} built at {self.path}")
+        return True, self.path
@@ -1,28 +1,66 @@
 import os
 import json
+import time
 import logging
 import paramiko
 import traceback
 import asyncio
 import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from scp import SCPClient, SCPException
 
 from umbra.cli.output import print_cli
+from umbra.cli.sync import Sync
+from umbra.cli.bundle import BUNDLE_REMOTE_FOLDER
 
 
 logger = logging.getLogger(__name__)
 
 
+# seconds between keepalive messages of persistent ssh sessions
+SSH_KEEPALIVE = 30
+# seconds between checks of a remote command output
+SSH_POLL = 0.05
+SSH_CHUNK = 32768
+
+
 class RemotePlugin:
-    def __init__(self):
+    """Executes commands on a remote host over a persistent ssh
+    session: the connection (transport) is kept open across
+    commands, each command runs in its own channel over it
+    """
+
+    def __init__(self, name=None):
         self._cfg = None
         self._client = None
+        self.name = name
 
     def cfg(self, cfg):
         logger.debug(f"ProxyPlugin cfg set: {cfg}")
+        if cfg != self._cfg:
+            self.close()
         self._cfg = cfg
 
+    def _connected(self):
+        if self._client:
+            transport = self._client.get_transport()
+            return transport is not None and transport.is_active()
+        return False
+
+    def close(self):
+        if self._client:
+            try:
+                self._client.close()
+            except Exception as e:
+                logger.debug(f"ssh close exception: {e}")
+            self._client = None
+
     def _connect(self):
+        if self._connected():
+            return True
+
+        self.close()
         connect_flag = True
         try:
             self._client = paramiko.SSHClient()
@@ -37,6 +75,7 @@ class RemotePlugin:
                 look_for_keys=False,
                 timeout=60,
             )
+            self._client.get_transport().set_keepalive(SSH_KEEPALIVE)
 
         except Exception as e:
             logger.debug(f"ssh connect exception: {e.__class__}, {e}")
@@ -53,6 +92,45 @@ class RemotePlugin:
         finally:
             return connect_flag
 
+    def _stream(self, channel):
+        """Reads the output of a command channel until it exits,
+        logging each stdout line (prefixed by the plugin name) as
+        soon as it arrives
+
+        Arguments:
+            channel {paramiko.Channel} -- The command channel
+
+        Returns:
+            tuple -- (bytes, bytes) The command stdout and stderr
+        """
+        out, err = [], []
+        line = b""
+
+        while True:
+            if channel.recv_ready():
+                data = channel.recv(SSH_CHUNK)
+                out.append(data)
+                lines = (line + data).split(b"\n")
+                line = lines.pop()
+                for output_line in lines:
+                    logger.info(
+                        f"[{self.name}] {output_line.decode('utf-8', 'replace')}"
+                    )
+
+            elif channel.recv_stderr_ready():
+                err.append(channel.recv_stderr(SSH_CHUNK))
+
+            elif channel.exit_status_ready():
+                break
+
+            else:
+                time.sleep(SSH_POLL)
+
+        if line:
+            logger.info(f"[{self.name}] {line.decode('utf-8', 'replace')}")
+
+        return b"".join(out), b"".join(err)
+
     def execute_command(self, command, daemon=False):
         """Execute a command on the remote host."""
 
@@ -68,9 +146,9 @@ class RemotePlugin:
                 if daemon:
                     stdout.channel.close()
                     stderr.channel.close()
-
-                self.ssh_output = stdout.read()
-                self.ssh_error = stderr.read()
+                    self.ssh_output, self.ssh_error = b"", b""
+                else:
+                    self.ssh_output, self.ssh_error = self._stream(stdout.channel)
 
                 if self.ssh_error:
                     logger.info(
@@ -85,24 +163,36 @@ class RemotePlugin:
                     )
                     result = str(self.ssh_output) if self.ssh_output else "ok"
 
-                self._client.close()
             else:
                 print("Could not establish SSH connection")
                 result_flag = False
 
-        except paramiko.SSHException:
+        except (paramiko.SSHException, OSError):
             logger.info(f"Failed to execute the commands {command}")
-            self._client.close()
+            self.close()
             result_flag = False
 
         return result_flag, result
 
+    def sync_files(self, local_folder, remote_folder):
+        """Uploads only the changed files of a local folder (see Sync)"""
+        try:
+            Sync(self._client).put(local_folder, remote_folder)
+        except (paramiko.SSHException, OSError) as e:
+            logger.info(f"Unable to sync the folder {local_folder} - exception {e}")
+            return False
+        return True
+
     def copy_files(self, local_filepath, remote_filepath):
         """This method uploads a local file to a remote server"""
         logger.info(f"Remote-Copying files from {local_filepath} to {remote_filepath}")
 
         result_flag = True
         if self._connect():
+            if os.path.isdir(local_filepath):
+                if self.sync_files(local_filepath, remote_filepath):
+                    return result_flag
+
             try:
 
                 self.scp = SCPClient(self._client.get_transport())
@@ -111,7 +201,7 @@ class RemotePlugin:
                     local_filepath, recursive=True, remote_path=remote_filepath
                 )
 
-                self._client.close()
+                self.scp.close()
                 logger.info("Files successfully copied to remote host")
 
             except Exception as e:
@@ -121,7 +211,7 @@ class RemotePlugin:
                 )
 
                 result_flag = False
-                self._client.close()
+                self.close()
         else:
             logger.info("Could not establish SSH connection")
             result_flag = False
@@ -185,8 +275,8 @@ class LocalPlugin:
 
 
 class Proxy:
-    def __init__(self):
-        self._remote_plugin = RemotePlugin()
+    def __init__(self, name=None):
+        self._remote_plugin = RemotePlugin(name)
         self._local_plugin = LocalPlugin()
         self._plugin = None
         self.model = ""
@@ -194,6 +284,7 @@ class Proxy:
         self.host_cfg = {}
         self.components = {}
         self.settings = {}
+        self.bundle = None
         self._envs_stats = {}
 
     def clear(self):
@@ -202,6 +293,7 @@ class Proxy:
         self.host_cfg = {}
         self.components = {}
         self.settings = {}
+        self.bundle = None
         self._envs_stats = {}
 
     def load(self, env_cfg):
@@ -211,6 +303,7 @@ class Proxy:
 
         if self.remote:
             self.host_cfg = env_cfg.get("host")
+            self._remote_plugin.name = self.envid
             self._remote_plugin.cfg(self.host_cfg)
             self._plugin = self._remote_plugin
         else:
@@ -219,6 +312,7 @@ class Proxy:
         self.components = env_cfg.get("components")
         self.settings = env_cfg.get("settings")
         self.model = env_cfg.get("model")
+        self.bundle = env_cfg.get("bundle")
 
         self._envs_stats[self.envid] = {
             "components": {},
@@ -248,7 +342,9 @@ class Proxy:
     def _workflow_start(self, name, info):
         logger.info(f"Workflow start: component {name}")
 
-        if self.envid == "umbra-default" and name == "broker":
+        local_storage = info.get("storage") == "local"
+
+        if self.envid == "umbra-default" and name == "broker" and not local_storage:
             self._workflow_monitor(action="start")
 
         if name == "scenario":
@@ -282,10 +378,23 @@ class Proxy:
             )
 
         else:
-            cmd = "umbra-{name} --uuid {uuid} --address {address} --debug &".format(
+            cmd = "umbra-{name} --uuid {uuid} --address {address} --debug".format(
                 name=name, uuid=info.get("uuid"), address=info.get("address")
             )
 
+            if name == "broker" and info.get("storage"):
+                cmd += " --storage {storage}".format(storage=info.get("storage"))
+
+            if name == "broker" and info.get("storage_folder"):
+                cmd += " --storage-folder {folder}".format(
+                    folder=info.get("storage_folder")
+                )
+
+            if name == "broker" and info.get("dispatch"):
+                cmd += " --dispatch {dispatch}".format(dispatch=info.get("dispatch"))
+
+            cmd += " &"
+
         ack, msg = self._plugin.execute_command(cmd, daemon=True)
 
         output = {
@@ -307,7 +416,9 @@ class Proxy:
         }
         logger.info(f"Stats: {ack} - msg: {msg}")
 
-        if self.envid == "umbra-default" and name == "broker":
+        local_storage = info.get("storage") == "local"
+
+        if self.envid == "umbra-default" and name == "broker" and not local_storage:
             self._workflow_monitor(action="stop")
 
         return output
@@ -375,6 +486,39 @@ class Proxy:
 
         return output
 
+    def _workflow_bundle(self):
+        logger.info(f"Workflow bundle {self.bundle}")
+        ack_copy, msg_copy = True, "ok"
+        bundle_folder = self.bundle
+
+        if self.remote:
+            name = os.path.basename(self.bundle.rstrip("/"))
+            bundle_folder = os.path.join(BUNDLE_REMOTE_FOLDER, name)
+
+            mkdir_cmd = f"mkdir -p {BUNDLE_REMOTE_FOLDER}"
+            ack_copy, msg_copy = self._plugin.execute_command(mkdir_cmd)
+
+            if ack_copy:
+                ack_copy = self._plugin.copy_files(self.bundle, BUNDLE_REMOTE_FOLDER)
+                msg_copy = "ok" if ack_copy else "error"
+
+        ack_install, msg_install = False, "not copied"
+        if ack_copy:
+            logger.info("Executing command - bundle install (checksums verified)")
+            install_cmd = f"sudo {bundle_folder}/install.sh"
+            ack_install, msg_install = self._plugin.execute_command(install_cmd)
+
+        ack = ack_copy and ack_install
+        msg = [
+            "copy: " + msg_copy,
+            "install: " + msg_install,
+        ]
+        output = {
+            "ack": ack,
+            "msg": msg,
+        }
+        return output
+
     def _workflow_uninstall(self):
         logger.info(f"Workflow uninstall")
 
@@ -479,6 +623,29 @@ class Proxy:
                         "msg": ["install: environment already installed"],
                     }
 
+            if action in ["bundle"]:
+                logger.info(
+                    f"Calling action - {action} - Installing bundle in environment {self.envid}"
+                )
+
+                print_cli(f"Installing Umbra bundle at environment {self.envid}")
+
+                action_output = self._workflow_bundle()
+                self._envs_stats[self.envid]["install"] = action_output.get("ack")
+
+                if action_output.get("ack"):
+                    print_cli(
+                        f"Install Umbra bundle in environment {self.envid} Ok",
+                        style="normal",
+                    )
+
+                else:
+
+                    print_cli(
+                        f"Install Umbra bundle in environment {self.envid} Error",
+                        style="error",
+                    )
+
             if action in ["uninstall"]:
                 is_installed = self._envs_stats[self.envid].get(action, False)
 
@@ -599,14 +766,32 @@ class Proxy:
 
 
 class Environments:
+    """Implements the actions (e.g., install, start) on the
+    environments, each one through its own Proxy (keeping its ssh
+    session open), concurrently across hosts (environments on the
+    same host are implemented one after the other)
+    """
+
     def __init__(self):
-        self._proxy = Proxy()
+        self._proxies = {}
         self.env_cfgs = {}
         self.env_stats = {}
+        self.bundle = None
+
+    def _proxy(self, envid):
+        if envid not in self._proxies:
+            self._proxies[envid] = Proxy(envid)
+        return self._proxies[envid]
+
+    def close(self):
+        for proxy in self._proxies.values():
+            proxy._remote_plugin.close()
+        self._proxies = {}
 
     def generate_env_cfgs(self, topology):
         logger.info("Generating environments configuration")
-        self._proxy.clear()
+        for proxy in self._proxies.values():
+            proxy.clear()
         envs = topology.get_environments()
         setts = topology.get_settings()
         model = topology.get_model()
@@ -631,12 +816,24 @@ class Environments:
                 },
                 "components": env.get("components"),
                 "host": env.get("host", {}),
+                "bundle": self.bundle,
             }
 
             env_cfgs[envid] = env_cfg
 
         self.env_cfgs = env_cfgs
 
+    def set_bundle(self, bundle):
+        """Sets the folder of the bundle the environments install
+        (see the action bundle)
+
+        Arguments:
+            bundle {string} -- The local bundle folder path
+        """
+        self.bundle = bundle
+        for env_cfg in self.env_cfgs.values():
+            env_cfg["bundle"] = bundle
+
     def augment_action(self, action, revert=False):
         actions = []
 
@@ -658,6 +855,12 @@ class Environments:
             else:
                 actions.extend(["install"])
 
+        if action == "bundle":
+            if revert:
+                actions.extend(["uninstall"])
+            else:
+                actions.extend(["bundle"])
+
         if action == "uninstall":
             if revert:
                 actions.extend(["install"])
@@ -666,6 +869,28 @@ class Environments:
 
         return actions
 
+    def _host(self, env_cfg):
+        if env_cfg.get("remote", False):
+            return env_cfg.get("host", {}).get("address")
+        return "localhost"
+
+    def _implement_host(self, envids, actions):
+        outputs = {}
+
+        for envid in envids:
+            proxy = self._proxy(envid)
+
+            try:
+                proxy.load(self.env_cfgs[envid])
+                outputs[envid] = proxy.implement(actions)
+            except Exception as e:
+                logger.info(
+                    f"Environment {envid} not implemented - exception {repr(e)}"
+                )
+                outputs[envid] = (False, {"error": {"ack": False, "msg": [repr(e)]}})
+
+        return outputs
+
     def implement_env_cfgs(self, action):
         logger.info("Implementing environments configuration")
         env_stats = {}
@@ -674,16 +899,32 @@ class Environments:
         actions = self.augment_action(action)
         logger.info(f"Implementing environments actions {actions}")
 
+        hosts = defaultdict(list)
         for envid, env_cfg in self.env_cfgs.items():
-            self._proxy.load(env_cfg)
-            env_acks, env_stat = self._proxy.implement(actions)
+            hosts[self._host(env_cfg)].append(envid)
 
+        workers = max(len(hosts), 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._implement_host, envids, actions)
+                for envids in hosts.values()
+            ]
+            outputs = {}
+            for future in futures:
+                outputs.update(future.result())
+
+        for envid in self.env_cfgs:
+            env_acks, env_stat = outputs[envid]
             env_stats[envid] = env_stat
             all_env_acks[envid] = env_acks
 
         all_acks = all([ack for ack in all_env_acks.values()])
         self.env_stats = env_stats
 
+        failed = [envid for envid, ack in all_env_acks.items() if not ack]
+        if failed:
+            print_cli(f"Action {action} failed in environments {failed}", style="error")
+
         messages = [stat.get("msg") for stat in env_stats.values()]
         logger.info("Replying messages")
         logger.info(f"{messages}")
@@ -1,5 +1,6 @@
 import sys
 import json
+import base64
 import asyncio
 import logging
 from datetime import datetime
@@ -89,3 +90,15 @@ class BrokerInterface(UmbraInterface):
         action = "stop"
         reply, error = await self.call(address, action, topology)
         return reply, error
+
+    async def results(self, environment, since=0):
+        address = environment.get("address")
+        action = "results"
+        reply, error = await self.call(address, action, {"since": since})
+
+        events = []
+        if not error:
+            info = base64.b64decode(reply.get("info", ""))
+            events = self.parse_bytes(info).get("events", []) if info else []
+
+        return events, error
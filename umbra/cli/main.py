@@ -10,7 +10,9 @@ from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
 
 from umbra.design.basis import Experiment
 from umbra.cli.envs import Environments
+from umbra.cli.bundle import Bundle, topology_images
 from umbra.cli.interfaces import BrokerInterface
+from umbra.cli.report import Report
 from umbra.cli.output import print_cli, format_text
 
 
@@ -30,8 +32,10 @@ class CLIRunner:
             "stop": self.stop,
             "install": self.install,
             "uninstall": self.uninstall,
+            "bundle": self.bundle,
             "begin": self.begin,
             "end": self.end,
+            "report": self.report,
         }
 
         self._status = {
@@ -40,8 +44,10 @@ class CLIRunner:
             "stop": False,
             "install": False,
             "uninstall": False,
+            "bundle": False,
             "begin": False,
             "end": False,
+            "report": False,
         }
         logger.info("CLIRunner init")
 
@@ -142,6 +148,38 @@ class CLIRunner:
         logger.info(f"{messages}")
         return messages
 
+    async def bundle(self):
+        logger.info(f"bundle triggered")
+
+        print_cli(f"Bundling", style="attention")
+
+        if not self.topology:
+            msg = "Cannot bundle - config not loaded"
+            print_cli(None, err=msg, style="error")
+            return False, msg
+
+        model = self.topology.get_model()
+        bundle = Bundle(model, images=topology_images(self.topology))
+
+        print_cli(f"Building Umbra bundle {bundle.name}", style="info")
+        ack, info = bundle.build()
+
+        if not ack:
+            msg = f"Bundle not built - {info}"
+            print_cli(None, err=msg, style="error")
+            self._status["bundle"] = ack
+            return ack, msg
+
+        print_cli(f"Bundle built at {info}", style="normal")
+
+        self.environments.set_bundle(info)
+        ack, messages = self.environments.implement_env_cfgs("bundle")
+        self._status["bundle"] = ack
+        self._status["install"] = ack
+
+        logger.info(f"{messages}")
+        return ack, messages
+
     async def begin(self):
         logger.info(f"begin triggered")
 
@@ -195,6 +233,50 @@ class CLIRunner:
         logger.info(f"{messages}")
         return ack, messages
 
+    async def report(self, events_filename=None):
+        logger.info(f"report triggered")
+
+        print_cli(f"Reporting", style="attention")
+
+        broker_env = {}
+        if self.topology:
+            default_env = self.topology.get_default_environment()
+            default_env_components = default_env.get("components")
+            broker_env = default_env_components.get("broker")
+
+        events = []
+        if events_filename:
+            try:
+                with open(events_filename, "r") as fp:
+                    events = json.load(fp)
+            except Exception as e:
+                msg = f"Could not load events file - {repr(e)}"
+                print_cli(None, err=msg, style="error")
+                logger.info(f"{msg}")
+                return False, msg
+
+        elif self.topology:
+            events, error = await self.broker_interface.results(broker_env)
+            if error:
+                print_cli(None, err=f"No events results - {error}", style="warning")
+
+        report = Report(folder=broker_env.get("storage_folder"), events=events)
+        environments = None
+        if self.topology:
+            environments = list(self.topology.get_environments().keys())
+
+        output = report.build(environments)
+        paths = report.save(output)
+
+        ack = True if paths else False
+        self._status["report"] = ack
+
+        messages = f"Report saved at {paths}"
+        print_cli(messages, style="normal")
+
+        logger.info(f"{messages}")
+        return ack, messages
+
     def status(self, command):
         ack = False
         error = ""
@@ -245,6 +327,10 @@ class CLIRunner:
                 else:
                     return "Missing config filepath"
 
+            if cmd == "report":
+                output = await self.report(*cmds[1:2])
+                return output
+
             if cmd in available_cmds:
                 func = self.cmds.get(cmd)
                 output = await func()
@@ -260,7 +346,17 @@ class CLIRunner:
 
 class CLI:
     umbra_completer = WordCompleter(
-        ["load", "start", "stop", "install", "uninstall", "begin", "end"],
+        [
+            "load",
+            "start",
+            "stop",
+            "install",
+            "uninstall",
+            "bundle",
+            "begin",
+            "end",
+            "report",
+        ],
         ignore_case=True,
     )
 
@@ -304,6 +400,8 @@ class CLI:
                 "stop": None,
                 "install": None,
                 "uninstall": None,
+                "bundle": None,
+                "report": None,
             }
 
             self.umbra_completer = NestedCompleter.from_nested_dict(nested_dict)
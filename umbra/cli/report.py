@@ -0,0 +1,443 @@
+import os
+import json
+import html
+import math
+import logging
+from datetime import datetime
+
+from umbra.broker.collector import LocalStorage
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+logger = logging.getLogger(__name__)
+
+
+REPORT_FOLDER = "/tmp/umbra/reports/"
+
+# percentiles computed for every numeric field
+PERCENTILES = [50, 90, 95, 99]
+
+# seconds around each event where resource peaks are looked for
+EVENT_WINDOW_BEFORE = 5.0
+EVENT_WINDOW_AFTER = 5.0
+
+# event categories whose results are blockchain transactions
+TX_CATEGORIES = ["fabric", "iroha"]
+
+# substrings of the field names used as resource peaks around events
+PEAK_FIELDS = ["cpu", "mem"]
+
+
+def _array(values):
+    if np is not None:
+        return np.asarray(values, dtype=np.float64)
+    return [float(v) for v in values]
+
+
+def _finite(values):
+    if np is not None:
+        return values[~np.isnan(values)]
+    return [v for v in values if not math.isnan(v)]
+
+
+def _percentile(values, q):
+    """Linear interpolation percentile (as numpy's default)
+    used when numpy is not available
+    """
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values, times=None):
+    """Computes the summary statistics of a numeric column
+
+    Arguments:
+        values {array} -- Column values (NaN for missing samples)
+
+    Keyword Arguments:
+        times {array} -- Column timestamps in ms, used to
+        compute the rate of change (per second) of values (default: {None})
+
+    Returns:
+        dict -- count, mean, min, max, rate and percentiles (pXX)
+    """
+    finite = _finite(values)
+    count = len(finite)
+
+    if not count:
+        return {"count": 0}
+
+    if np is not None:
+        summary = {
+            "count": int(count),
+            "mean": float(np.mean(finite)),
+            "min": float(np.min(finite)),
+            "max": float(np.max(finite)),
+        }
+        percentiles = np.percentile(finite, PERCENTILES)
+        for q, value in zip(PERCENTILES, percentiles):
+            summary[f"p{q}"] = float(value)
+    else:
+        summary = {
+            "count": count,
+            "mean": sum(finite) / count,
+            "min": min(finite),
+            "max": max(finite),
+        }
+        for q in PERCENTILES:
+            summary[f"p{q}"] = _percentile(finite, q)
+
+    if times is not None and count > 1:
+        if np is not None:
+            timed = np.asarray(times)[~np.isnan(values)]
+            first, last = timed[0], timed[-1]
+        else:
+            timed = [t for t, v in zip(times, values) if not math.isnan(v)]
+            first, last = timed[0], timed[-1]
+
+        elapsed = (last - first) / 1000.0
+        if elapsed > 0:
+            summary["rate"] = float((finite[-1] - finite[0]) / elapsed)
+
+    return summary
+
+
+class Report:
+    """Post-experiment analytics over the metrics stored by the
+    broker local storage and the results of the experiment events
+
+    Events are dicts with (at least) keys id, category and the
+    times (ms) they were scheduled, started and finished, plus
+    their outcome (ok or error), such as:
+    {"id": 1, "category": "fabric", "scheduled": 1600000000000,
+    "started": 1600000000004, "finished": 1600000000250,
+    "outcome": "ok"}
+    """
+
+    def __init__(self, folder=None, events=None):
+        self.storage = LocalStorage({}, folder=folder)
+        self.events = sorted(events or [], key=lambda ev: ev.get("started") or 0)
+        self._columns = {}
+
+    def environments(self):
+        try:
+            return sorted(os.listdir(self.storage.folder))
+        except OSError:
+            return []
+
+    def columns(self, environment, measurement):
+        """Concatenates the partitions of a measurement, sorted by time
+
+        Returns:
+            tuple -- (time, numeric, sources) where time is the ms
+            column, numeric maps field names to columns and sources
+            is the list of source tag values (one per row)
+        """
+        key = (environment, measurement)
+
+        if key in self._columns:
+            return self._columns[key]
+
+        times, numeric, sources = [], {}, []
+        rows = 0
+
+        for partition in self.storage.read(environment, measurement):
+            count = len(partition["time"])
+            times.append(partition["time"])
+
+            for name in set(numeric) | set(partition["numeric"]):
+                column = partition["numeric"].get(name)
+                if column is None:
+                    column = _array([float("nan")] * count)
+                if name not in numeric:
+                    numeric[name] = [_array([float("nan")] * rows)]
+                numeric[name].append(column)
+
+            codes, values = partition["dictionary"].get("source", ([], []))
+            sources.extend(values[code] if code >= 0 else None for code in codes)
+            sources.extend([None] * (count - len(codes)))
+            rows += count
+
+        if np is not None:
+            time = np.concatenate(times) if times else np.empty(0, dtype=np.int64)
+            numeric = {name: np.concatenate(cols) for name, cols in numeric.items()}
+            order = np.argsort(time, kind="stable")
+            time = time[order]
+            numeric = {name: col[order] for name, col in numeric.items()}
+            sources = np.asarray(sources, dtype=object)[order]
+        else:
+            time = [t for col in times for t in col]
+            numeric = {
+                name: [v for col in cols for v in col] for name, cols in numeric.items()
+            }
+            order = sorted(range(len(time)), key=time.__getitem__)
+            time = [time[i] for i in order]
+            numeric = {name: [col[i] for i in order] for name, col in numeric.items()}
+            sources = [sources[i] for i in order]
+
+        self._columns[key] = (time, numeric, sources)
+        return self._columns[key]
+
+    def _group(self, sources):
+        """Indexes the rows of each source
+
+        Returns:
+            dict -- Source name to rows index (numpy array or list)
+        """
+        if np is not None:
+            names, inverse = np.unique(sources.astype(str), return_inverse=True)
+            return {name: np.flatnonzero(inverse == n) for n, name in enumerate(names)}
+
+        groups = {}
+        for row, source in enumerate(sources):
+            groups.setdefault(str(source), []).append(row)
+        return groups
+
+    def _take(self, column, rows):
+        if np is not None:
+            return column[rows]
+        return [column[row] for row in rows]
+
+    def metrics(self, environment):
+        """Summarizes every numeric field of every measurement of
+        an environment, per source (node/container) and overall
+
+        Returns:
+            dict -- measurement -> {"environment": {field: summary},
+            "sources": {source: {field: summary}}}
+        """
+        output = {}
+
+        for measurement in self.storage.measurements(environment):
+            time, numeric, sources = self.columns(environment, measurement)
+            groups = self._group(sources)
+
+            output[measurement] = {
+                "samples": len(time),
+                "environment": {
+                    name: summarize(column, time) for name, column in numeric.items()
+                },
+                "sources": {},
+            }
+
+            for source, rows in groups.items():
+                source_time = self._take(time, rows)
+                output[measurement]["sources"][source] = {
+                    name: summarize(self._take(column, rows), source_time)
+                    for name, column in numeric.items()
+                }
+
+        return output
+
+    def _window(self, time, start, stop):
+        if np is not None:
+            return np.searchsorted(time, start, "left"), np.searchsorted(
+                time, stop, "right"
+            )
+
+        begin = next((n for n, t in enumerate(time) if t >= start), len(time))
+        end = next((n for n, t in enumerate(time) if t > stop), len(time))
+        return begin, end
+
+    def _peaks(self, environment, start, stop):
+        peaks = {}
+
+        for measurement in self.storage.measurements(environment):
+            time, numeric, sources = self.columns(environment, measurement)
+            begin, end = self._window(time, start, stop)
+
+            if begin >= end:
+                continue
+
+            window_sources = sources[begin:end]
+            groups = self._group(window_sources)
+
+            for name, column in numeric.items():
+                if not any(field in name for field in PEAK_FIELDS):
+                    continue
+
+                window = column[begin:end]
+                for source, rows in groups.items():
+                    values = _finite(self._take(window, rows))
+                    if len(values):
+                        key = f"{measurement}.{name}"
+                        peaks.setdefault(source, {})[key] = float(max(values))
+
+        return peaks
+
+    def timeline(self, environments):
+        """Aligns the events on the metrics timeline, i.e., gets
+        the resource (cpu/mem) peaks of each source around each event
+
+        Returns:
+            list -- Events with keys lateness (s, started - scheduled)
+            and peaks (environment -> source -> field -> max value)
+        """
+        before = EVENT_WINDOW_BEFORE * 1000
+        after = EVENT_WINDOW_AFTER * 1000
+        output = []
+
+        for event in self.events:
+            started = event.get("started")
+            finished = event.get("finished") or started
+            aligned = dict(event)
+
+            if started is not None:
+                scheduled = event.get("scheduled")
+                if scheduled is not None:
+                    aligned["lateness"] = (started - scheduled) / 1000.0
+
+                aligned["peaks"] = {
+                    env: self._peaks(env, started - before, finished + after)
+                    for env in environments
+                }
+
+            output.append(aligned)
+
+        return output
+
+    def transactions(self):
+        """Computes throughput (tx/s) and latency (s) of the
+        events of the blockchain categories (see TX_CATEGORIES)
+
+        Returns:
+            dict -- Per category: count, ok, error, throughput, latency summary
+        """
+        output = {}
+
+        for category in TX_CATEGORIES:
+            events = [
+                ev
+                for ev in self.events
+                if ev.get("category") == category and ev.get("started") is not None
+            ]
+
+            if not events:
+                continue
+
+            ok = [ev for ev in events if ev.get("outcome") == "ok"]
+            latencies = _array(
+                [
+                    ((ev.get("finished") or ev["started"]) - ev["started"]) / 1000.0
+                    for ev in ok
+                ]
+            )
+
+            first = min(ev["started"] for ev in events)
+            last = max(ev.get("finished") or ev["started"] for ev in events)
+            elapsed = (last - first) / 1000.0
+
+            output[category] = {
+                "count": len(events),
+                "ok": len(ok),
+                "error": len(events) - len(ok),
+                "throughput": len(ok) / elapsed if elapsed > 0 else float(len(ok)),
+                "latency": summarize(latencies),
+            }
+
+        return output
+
+    def build(self, environments=None):
+        environments = environments or self.environments()
+
+        report = {
+            "created": datetime.now().isoformat(),
+            "environments": {env: self.metrics(env) for env in environments},
+            "events": self.timeline(environments),
+            "transactions": self.transactions(),
+        }
+        return report
+
+    def to_html(self, report):
+        def table(headers, rows):
+            head = "".join(f"<th>{html.escape(str(h))}</th>" for h in headers)
+            body = "".join(
+                "<tr>"
+                + "".join(f"<td>{html.escape(self._fmt(cell))}</td>" for cell in row)
+                + "</tr>"
+                for row in rows
+            )
+            return f"<table><tr>{head}</tr>{body}</table>"
+
+        stats = ["count", "mean", "min", "max", "rate"] + [f"p{q}" for q in PERCENTILES]
+        sections = [f"<h1>Umbra Report</h1><p>Created {report.get('created')}</p>"]
+
+        for env, measurements in report.get("environments", {}).items():
+            sections.append(f"<h2>Environment {html.escape(env)}</h2>")
+            for measurement, data in measurements.items():
+                rows = []
+                for source, fields in data.get("sources", {}).items():
+                    for field, summary in fields.items():
+                        rows.append(
+                            [source, field] + [summary.get(s, "") for s in stats]
+                        )
+                sections.append(f"<h3>{html.escape(measurement)}</h3>")
+                sections.append(table(["source", "field"] + stats, rows))
+
+        if report.get("transactions"):
+            sections.append("<h2>Transactions</h2>")
+            rows = []
+            for category, data in report["transactions"].items():
+                latency = data.get("latency", {})
+                rows.append(
+                    [category, data["count"], data["ok"], data["error"]]
+                    + [data["throughput"], latency.get("mean", "")]
+                    + [latency.get("p99", "")]
+                )
+            headers = ["category", "count", "ok", "error", "tx/s"]
+            sections.append(table(headers + ["latency mean", "latency p99"], rows))
+
+        if report.get("events"):
+            sections.append("<h2>Events</h2>")
+            rows = []
+            for event in report["events"]:
+                peaks = event.get("peaks", {})
+                peaks_text = "; ".join(
+                    f"{source} {field}={self._fmt(value)}"
+                    for sources in peaks.values()
+                    for source, fields in sources.items()
+                    for field, value in fields.items()
+                )
+                rows.append(
+                    [event.get("id"), event.get("category"), event.get("outcome")]
+                    + [event.get("lateness", ""), peaks_text]
+                )
+            headers = ["id", "category", "outcome", "lateness (s)", "peaks"]
+            sections.append(table(headers, rows))
+
+        return "<html><body>{}</body></html>".format("".join(sections))
+
+    def _fmt(self, value):
+        if isinstance(value, float):
+            return f"{value:.3f}"
+        return str(value) if value is not None else ""
+
+    def save(self, report, folder=REPORT_FOLDER, formats=("json", "html")):
+        """Writes the report to folder in the formats requested
+
+        Returns:
+            list -- Paths of the files written
+        """
+        os.makedirs(folder, exist_ok=True)
+        paths = []
+
+        if "json" in formats:
+            path = os.path.join(folder, "report.json")
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            paths.append(path)
+
+        if "html" in formats:
+            path = os.path.join(folder, "report.html")
+            with open(path, "w") as f:
+                f.write(self.to_html(report))
+            paths.append(path)
+
+        logger.info(f"Report saved - {paths}")
+        return paths
@@ -0,0 +1,235 @@
+import os
+import json
+import shlex
+import tarfile
+import hashlib
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+# manifest of a synced folder, kept on the remote host next to it
+SYNC_MANIFEST = ".umbra-sync-{name}.json"
+# local manifests, so unchanged files (size, mtime) are not hashed again
+SYNC_CACHE = "/tmp/umbra/cache/sync/"
+SYNC_CHUNK = 1024 * 1024
+
+
+def file_digest(filepath):
+    digest = hashlib.sha256()
+
+    if os.path.islink(filepath):
+        digest.update(os.readlink(filepath).encode("utf-8"))
+        return digest.hexdigest()
+
+    with open(filepath, "rb") as infile:
+        for chunk in iter(lambda: infile.read(SYNC_CHUNK), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def build_manifest(folder, cached=None):
+    """Lists the files of a folder with their content hashes
+
+    Arguments:
+        folder {string} -- The folder path
+
+    Keyword Arguments:
+        cached {dict} -- A previous manifest of the folder, whose
+        hashes are reused for files with the same size and mtime (default: {None})
+
+    Returns:
+        dict -- The hash, size and mtime (ns) indexed by file relative path
+    """
+    cached = cached if cached else {}
+    manifest = {}
+
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames.sort()
+
+        for filename in sorted(filenames):
+            filepath = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(filepath, folder)
+            stat = os.lstat(filepath)
+
+            entry = cached.get(relpath, {})
+            if entry.get("size") == stat.st_size and entry.get("mtime") == (
+                stat.st_mtime_ns
+            ):
+                digest = entry.get("hash")
+            else:
+                digest = file_digest(filepath)
+
+            manifest[relpath] = {
+                "hash": digest,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+            }
+
+    return manifest
+
+
+def diff_manifests(local, remote):
+    """Compares a local and a remote manifest
+
+    Arguments:
+        local {dict} -- The local manifest
+        remote {dict} -- The remote manifest
+
+    Returns:
+        tuple -- (list, list) The files changed (or new) and deleted
+    """
+    changed = [
+        relpath
+        for relpath, entry in local.items()
+        if remote.get(relpath, {}).get("hash") != entry.get("hash")
+    ]
+    deleted = [relpath for relpath in remote if relpath not in local]
+    return changed, deleted
+
+
+class CountingWriter:
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        self.fileobj.write(data)
+        return len(data)
+
+
+class Sync:
+    """Transfers a local folder to a remote host (ssh), sending
+    only the files whose content changed since the last transfer
+
+    The remote keeps the manifest (file hashes) of the last
+    transfer of the folder, which is compared to the local one:
+    changed files are streamed in a single gzip compressed tar
+    archive, extracted on the fly by the remote host, and the
+    files not present locally anymore are removed.
+    """
+
+    def __init__(self, client, cache_dir=SYNC_CACHE):
+        self._client = client
+        self.cache_dir = cache_dir
+
+    def _exec(self, command, data=None, writer=None):
+        stdin, stdout, stderr = self._client.exec_command(command)
+
+        if writer:
+            writer(stdin)
+        elif data is not None:
+            stdin.write(data)
+
+        stdin.channel.shutdown_write()
+        out = stdout.read()
+        err = stderr.read()
+        code = stdout.channel.recv_exit_status()
+        return code, out, err
+
+    def _cache_path(self, folder):
+        key = hashlib.sha256(os.path.abspath(folder).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:16] + ".json")
+
+    def _local_manifest(self, folder):
+        cached = {}
+        cache_path = self._cache_path(folder) if self.cache_dir else None
+
+        if cache_path and os.path.isfile(cache_path):
+            try:
+                with open(cache_path, "r") as infile:
+                    cached = json.load(infile)
+            except (OSError, ValueError):
+                cached = {}
+
+        manifest = build_manifest(folder, cached)
+
+        if cache_path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(cache_path, "w") as outfile:
+                    json.dump(manifest, outfile)
+            except OSError as e:
+                logger.debug(f"Sync manifest cache not saved - {e}")
+
+        return manifest
+
+    def _remote_manifest(self, manifest_path):
+        code, out, _ = self._exec(f"cat {shlex.quote(manifest_path)} 2>/dev/null")
+
+        if code != 0 or not out:
+            return {}
+
+        try:
+            return json.loads(out.decode("utf-8"))
+        except ValueError:
+            return {}
+
+    def _send(self, folder, files, target):
+        counter = {}
+
+        def write_archive(stdin):
+            writer = CountingWriter(stdin)
+            with tarfile.open(fileobj=writer, mode="w|gz") as archive:
+                for relpath in files:
+                    archive.add(os.path.join(folder, relpath), arcname=relpath)
+            counter["size"] = writer.size
+
+        command = (
+            f"mkdir -p {shlex.quote(target)} && tar -xzf - -C {shlex.quote(target)}"
+        )
+        code, _, err = self._exec(command, writer=write_archive)
+
+        if code != 0:
+            raise OSError(f"remote extract error {code} - {err}")
+
+        return counter.get("size", 0)
+
+    def _delete(self, target, files):
+        paths = " ".join(shlex.quote(relpath) for relpath in files)
+        code, _, err = self._exec(f"cd {shlex.quote(target)} && rm -f -- {paths}")
+
+        if code != 0:
+            raise OSError(f"remote delete error {code} - {err}")
+
+    def put(self, local_folder, remote_path):
+        """Syncs the local folder into the remote path (i.e., into
+        remote_path/<local folder name>, as a recursive scp put)
+
+        Arguments:
+            local_folder {string} -- The local folder path
+            remote_path {string} -- The remote destination folder
+
+        Returns:
+            dict -- The amount of files changed, deleted and the bytes sent
+        """
+        folder = os.path.abspath(local_folder)
+        name = os.path.basename(folder.rstrip("/"))
+        target = os.path.join(remote_path, name)
+        manifest_path = os.path.join(remote_path, SYNC_MANIFEST.format(name=name))
+
+        local = self._local_manifest(folder)
+        remote = self._remote_manifest(manifest_path)
+        changed, deleted = diff_manifests(local, remote)
+
+        sent = 0
+        if changed:
+            sent = self._send(folder, changed, target)
+        if deleted:
+            self._delete(target, deleted)
+
+        if changed or deleted or not remote:
+            code, _, err = self._exec(
+                f"mkdir -p {shlex.quote(remote_path)} && "
+                f"cat > {shlex.quote(manifest_path)}",
+                data=json.dumps(local).encode("utf-8"),
+            )
+            if code != 0:
+                raise OSError(f"remote manifest error {code} - {err}")
+
+        stats = {"changed": len(changed), "deleted": len(deleted), "sent": sent}
+        logger.info(f"Synced {folder} to {target} - {stats}")
+        return stats
@@ -0,0 +1,120 @@
+import time
+import logging
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+
+# amount of (latest) offset samples kept per remote clock
+CLOCK_SAMPLES = 16
+
+
+def stamp(message, received):
+    """Sets the timestamp of a reply message to the midpoint between
+    the time its request was received and now (the remote time of an
+    offset sample, see Clock)
+
+    Arguments:
+        message {object} -- A protobuf message with a timestamp field
+        received {float} -- Time (epoch seconds) the request was received
+    """
+    now = time.time()
+    message.timestamp.FromNanoseconds(int((received + now) / 2 * 1e9))
+
+
+def remote_time(message):
+    """Gets the time a message was stamped (see stamp)
+
+    Arguments:
+        message {object} -- A protobuf message with a timestamp field
+
+    Returns:
+        float -- Time (epoch seconds) or None if the message was not stamped
+    """
+    if message.HasField("timestamp"):
+        return message.timestamp.ToNanoseconds() / 1e9
+    return None
+
+
+class Clock:
+    """Estimates the offset of a remote clock, NTP-style, from the
+    calls made to it: a call sent at t0 and received back at t3
+    (local times), stamped remotely at tr (midpoint of the remote
+    processing) samples the offset as tr - (t0 + t3) / 2, with an
+    error bounded by half the round trip time (rtt = t3 - t0).
+
+    The estimated offset is the one of the sample with the smallest
+    rtt among the latest samples kept (clock filter), so calls that
+    take long (e.g., deploying a topology) do not degrade it.
+    """
+
+    def __init__(self, samples=CLOCK_SAMPLES):
+        self._samples = deque(maxlen=samples)
+
+    def sample(self, sent, received, remote):
+        rtt = received - sent
+        offset = remote - (sent + received) / 2
+        self._samples.append((rtt, offset))
+
+    def best(self):
+        if self._samples:
+            return min(self._samples)
+        return None, 0.0
+
+    def offset(self):
+        _, offset = self.best()
+        return offset
+
+    def info(self):
+        rtt, offset = self.best()
+        info = {
+            "offset": offset,
+            "rtt": rtt,
+            "error": rtt / 2 if rtt is not None else None,
+            "samples": len(self._samples),
+        }
+        return info
+
+
+class Clocks:
+    """Keeps the Clock of each remote component (e.g., indexed by
+    environment, as its components share the host clock) to convert
+    between local (broker) and remote times
+    """
+
+    def __init__(self, samples=CLOCK_SAMPLES):
+        self.samples = samples
+        self._clocks = {}
+
+    def sample(self, name, sent, received, message):
+        """Adds an offset sample from a call reply
+
+        Arguments:
+            name {string} -- The remote clock name
+            sent {float} -- Time (epoch seconds) the call was sent
+            received {float} -- Time (epoch seconds) the reply was received
+            message {object} -- The reply message (see stamp)
+        """
+        remote = remote_time(message)
+
+        if name is None or remote is None:
+            return
+
+        if name not in self._clocks:
+            self._clocks[name] = Clock(self.samples)
+
+        self._clocks[name].sample(sent, received, remote)
+
+    def offset(self, name):
+        clock = self._clocks.get(name)
+        return clock.offset() if clock else 0.0
+
+    def to_local(self, name, timestamp):
+        return timestamp - self.offset(name)
+
+    def to_remote(self, name, timestamp):
+        return timestamp + self.offset(name)
+
+    def info(self):
+        return {name: clock.info() for name, clock in self._clocks.items()}
@@ -0,0 +1,139 @@
+import os
+import logging
+import threading
+
+import docker
+
+
+logger = logging.getLogger(__name__)
+
+
+# docker clients and container caches, one per process (pid), as
+# a forked process (e.g., scenario playground worker) can not share
+# the connections of its parent
+_clients = {}
+_containers = {}
+_lock = threading.Lock()
+
+# name prefix of the containers Containernet creates for the nodes
+CONTAINERNET_PREFIX = "mn."
+
+
+def client():
+    """Gets the docker client of this process, created (and its
+    server API version negotiated) only once per process
+
+    Returns:
+        docker.DockerClient -- The docker client
+    """
+    pid = os.getpid()
+
+    with _lock:
+        if pid not in _clients:
+            _clients[pid] = docker.from_env()
+            logger.debug(f"Docker client created - pid {pid}")
+
+        return _clients[pid]
+
+
+def node_container(docker_client, name):
+    """Gets the container of a topology node, the one Containernet
+    created (CONTAINERNET_PREFIX and the node name) or, if not
+    found, the one named as the node
+
+    Arguments:
+        docker_client {docker.DockerClient} -- The docker client
+        name {string} -- The node name
+
+    Returns:
+        docker.models.containers.Container -- The container handle
+    """
+    try:
+        return docker_client.containers.get(CONTAINERNET_PREFIX + name)
+    except docker.errors.NotFound:
+        return docker_client.containers.get(name)
+
+
+def containers():
+    """Gets the container handles cache of this process
+
+    Returns:
+        Containers -- The container handles cache
+    """
+    pid = os.getpid()
+
+    with _lock:
+        if pid not in _containers:
+            _containers[pid] = Containers()
+
+        return _containers[pid]
+
+
+class Containers:
+    """Caches docker container handles by name, so operations on
+    a container (e.g., pause, stats) do not inspect it every time
+
+    A handle is dropped when the container is removed by umbra, or
+    when docker does not find it anymore (e.g., it was recreated),
+    in which case the operation is retried once with a new handle.
+    """
+
+    def __init__(self, docker_client=None):
+        self._docker_client = docker_client
+        self._handles = {}
+
+    def _client(self):
+        if not self._docker_client:
+            self._docker_client = client()
+        return self._docker_client
+
+    def get(self, name):
+        handle = self._handles.get(name)
+
+        if handle is None:
+            handle = self._client().containers.get(name)
+            self._handles[name] = handle
+
+        return handle
+
+    def drop(self, name=None):
+        if name:
+            self._handles.pop(name, None)
+        else:
+            self._handles = {}
+
+    def refresh(self, name):
+        """Reloads the attributes (e.g., status) of a container handle
+
+        Arguments:
+            name {string} -- The container name
+
+        Returns:
+            docker.models.containers.Container -- The container handle
+        """
+        handle = self.get(name)
+        handle.reload()
+        return handle
+
+    def call(self, name, method, *args, **kwargs):
+        """Calls a method of a container handle (e.g., pause)
+
+        Arguments:
+            name {string} -- The container name
+            method {string} -- The handle method name
+
+        Returns:
+            object -- The output of the method
+        """
+        cached = name in self._handles
+
+        try:
+            return getattr(self.get(name), method)(*args, **kwargs)
+
+        except docker.errors.NotFound:
+            self.drop(name)
+            if not cached:
+                raise
+
+        logger.debug(f"Docker container {name} handle outdated - retrying {method}")
+        return getattr(self.get(name), method)(*args, **kwargs)
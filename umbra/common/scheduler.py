@@ -1,12 +1,21 @@
 import os
+import time
+import heapq
 import logging
 import asyncio
+import functools
+from collections import deque
 from datetime import datetime
 
 
 logger = logging.getLogger(__name__)
 
 
+# default retention of call results, see Retention
+RESULTS_POLICY = "last"
+RESULTS_KEEP = 1
+
+
 class Loader:
     def __init__(self):
         self._files = []
@@ -77,9 +86,216 @@ class Loader:
             return self._files
 
 
+class Retention:
+    """Keeps the results of the iterations of a scheduled call
+    according to a policy, so long running calls (e.g., repeat
+    of thousands) hold constant memory:
+    - all: keeps every result
+    - last: keeps only the last keep results (default keep 1)
+    - summary: keeps only the amount of iterations per outcome
+    and duration statistics (count, mean, min, max)
+    - sink: hands each result to sink(uid, result) and keeps none
+
+    The policy is set in the call schedule, e.g.:
+    {"repeat": 1000, "results": {"policy": "last", "keep": 10}}
+    """
+
+    POLICIES = ["all", "last", "summary", "sink"]
+
+    def __init__(self, uid, policy=RESULTS_POLICY, keep=RESULTS_KEEP, sink=None):
+        self.uid = uid
+        self.policy = policy if policy in self.POLICIES else RESULTS_POLICY
+        self.sink = sink
+        self._results = deque(maxlen=keep if self.policy == "last" else None)
+        self._summary = {"iterations": 0, "outcomes": {}, "duration": {}}
+
+        if self.policy == "sink" and not sink:
+            logger.info(f"No results sink for call {uid} - keeping last result")
+            self.policy = "last"
+            self._results = deque(maxlen=1)
+
+    def _summarize(self, duration, outcome):
+        summary = self._summary
+        summary["iterations"] += 1
+        summary["outcomes"][outcome] = summary["outcomes"].get(outcome, 0) + 1
+
+        stats = summary["duration"]
+        count = stats.get("count", 0) + 1
+        mean = stats.get("mean", 0.0)
+        stats["mean"] = mean + (duration - mean) / count
+        stats["min"] = min(stats.get("min", duration), duration)
+        stats["max"] = max(stats.get("max", duration), duration)
+        stats["count"] = count
+
+    def add(self, result, duration, outcome):
+        if self.policy == "summary":
+            self._summarize(duration, outcome)
+
+        elif result:
+            if self.policy == "sink":
+                try:
+                    self.sink(self.uid, result)
+                except Exception as e:
+                    logger.debug(f"Could not sink call {self.uid} result - {repr(e)}")
+            else:
+                self._results.append(result)
+
+    def output(self):
+        if self.policy == "summary":
+            return [self._summary] if self._summary["iterations"] else []
+        return list(self._results)
+
+
 class Handler:
     def __init__(self):
         self._tasks = {}
+        self._sink = None
+        self._completions = {}
+        self._conditions = {}
+
+    def stats(self):
+        return {}
+
+    def set_sink(self, sink):
+        """Sets the callable sink(uid, result) used by the calls
+        scheduled with the results policy sink
+
+        Arguments:
+            sink {callable} -- The results sink
+        """
+        self._sink = sink
+
+    def _future(self, futures, key):
+        if key not in futures:
+            futures[key] = asyncio.get_event_loop().create_future()
+        return futures[key]
+
+    def _as_list(self, value):
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+
+    def release(self, condition, ok=True):
+        """Releases the calls waiting (sched "when") on condition
+
+        Arguments:
+            condition {string} -- The condition name (e.g., deployed)
+
+        Keyword Arguments:
+            ok {bool} -- If the condition was met, calls waiting on
+            it with sched "on" success are skipped otherwise (default: {True})
+        """
+        future = self._future(self._conditions, condition)
+        if not future.done():
+            logger.debug(f"Releasing condition {condition} - ok {ok}")
+            future.set_result(ok)
+
+    def clear_conditions(self):
+        self._conditions = {}
+
+    def _complete(self, uid, success):
+        future = self._future(self._completions, uid)
+        if not future.done():
+            future.set_result(success)
+
+    def _reset_completions(self, completed=None):
+        """Clears the completions of calls, marking the ones in
+        completed as completed successfully (e.g., events of a
+        restored snapshot phase), releasing the calls after them
+
+        Keyword Arguments:
+            completed {list} -- The ids of calls already completed (default: {None})
+        """
+        self._completions = {}
+        for uid in completed if completed else []:
+            self._complete(uid, True)
+
+    def _check_dependencies(self, calls):
+        """Removes from calls sched the dependencies (after) on
+        calls that do not exist (nor were completed) or that are
+        part of a cycle, as they would never be released
+
+        Arguments:
+            calls {dict} -- The calls (call, sched) indexed by uid
+        """
+        pending = {}
+
+        for uid, (_, sched) in calls.items():
+            after = self._as_list(sched.get("after"))
+            missing = [
+                dep
+                for dep in after
+                if dep not in calls and dep not in self._completions
+            ]
+
+            if missing:
+                logger.info(f"Call {uid} dependencies {missing} not found - ignored")
+                after = [dep for dep in after if dep not in missing]
+                sched["after"] = after
+
+            pending[uid] = set(dep for dep in after if dep in calls)
+
+        released = [uid for uid, deps in pending.items() if not deps]
+        while released:
+            uid = released.pop()
+            del pending[uid]
+            for dep_uid, deps in pending.items():
+                if uid in deps:
+                    deps.discard(uid)
+                    if not deps:
+                        released.append(dep_uid)
+
+        for uid in pending:
+            logger.info(f"Call {uid} dependencies are in a cycle - ignored")
+            calls[uid][1]["after"] = []
+
+    async def _wait_dependencies(self, uid, sched):
+        """Waits for the calls (sched "after") and conditions
+        (sched "when") a call depends on
+
+        Arguments:
+            uid {string} -- The call unique id
+            sched {dict} -- The call schedule, where "on" defines if the
+            call is released when dependencies complete (default) or
+            only if they succeed (on "success")
+
+        Returns:
+            bool -- True if the call must run, False if it must be skipped
+        """
+        after = self._as_list(sched.get("after"))
+        when = self._as_list(sched.get("when"))
+        on_success = sched.get("on", "complete") == "success"
+
+        if after or when:
+            logger.debug(f"Call {uid} waiting for calls {after} and conditions {when}")
+
+        futures = [self._future(self._completions, dep) for dep in after]
+        futures.extend(self._future(self._conditions, cond) for cond in when)
+
+        for future in futures:
+            success = await future
+            if on_success and not success:
+                logger.info(f"Call {uid} skipped - dependency did not succeed")
+                return False
+
+        return True
+
+    def _skip(self, uid, record):
+        logger.debug(f"Skipping call {uid}")
+        if record:
+            now = time.time()
+            self._record(record, uid, 0, now, now, None, "skipped")
+        self._complete(uid, False)
+
+    def _retention(self, uid, sched):
+        results = sched.get("results", {})
+        retention = Retention(
+            uid,
+            policy=results.get("policy", RESULTS_POLICY),
+            keep=results.get("keep", RESULTS_KEEP),
+            sink=self._sink,
+        )
+        return retention
 
     def _check_finish(self, uid, finish, timeout):
         """Checks if task has reached timeout
@@ -127,6 +343,26 @@ class Handler:
 
         return task_duration
 
+    def _result_outcome(self, result):
+        """Classifies the result of a task, plugins return an ack
+        (e.g., False) or a tuple starting with it (e.g., (False, info))
+
+        Arguments:
+            result {object} -- Output of the task command
+
+        Returns:
+            string -- The outcome of the task (ok, empty or error)
+        """
+        if result is None:
+            return "empty"
+
+        if isinstance(result, tuple):
+            failed = bool(result) and not result[0]
+        else:
+            failed = result is False
+
+        return "error" if failed else "ok"
+
     async def _check_task_result(self, uid, task):
         """Retrieves task output result
 
@@ -135,12 +371,19 @@ class Handler:
             task {coroutine} -- Task coroutine of command call uid
 
         Returns:
-            dict -- Output of task command executed by call
+            tuple -- Output of task command executed by call and
+            the outcome of the task (ok, empty, error or cancelled)
         """
         logger.debug(f"Checking Task {uid}")
         if task.done():
             logger.debug(f"Result Task {uid} Done")
-            result = task.result()
+            try:
+                result = task.result()
+            except Exception as e:
+                logger.debug(f"Task {uid} exception {repr(e)}")
+                result, outcome = None, "error"
+            else:
+                outcome = self._result_outcome(result)
         else:
             logger.debug(f"Cancel Task {uid} Pending")
             task.cancel()
@@ -149,12 +392,47 @@ class Handler:
             except asyncio.CancelledError:
                 logger.debug(f"Task {uid} cancelled")
             finally:
-                result = None
+                result, outcome = None, "cancelled"
 
         logger.debug(f"Task result: {result}")
-        return result
+        return result, outcome
+
+    def _result_size(self, result):
+        if result is None:
+            return 0
+        if isinstance(result, (bytes, str)):
+            return len(result)
+        return len(repr(result))
 
-    async def _schedule(self, uid, call, sched):
+    def _record(self, record, uid, iteration, scheduled, started, result, outcome):
+        """Reports the timing of a call iteration to record
+
+        Arguments:
+            record {callable} -- Called as record(uid, info)
+            uid {string} -- The call unique id
+            iteration {int} -- The call iteration (from 0 to repeat-1)
+            scheduled {float} -- Time (epoch seconds) the iteration was scheduled to
+            started {float} -- Time (epoch seconds) the iteration started
+            result {object} -- The output of the iteration
+            outcome {string} -- The outcome of the iteration
+        """
+        finished = time.time()
+        info = {
+            "iteration": iteration,
+            "scheduled": int(scheduled * 1000),
+            "started": int(started * 1000),
+            "finished": int(finished * 1000),
+            "duration": finished - started,
+            "outcome": outcome,
+            "size": self._result_size(result),
+        }
+
+        try:
+            record(uid, info)
+        except Exception as e:
+            logger.debug(f"Could not record task {uid} iteration - {repr(e)}")
+
+    async def _schedule(self, uid, call, sched, record=None):
         """Executes a call uid to the command cmd following the
         scheduling (time) properties of sched
 
@@ -164,13 +442,18 @@ class Handler:
             sched {dict} -- Contains keys that determine the timely manner
             that the cmd is going to be called
 
+        Keyword Arguments:
+            record {callable} -- Called with the timing/outcome of each
+            call iteration, see _record (default: {None})
+
         Returns:
-            list -- A list of results of the called cmd according to sched parameters
+            list -- A list of results of the called cmd according to sched
+            parameters (retained as defined by the sched results policy)
         """
         logger.debug(f"Scheduling call uid {uid}")
         logger.debug(f"Schedule parameters: {sched}")
         loop = asyncio.get_event_loop()
-        results = []
+        results = self._retention(uid, sched)
 
         begin = sched.get("from", 0)
         finish = sched.get("until", 0)
@@ -181,10 +464,17 @@ class Handler:
         timeout = 0
         task_duration = 0
         repeat = 1 if repeat == 0 else repeat
+        outcome = None
+        task = None
 
         try:
-            for _ in range(repeat):
+            if not await self._wait_dependencies(uid, sched):
+                self._skip(uid, record)
+                return results.output()
 
+            for iteration in range(repeat):
+
+                scheduled = time.time() + begin
                 await asyncio.sleep(begin)
                 begin = interval
 
@@ -195,18 +485,25 @@ class Handler:
                     logger.debug(f"Call is not coroutine")
                     aw = call()
 
+                started = time.time()
                 task = loop.create_task(aw)
                 logger.debug(f"Task {uid} created {task}")
 
                 task_duration = await self._check_task(uid, task, duration)
-                result = await self._check_task_result(uid, task)
+                result, outcome = await self._check_task_result(uid, task)
+
+                if record:
+                    self._record(
+                        record, uid, iteration, scheduled, started, result, outcome
+                    )
 
                 if result:
                     logger.debug(f"Task {uid} result available")
-                    results.append(result)
                 else:
                     logger.debug(f"Task {uid} result unavailable")
 
+                results.add(result, task_duration, outcome)
+
                 timeout += task_duration + interval
                 if self._check_finish(uid, finish, timeout):
                     break
@@ -214,7 +511,7 @@ class Handler:
             logger.debug(f"Cancelling task {uid}")
 
             try:
-                if not task.done():
+                if task and not task.done():
                     task.cancel()
                     await task
 
@@ -222,39 +519,52 @@ class Handler:
                 logger.debug(f"Task {uid} cancelled")
 
         finally:
-            return results
+            self._complete(uid, outcome == "ok")
+            return results.output()
 
-    async def _build(self, calls):
+    async def _build(self, calls, record=None):
         """Builds list of command calls as coroutines to be
         executed by asyncio loop
 
         Arguments:
             calls {list} -- List of command calls
 
+        Keyword Arguments:
+            record {callable} -- Called with the timing/outcome of each
+            call iteration (default: {None})
+
         Returns:
             list -- Set of coroutines scheduled to be called
         """
         logger.debug(f"Building calls into coroutines")
         aws = {}
         for uid, (call, call_sched) in calls.items():
-            aw = self._schedule(uid, call, call_sched)
+            aw = self._schedule(uid, call, call_sched, record)
             aws[uid] = aw
 
         return aws
 
-    async def run(self, calls):
+    async def run(self, calls, record=None, completed=None):
         """Executes the list of calls as coroutines
         returning their results
 
         Arguments:
             calls {list} -- Set of commands to be scheduled and called as subprocesses
 
+        Keyword Arguments:
+            record {callable} -- Called as record(uid, info) with the timing
+            and outcome of each call iteration (default: {None})
+            completed {list} -- The ids of calls already completed
+            successfully, not part of calls (default: {None})
+
         Returns:
             dict -- Results of calls (stdout/stderr) indexed by call uid
         """
         results = {}
 
-        aws = await self._build(calls)
+        self._reset_completions(completed)
+        self._check_dependencies(calls)
+        aws = await self._build(calls, record)
 
         logger.debug(f"Running built coroutines")
         tasks = await asyncio.gather(*(aws.values()), return_exceptions=True)
@@ -342,3 +652,318 @@ class Handler:
 
         logger.debug(f"Finished tasks stop")
         return results
+
+
+class QueueHandler(Handler):
+    """Scheduler engine driven by a single priority queue (heap)
+
+    Instead of creating one sleeping coroutine per call (as Handler
+    does), calls are kept in a heap ordered by due time and a single
+    loop dispatches them as tasks only when they are due. At most
+    max_concurrency iterations run at the same time (due calls beyond
+    that wait in the queue, what shows up as lateness).
+
+    Calls can be a dict or an iterator of (uid, (call, sched)) sorted
+    by sched "from"; iterators are consumed lazily, only taking calls
+    due within lookahead seconds, so the heap size depends on the
+    calls due/running and not on the timeline length.
+    The schedule semantics (from, until, duration, repeat, interval,
+    results, after, when, on) are the same of Handler, calls with
+    dependencies only enter the heap once they are released. Once an
+    iterator is exhausted, dependencies on calls it did not have or
+    that are part of a cycle are ignored (see _unblock), as it is
+    done upfront for dicts.
+    """
+
+    MAX_CONCURRENCY = 512
+    LOOKAHEAD = 1.0
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, lookahead=LOOKAHEAD):
+        Handler.__init__(self)
+        self.max_concurrency = max_concurrency
+        self.lookahead = lookahead
+        self._heap = []
+        self._seq = 0
+        self._states = {}
+        self._running = set()
+        self._blocked = {}
+        self._seen = set()
+        self._results = {}
+        self._wakeup = None
+        self._metrics = {}
+        self._clear_metrics()
+
+    def _clear_metrics(self):
+        self._metrics = {
+            "dispatched": 0,
+            "completed": 0,
+            "queue_depth_max": 0,
+            "lateness": {"count": 0, "mean": 0.0, "max": 0.0},
+        }
+
+    def stats(self):
+        """Gets the engine metrics
+
+        Returns:
+            dict -- queue_depth (calls waiting in the heap), running
+            (iterations in execution), dispatched/completed iterations,
+            queue_depth_max and lateness (seconds between due and
+            dispatch times: count, mean, max)
+        """
+        stats = {
+            "queue_depth": len(self._heap),
+            "running": len(self._running),
+            "blocked": len(self._blocked),
+        }
+        stats.update(self._metrics)
+        return stats
+
+    def _lateness(self, lateness):
+        stats = self._metrics["lateness"]
+        stats["count"] += 1
+        stats["mean"] += (lateness - stats["mean"]) / stats["count"]
+        stats["max"] = max(stats["max"], lateness)
+
+    def _push(self, due, uid):
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, uid))
+        depth = len(self._heap)
+        self._metrics["queue_depth_max"] = max(self._metrics["queue_depth_max"], depth)
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _add(self, uid, call, sched, start, record):
+        self._seen.add(uid)
+        self._states[uid] = {
+            "call": call,
+            "sched": sched,
+            "iteration": 0,
+            "timeout": 0,
+            "results": self._retention(uid, sched),
+        }
+
+        if sched.get("after") or sched.get("when"):
+            self._blocked[uid] = asyncio.ensure_future(self._release(uid, record))
+        else:
+            self._push(start + sched.get("from", 0), uid)
+
+    async def _release(self, uid, record):
+        sched = self._states[uid]["sched"]
+
+        try:
+            ok = await self._wait_dependencies(uid, sched)
+        finally:
+            # unless it was replaced (see _unblock)
+            if self._blocked.get(uid) is asyncio.current_task():
+                self._blocked.pop(uid, None)
+
+        if ok:
+            self._push(asyncio.get_event_loop().time() + sched.get("from", 0), uid)
+        else:
+            self._skip(uid, record)
+            self._results[uid] = {}
+            self._states.pop(uid, None)
+            self._wakeup.set()
+
+    def _unblock(self, record):
+        """Releases the blocked calls whose dependencies (after) would
+        never complete, once all the calls were fed: calls that were
+        not in the calls iterator, or that are part of a cycle
+        """
+        after = {
+            uid: self._as_list(self._states[uid]["sched"].get("after"))
+            for uid in self._blocked
+        }
+        pending = {
+            uid: set(dep for dep in deps if dep in after) for uid, deps in after.items()
+        }
+
+        released = [uid for uid, deps in pending.items() if not deps]
+        while released:
+            uid = released.pop()
+            del pending[uid]
+            for dep_uid, deps in pending.items():
+                if uid in deps:
+                    deps.discard(uid)
+                    if not deps:
+                        released.append(dep_uid)
+
+        for uid, deps in after.items():
+            missing = [dep for dep in deps if dep not in self._seen]
+
+            if uid in pending:
+                logger.info(f"Call {uid} dependencies are in a cycle - ignored")
+                deps = []
+            elif missing:
+                logger.info(f"Call {uid} dependencies {missing} not found - ignored")
+                deps = [dep for dep in deps if dep in self._seen]
+            else:
+                continue
+
+            self._states[uid]["sched"]["after"] = deps
+            self._blocked[uid].cancel()
+            self._blocked[uid] = asyncio.ensure_future(self._release(uid, record))
+
+    def _feed(self, calls, pending, start, now, record):
+        """Moves the calls due within lookahead from the calls
+        iterator to the heap
+
+        Returns:
+            tuple -- The next call not yet due (or None) and a flag
+            telling if the calls iterator is exhausted
+        """
+        while True:
+            if pending is None:
+                try:
+                    pending = next(calls)
+                except StopIteration:
+                    return None, True
+
+            uid, (call, sched) = pending
+            due = start + sched.get("from", 0)
+
+            if due > now + self.lookahead and self._heap:
+                return pending, False
+
+            self._add(uid, call, sched, start, record)
+            pending = None
+
+    async def _iterate(self, uid, due, record):
+        loop = asyncio.get_event_loop()
+        state = self._states[uid]
+        sched = state["sched"]
+        call = state["call"]
+
+        scheduled = time.time() - (loop.time() - due)
+        self._lateness(loop.time() - due)
+
+        aw = call if asyncio.iscoroutine(call) else call()
+
+        started = time.time()
+        task = loop.create_task(aw)
+        logger.debug(f"Task {uid} created {task}")
+
+        try:
+            task_duration = await self._check_task(uid, task, sched.get("duration", 0))
+            result, outcome = await self._check_task_result(uid, task)
+        except asyncio.CancelledError:
+            if not task.done():
+                task.cancel()
+            raise
+
+        if record:
+            self._record(
+                record, uid, state["iteration"], scheduled, started, result, outcome
+            )
+
+        state["results"].add(result, task_duration, outcome)
+
+        interval = sched.get("interval", 0)
+        repeat = sched.get("repeat", 0) or 1
+        state["iteration"] += 1
+        state["timeout"] += task_duration + interval
+
+        finished = self._check_finish(uid, sched.get("until", 0), state["timeout"])
+
+        if state["iteration"] < repeat and not finished:
+            self._push(loop.time() + interval, uid)
+            return None
+
+        self._complete(uid, outcome == "ok")
+        return state["results"].output()
+
+    def _done(self, uid, task):
+        self._running.discard(task)
+        self._metrics["completed"] += 1
+
+        if task.cancelled() or task.exception():
+            logger.debug(f"Could not run call {uid} - {task}")
+            self._results[uid] = {}
+            self._states.pop(uid, None)
+            self._complete(uid, False)
+        else:
+            output = task.result()
+            if output is not None:
+                self._results[uid] = output.pop() if output else {}
+                self._states.pop(uid, None)
+
+        self._wakeup.set()
+
+    async def run(self, calls, record=None, completed=None):
+        """Executes the calls as tasks dispatched when they are due
+        returning their results
+
+        Arguments:
+            calls {dict} -- Calls (call, sched) indexed by uid, or an
+            iterator of (uid, (call, sched)) sorted by sched from
+
+        Keyword Arguments:
+            record {callable} -- Called as record(uid, info) with the timing
+            and outcome of each call iteration (default: {None})
+            completed {list} -- The ids of calls already completed
+            successfully, not part of calls (default: {None})
+
+        Returns:
+            dict -- Results of calls indexed by call uid
+        """
+        loop = asyncio.get_event_loop()
+        self._results = results = {}
+        self._reset_completions(completed)
+
+        if isinstance(calls, dict):
+            self._check_dependencies(calls)
+            calls = iter(sorted(calls.items(), key=lambda c: c[1][1].get("from", 0)))
+
+        self._heap, self._states, self._running = [], {}, set()
+        self._blocked, self._seen = {}, set(completed if completed else [])
+        self._wakeup = asyncio.Event()
+        self._clear_metrics()
+
+        start = loop.time()
+        pending, exhausted = None, False
+
+        try:
+            while True:
+                self._wakeup.clear()
+                now = loop.time()
+
+                if not exhausted:
+                    pending, exhausted = self._feed(calls, pending, start, now, record)
+                    if exhausted:
+                        self._unblock(record)
+
+                while (
+                    self._heap
+                    and self._heap[0][0] <= now
+                    and len(self._running) < self.max_concurrency
+                ):
+                    due, _, uid = heapq.heappop(self._heap)
+                    task = loop.create_task(self._iterate(uid, due, record))
+                    task.add_done_callback(functools.partial(self._done, uid))
+                    self._running.add(task)
+                    self._metrics["dispatched"] += 1
+
+                if exhausted and not (self._heap or self._running or self._blocked):
+                    break
+
+                delays = []
+                if self._heap and len(self._running) < self.max_concurrency:
+                    delays.append(self._heap[0][0])
+                if pending is not None:
+                    delays.append(start + pending[1][1].get("from", 0) - self.lookahead)
+                delay = max(0, min(delays) - loop.time()) if delays else None
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+        except asyncio.CancelledError:
+            logger.debug(f"Cancelling queue handler tasks")
+            tasks = list(self._running) + list(self._blocked.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        logger.debug(f"Queue handler finished - stats {self.stats()}")
+        return results
@@ -1,14 +1,23 @@
 import os
+import copy
+import heapq
+import random
 import subprocess
 import logging
 import json
-import yaml
+import hashlib
 import networkx as nx
 import ipaddress
 from networkx.readwrite import json_graph
 from yaml import load, dump
 from collections import defaultdict
 
+# libyaml (C) loader/dumper when available
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,6 +31,38 @@ BASE_TOPOLOGIES_FOLDER = "./topos/base/"
 # port that umbra-agent binds
 AGENT_PORT = 8910
 
+# subnet of the addresses assigned to the nodes interfaces
+IP_NETWORK = "172.31.0.0/16"
+
+
+class NoAliasDumper(SafeDumper):
+    def ignore_aliases(self, data):
+        return True
+
+
+def write_if_changed(content, filepath):
+    """Writes content to filepath, unless the file already has
+    the same content (keeping it untouched)
+
+    Arguments:
+        content {string} -- The file content
+        filepath {string} -- The file path
+
+    Returns:
+        bool -- If the file was written
+    """
+    try:
+        with open(filepath, "r") as infile:
+            if infile.read() == content:
+                logger.debug("file unchanged %s - not written", filepath)
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+
+    with open(filepath, "w") as outfile:
+        outfile.write(content)
+    return True
+
 
 class Graph:
     def __init__(self):
@@ -72,9 +113,8 @@ class Graph:
             return data
 
     def writefile_json(self, data, filename):
-        with open(filename, "w") as outfile:
-            json.dump(data, outfile, indent=4, sort_keys=True)
-            return True
+        write_if_changed(json.dumps(data, indent=4, sort_keys=True), filename)
+        return True
 
     def readfile_txt(self, filename, base):
         filename = self.parse_filename(filename, base=base)
@@ -83,9 +123,8 @@ class Graph:
             return data
 
     def writefile_txt(self, data, filename):
-        with open(filename, "w") as outfile:
-            outfile.writelines(data)
-            return True
+        write_if_changed("".join(data), filename)
+        return True
 
     def save_graph(self, graph, filename, parse_filename=True, base=False):
         if parse_filename:
@@ -120,6 +159,116 @@ class Graph:
         return path
 
 
+class AddressPool:
+    """Allocates host addresses from one or more subnets in O(1),
+    by integer offset over the hosts of the subnets (in order), e.g.,
+    offset 0 is the first host of the first subnet
+
+    Addresses are allocated sequentially (reusing the lowest released
+    offset first), at a given offset, or hashed by key (if hashed), so
+    the address of a key (e.g., node interface name) does not depend
+    on the order the nodes are added. Allocating a key already
+    allocated returns its address.
+    """
+
+    def __init__(self, subnets=None, hashed=False):
+        subnets = subnets if subnets else [IP_NETWORK]
+        self.subnets = [ipaddress.ip_network(subnet) for subnet in subnets]
+        self.hashed = hashed
+        self._sizes = [self._hosts(subnet) for subnet in self.subnets]
+        self._size = sum(self._sizes)
+        self._next = 0
+        self._released = []
+        self._offsets = {}
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def _hosts(self, subnet):
+        if subnet.num_addresses <= 2:
+            return subnet.num_addresses
+        return subnet.num_addresses - 2
+
+    def address(self, offset):
+        """Gets the address of an offset
+
+        Arguments:
+            offset {int} -- The offset over the hosts of the subnets
+
+        Returns:
+            string -- The address with prefix (e.g., 172.31.0.1/16)
+        """
+        if offset < 0 or offset >= self._size:
+            raise ValueError(f"Address offset {offset} out of pool size {self._size}")
+
+        for subnet, size in zip(self.subnets, self._sizes):
+            if offset < size:
+                first = 0 if subnet.num_addresses <= 2 else 1
+                ip = subnet.network_address + first + offset
+                return f"{ip}/{subnet.prefixlen}"
+            offset -= size
+
+    def _take(self, offset, key):
+        address = self.address(offset)
+        self._offsets[offset] = key
+        if key is not None:
+            self._keys[key] = offset
+        return address
+
+    def _free_offset(self, key):
+        if self.hashed and key is not None:
+            digest = hashlib.sha256(str(key).encode("utf-8")).hexdigest()
+            offset = int(digest, 16) % self._size
+            while offset in self._offsets:
+                offset = (offset + 1) % self._size
+            return offset
+
+        while self._released:
+            offset = heapq.heappop(self._released)
+            if offset not in self._offsets:
+                return offset
+
+        while self._next in self._offsets:
+            self._next += 1
+
+        offset = self._next
+        self._next += 1
+        return offset
+
+    def allocate(self, key=None):
+        """Allocates an address
+
+        Keyword Arguments:
+            key {string} -- The address owner (default: {None})
+
+        Returns:
+            string -- The address with prefix (e.g., 172.31.0.1/16)
+        """
+        if key is not None and key in self._keys:
+            return self.address(self._keys[key])
+
+        if len(self._offsets) >= self._size:
+            raise ValueError(f"Address pool exhausted - {self._size} addresses")
+
+        return self._take(self._free_offset(key), key)
+
+    def allocate_at(self, offset, key=None):
+        if offset in self._offsets:
+            raise ValueError(f"Address offset {offset} already allocated")
+        return self._take(offset, key)
+
+    def release(self, key=None, offset=None):
+        """Releases the address of a key (or offset) to be reused"""
+        if key is not None:
+            offset = self._keys.get(key)
+
+        if offset in self._offsets:
+            owner = self._offsets.pop(offset)
+            self._keys.pop(owner, None)
+            heapq.heappush(self._released, offset)
+
+
 class Profile:
     def __init__(self, profile_name):
         self.name = profile_name
@@ -127,10 +276,12 @@ class Profile:
         self.link_ids = 5000
         self.nodes = {}
         self.links = {}
+        self._indexes = {}
 
     def load(self, data):
         self.nodes = data.get("nodes", {})
         self.links = data.get("links", {})
+        self._indexes = {}
 
     def dump(self):
         profile = {
@@ -165,6 +316,7 @@ class Profile:
             "resources": node_resources,
         }
         self.nodes[node_id] = node
+        self._indexes = {}
         return node
 
     def add_link(self, link_resources, link_type):
@@ -176,6 +328,7 @@ class Profile:
             "resources": link_resources,
         }
         self.links[link_id] = link
+        self._indexes = {}
         return link
 
     def get_node(self, node):
@@ -190,18 +343,35 @@ class Profile:
         profile = {"resources": resources}
         return profile
 
+    def _index(self, where, items):
+        """Indexes the resources of items by profile, the last item
+        of a profile taking precedence, so each look_for is O(1)
+        instead of a scan over all the profiles of a topology
+
+        Arguments:
+            where {string} -- The kind of items (nodes, links)
+            items {dict} -- The nodes or links profiles
+
+        Returns:
+            dict -- The resources indexed by profile
+        """
+        size, index = self._indexes.get(where, (None, None))
+        if size != len(items):
+            index = {v["profile"]: v["resources"] for (k, v) in items.items()}
+            self._indexes[where] = (len(items), index)
+        return index
+
     def look_for(self, _type, where):
         if where == "nodes":
-            itemset = self.nodes.items()
+            items = self.nodes
         elif where == "links":
-            itemset = self.links.items()
+            items = self.links
         else:
             logger.debug("Could not look for profile where %s", where)
             return {}
-        types = [(k, v) for (k, v) in itemset if v["profile"] == _type]
-        if types:
-            (k, v) = types.pop()
-            resources = v["resources"]
+        index = self._index(where, items)
+        if _type in index:
+            resources = index[_type]
             return resources
         else:
             logger.debug("Could not look for profile where %s type %s", where, _type)
@@ -215,6 +385,7 @@ class Lifecycle:
         self.link_ids = 5000
         self.nodes = {}
         self.links = {}
+        self._indexes = {}
 
     def build_node_workflow(self, name, parameters, method, implementation):
         workflow = {
@@ -235,6 +406,7 @@ class Lifecycle:
             "workflows": workflows,
         }
         self.nodes[node_id] = node
+        self._indexes = {}
         return node
 
     def get_node(self, node):
@@ -243,16 +415,22 @@ class Lifecycle:
         lifecycle = {"lifecycle": workflows}
         return lifecycle
 
+    def _index(self, where, items):
+        size, index = self._indexes.get(where, (None, None))
+        if size != len(items):
+            index = {v["name"]: v["workflows"] for (k, v) in items.items()}
+            self._indexes[where] = (len(items), index)
+        return index
+
     def look_for(self, name, where):
         if where == "nodes":
-            itemset = self.nodes.items()
+            items = self.nodes
         else:
             # logger.warning("Could not look for workflows where %s", where)
             return None
-        types = [(k, v) for (k, v) in itemset if v["name"] == name]
-        if types:
-            (k, v) = types.pop()
-            workflows = v["workflows"]
+        index = self._index(where, items)
+        if name in index:
+            workflows = index[name]
             return workflows
         else:
             # logger.error("Could not look for workflows where %s name %s", where, name)
@@ -261,6 +439,7 @@ class Lifecycle:
     def load(self, data):
         self.nodes = data.get("nodes", {})
         self.links = data.get("links", {})
+        self._indexes = {}
 
     def dump(self):
         lifecycle = {
@@ -271,6 +450,9 @@ class Lifecycle:
 
 
 class Topology(Graph):
+    # base files data memoized by path (see read_base_file)
+    _base_files = {}
+
     def __init__(self, name, model, profile_name=None):
         Graph.__init__(self)
         self.name = name
@@ -475,53 +657,72 @@ class Topology(Graph):
             print("src", src, "dst", dst, "data", data)
 
     def build_environments(self):
+        """Splits the topology into the nodes and links of each
+        environment, in a single pass over the graph nodes and edges
+
+        A switch takes into its environment the links to all its
+        neighbours (the first link of each neighbour), and the
+        neighbour nodes of its internal links. Every container
+        node is in its own environment too.
+
+        Returns:
+            dict -- The nodes and links indexed by environment
+        """
         logger.debug("Topology build environment")
         envs = {}
+        switches = {}
+        containers = []
 
-        switches = []
         for n, data in self.graph.nodes(data=True):
-            node = data
-            if node.get("type") == "switch":
-                switches.append(n)
+            node_type = data.get("type")
+
+            if node_type == "switch":
+                sw_env = data.get("environment")
+                if sw_env not in envs:
+                    envs[sw_env] = {
+                        "nodes": {},
+                        "links": {},
+                    }
+                envs[sw_env]["nodes"][n] = data
+                switches[n] = envs[sw_env]
 
-        logger.debug(f"Node switches: {switches}")
+            elif node_type == "container":
+                containers.append((n, data))
 
-        for sw in switches:
-            sw_data = self.graph.nodes[sw]
+        logger.debug(f"Node switches: {len(switches)}")
 
-            logger.debug(f"Node switch {sw} data: {sw_data}")
+        for src, dst, key, data in self.graph.edges(keys=True, data=True):
+            if key != 0:
+                continue
 
-            sw_env = sw_data.get("environment")
+            edge_type = data.get("type")
+            if edge_type not in ("internal", "external"):
+                continue
 
-            if sw_env not in envs:
-                envs[sw_env] = {
-                    "nodes": {},
-                    "links": {},
-                }
-
-            envs[sw_env]["nodes"][sw] = sw_data
+            for sw, sw_neigh in ((src, dst), (dst, src)):
+                sw_env = switches.get(sw)
 
-            for sw_neigh in self.graph.neighbors(sw):
-                sw_edge_data = self.graph.get_edge_data(sw, sw_neigh, 0)
-                sw_edge_type = sw_edge_data.get("type")
+                if sw_env is not None:
+                    link_id = sw + "-" + sw_neigh
+                    sw_env["links"][link_id] = data
 
-                link_id = sw + "-" + sw_neigh
+                    if edge_type == "internal":
+                        sw_env["nodes"][sw_neigh] = self.graph.nodes[sw_neigh]
 
-                if sw_edge_type == "internal":
-                    envs[sw_env]["links"][link_id] = sw_edge_data
-                    sw_neigh_data = self.graph.nodes[sw_neigh]
-                    envs[sw_env]["nodes"][sw_neigh] = sw_neigh_data
+                if src == dst:
+                    break
 
-                if sw_edge_type == "external":
-                    envs[sw_env]["links"][link_id] = sw_edge_data
+        for n, data in containers:
+            node_env = data.get("environment")
 
-        for n, data in self.graph.nodes(data=True):
-            node = data
-            if node.get("type") == "container":
-                node_env = node.get("environment")
+            if node_env not in envs:
+                envs[node_env] = {
+                    "nodes": {},
+                    "links": {},
+                }
 
-                if n not in envs[node_env]["nodes"]:
-                    envs[node_env]["nodes"][n] = node
+            if n not in envs[node_env]["nodes"]:
+                envs[node_env]["nodes"][n] = data
 
         return envs
 
@@ -689,30 +890,54 @@ class Topology(Graph):
         data = {}
         try:
             with open(filepath, "r") as f:
-                data = load(f, Loader=yaml.SafeLoader)
+                data = load(f, Loader=SafeLoader)
         except Exception as e:
             logger.debug("exception: could not read file %s - %s", filepath, e)
         finally:
             return data
 
+    def read_base_file(self, filepath):
+        """Reads a base (template) file, memoized by its path and
+        modification time, as templates are read for every node added
+
+        The data returned is shared, so it must be copied before
+        being modified
+
+        Arguments:
+            filepath {string} -- The base file path
+
+        Returns:
+            dict -- The file data
+        """
+        try:
+            mtime = os.path.getmtime(filepath)
+        except OSError:
+            mtime = None
+
+        cached = Topology._base_files.get(filepath)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        data = self.read_file(filepath)
+        Topology._base_files[filepath] = (mtime, data)
+        return data
+
     def write_file(self, data, filepath):
-        noalias_dumper = yaml.dumper.SafeDumper
-        noalias_dumper.ignore_aliases = lambda self, data: True
         try:
-            with open(filepath, "w") as f:
-                dump(
-                    data,
-                    f,
-                    indent=4,
-                    default_flow_style=False,
-                    explicit_start=True,
-                    Dumper=noalias_dumper,
-                )
-                # dump(data, f, default_flow_style=False)
+            content = dump(
+                data,
+                indent=4,
+                default_flow_style=False,
+                explicit_start=True,
+                Dumper=NoAliasDumper,
+            )
+            written = write_if_changed(content, filepath)
         except Exception as e:
             logger.debug("exception: could not write file %s - %s", filepath, e)
         else:
-            logger.debug("write file ok %s - \n%s", filepath, data)
+            logger.debug(
+                "write file ok %s (written %s) - \n%s", filepath, written, data
+            )
 
     def _join_full_path(self, temp_dir, filename):
         return os.path.normpath(
@@ -749,6 +974,109 @@ class EventsFabric:
         self._events = data
 
 
+class EventsGenerator:
+    """Compact spec of a stream of events, expanded lazily and
+    deterministically (same seed, same events) by the broker
+
+    A spec contains:
+    'template': the event arguments (e.g., a fabric chaincode_invoke
+        event), where string values can refer to params as {name}
+    'params': distributions of the values of params, by name, set in
+        the template key name and used to format its strings:
+        {"type": "choice", "values": [...]}
+        {"type": "uniform", "min": a, "max": b}
+        {"type": "randint", "min": a, "max": b}
+        {"type": "sequence", "start": a, "step": b}
+    'count': amount of events generated
+    'rate': events per second (from the schedule 'from' on)
+    'arrival': uniform (1/rate apart) or poisson (exponential
+        inter-arrival times with mean 1/rate)
+    'seed': seed of the random generator
+    """
+
+    DISTRIBUTIONS = ["choice", "uniform", "randint", "sequence"]
+
+    def __init__(self, spec):
+        self.spec = spec
+
+    def check(self):
+        params = self.spec.get("params", {})
+        for name, param in params.items():
+            if param.get("type") not in self.DISTRIBUTIONS:
+                logger.info(f"Unknown distribution {param.get('type')} of param {name}")
+                return False
+
+        if self.spec.get("count", 0) <= 0 or self.spec.get("rate", 0) <= 0:
+            logger.info(f"Events generator count and rate must be positive")
+            return False
+
+        return True
+
+    def _value(self, rng, param, index):
+        kind = param.get("type")
+
+        if kind == "choice":
+            return rng.choice(param.get("values"))
+        if kind == "uniform":
+            return rng.uniform(param.get("min", 0), param.get("max", 1))
+        if kind == "randint":
+            return rng.randint(param.get("min", 0), param.get("max", 1))
+        if kind == "sequence":
+            return param.get("start", 0) + index * param.get("step", 1)
+
+        return None
+
+    def _format(self, value, values):
+        if isinstance(value, str) and "{" in value:
+            return value.format_map(values)
+        if isinstance(value, dict):
+            return {k: self._format(v, values) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._format(v, values) for v in value]
+        return value
+
+    def expand(self, event):
+        """Generates the events of the spec, in order of schedule from
+
+        Arguments:
+            event {dict} -- The event holding the generator spec
+            (as added by Events.add_generator)
+
+        Returns:
+            generator -- Events (dicts with id, schedule, category and
+            event) with ids formatted as <event id>-<index>
+        """
+        rng = random.Random(self.spec.get("seed", 0))
+        template = self.spec.get("template", {})
+        params = self.spec.get("params", {})
+        rate = float(self.spec.get("rate"))
+        poisson = self.spec.get("arrival", "uniform") == "poisson"
+
+        sched = dict(event.get("schedule", {}))
+        offset = sched.get("from", 0)
+        sched.update({"repeat": 0, "interval": 0})
+
+        for index in range(self.spec.get("count", 0)):
+            values = {
+                name: self._value(rng, param, index) for name, param in params.items()
+            }
+
+            ev_args = self._format(copy.deepcopy(template), values)
+            ev_args.update(values)
+
+            ev_sched = dict(sched)
+            ev_sched["from"] = offset
+
+            yield {
+                "id": f"{event.get('id')}-{index}",
+                "schedule": ev_sched,
+                "category": event.get("category"),
+                "event": ev_args,
+            }
+
+            offset += rng.expovariate(rate) if poisson else 1.0 / rate
+
+
 class Events:
     """
     Use this Event class for event category of: monitor, agent, and environment
@@ -775,7 +1103,19 @@ class Events:
         'interval': delay for the next iteration if 'repeat' is set
         'repeat': repeat the cmd by 'x' iteration. Set to 0 to run
             command only once
-
+        'results': retention of the iteration results, e.g.,
+            {"policy": "summary"} or {"policy": "last", "keep": 10}
+            (policies: all, last, summary, sink - default last 1)
+        'after': event id (or list of ids) that must complete before
+            this event is released, 'from' then counts from that moment
+        'when': condition (or list of) the event waits for, released
+            by the broker: deployed (topology started) or ready (all
+            nodes passed their readiness probes)
+        'on': complete (default) releases the event when dependencies
+            finish, success only if they succeed (skipped otherwise)
+
+        Returns:
+            int -- The event id (to be referred by other events 'after')
         """
         sched = {"from": 0, "until": 0, "duration": 0, "interval": 0, "repeat": 0}
         sched.update(schedule)
@@ -790,6 +1130,74 @@ class Events:
         self._events[ev_id] = event
         self._events_by_category[category].append(event)
         self._ev_id += 1
+        return ev_id
+
+    def add_generator(
+        self,
+        schedule,
+        category,
+        template,
+        params,
+        count,
+        rate,
+        arrival="uniform",
+        seed=0,
+    ):
+        """Adds a compact spec of count events of category, generated
+        from template and params (see EventsGenerator), starting at
+        schedule 'from' and arriving at rate events per second
+        """
+        sched = {"from": 0, "until": 0, "duration": 0, "interval": 0, "repeat": 0}
+        sched.update(schedule)
+
+        ev_id = self._ev_id
+        event = {
+            "id": ev_id,
+            "schedule": sched,
+            "category": category,
+            "generator": {
+                "template": template,
+                "params": params,
+                "count": count,
+                "rate": rate,
+                "arrival": arrival,
+                "seed": seed,
+            },
+        }
+
+        if EventsGenerator(event["generator"]).check():
+            self._events[ev_id] = event
+            self._events_by_category[category].append(event)
+            self._ev_id += 1
+            return ev_id
+
+        logger.info(f"Events generator not added - invalid spec {event}")
+        return None
+
+    def expand(self, events):
+        """Expands the generator specs in events, yielding the
+        events in order of schedule from (events not generated
+        are yielded as they are)
+
+        Arguments:
+            events {list} -- Events (e.g., the output of get_by_category)
+
+        Returns:
+            generator -- The expanded events
+        """
+
+        def begin(event):
+            return event.get("schedule", {}).get("from", 0)
+
+        plain = [event for event in events if "generator" not in event]
+        streams = [sorted(plain, key=begin)]
+
+        for event in events:
+            if "generator" in event:
+                generator = EventsGenerator(event.get("generator"))
+                streams.append(generator.expand(event))
+
+        return heapq.merge(*streams, key=begin)
 
     def build(self):
         return self._events
@@ -811,6 +1219,7 @@ class Experiment:
         self.folder_settings = "/tmp/umbra/"
         self.topology = None
         self.events = Events()
+        self.snapshots = []
 
     def parse(self, data):
         topo = Topology(None, None)
@@ -818,12 +1227,52 @@ class Experiment:
         if ack:
             self.topology = topo
             self.events.parse(data.get("events", {}))
+            self.snapshots = data.get("snapshots", [])
             self.name = data.get("name", None)
             return True
         return False
 
     def add_event(self, sched, category, event):
-        self.events.add(sched, category, event)
+        return self.events.add(sched, category, event)
+
+    def add_event_generator(
+        self, sched, category, template, params, count, rate, **kwargs
+    ):
+        return self.events.add_generator(
+            sched, category, template, params, count, rate, **kwargs
+        )
+
+    def snapshot(self, phase, events, restore=True):
+        """Defines a setup phase, made of the events (ids) that
+        bring the topology to a state (e.g., channel created/joined
+        and chaincode instantiated) to be snapshot once they complete
+
+        If restore, a later start of the same topology restores the
+        latest phase snapshot available (in all environments) and the
+        events of the phases up to it are not scheduled
+
+        Arguments:
+            phase {string} -- The phase name
+            events {list} -- The ids of the events of the phase
+
+        Keyword Arguments:
+            restore {bool} -- If the phase snapshot is restored (default: {True})
+
+        Returns:
+            int -- The id of the snapshot event
+        """
+        sched = {"after": list(events), "on": "success"}
+        ev_args = {"group": "snapshot", "phase": phase}
+        ev_id = self.events.add(sched, "scenario", ev_args)
+
+        snapshot = {
+            "phase": phase,
+            "events": list(events),
+            "event": ev_id,
+            "restore": restore,
+        }
+        self.snapshots.append(snapshot)
+        return ev_id
 
     def set_topology(self, topology):
         self.topology = topology
@@ -840,6 +1289,7 @@ class Experiment:
             "name": self.name,
             "topology": topo_built,
             "events": events_built,
+            "snapshots": self.snapshots,
         }
         return experiment
 
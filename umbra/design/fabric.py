@@ -1,17 +1,36 @@
 import os
+import copy
+import json
+import shutil
+import hashlib
 import logging
-import ipaddress
 import subprocess
 from collections import defaultdict
 
-from umbra.design.basis import Topology
+from umbra.design.basis import Topology, AddressPool
 
 
 logger = logging.getLogger(__name__)
 
 
+# folder of the crypto material and channel artifacts generated
+# (indexed by the hash of their specs), None disables the cache
+FABRIC_CACHE = "/tmp/umbra/cache/fabric/"
+# folders generated by cryptogen
+CRYPTO_DIRS = ["ordererOrganizations", "peerOrganizations"]
+# files generated by configtxgen
+CONFIGTX_FILES = [
+    "genesis.block",
+    "channel.tx",
+    "Org1MSPanchors.tx",
+    "Org2MSPanchors.tx",
+]
+
+
 class FabricTopology(Topology):
-    def __init__(self, name, chaincode_dir=None, clear_dir=True):
+    def __init__(
+        self, name, chaincode_dir=None, clear_dir=True, cache_dir=FABRIC_CACHE
+    ):
         Topology.__init__(self, name, model="fabric")
         self.project_network = "umbra"
         self.network_mode = "umbra"
@@ -25,12 +44,13 @@ class FabricTopology(Topology):
         self._peer_ports = 2000
         self._peer_subports = 51
         self._peer_events_subports = 7053
-        self._ip_network = ipaddress.IPv4Network("172.31.0.0/16")
-        self._ip_network_assigned = []
+        self._ip_pool = AddressPool()
         self._filepath_fabricbase = None
         self._configtx_path = None
         self._configsdk_path = None
         self._chaincode_path = chaincode_dir
+        self._cache_dir = cache_dir
+        self._crypto_key = None
         self._cfgs()
         self.clear_cfgs(clear_dir)
 
@@ -52,8 +72,7 @@ class FabricTopology(Topology):
         self._networks = {}
         self._environments = {}
         self.clear_cfgs()
-        self._ip_network = ipaddress.IPv4Network("172.31.0.0/16")
-        self._ip_network_assigned = []
+        self._ip_pool = AddressPool()
 
     def clear_cfgs(self, clear_dir=True):
         _tmp_dir = self.get_settings()
@@ -321,10 +340,10 @@ class FabricTopology(Topology):
         return org_fqdn, peer_fqdn
 
     def _load_base_profile(self, profile_type):
-        datafile = self.read_file(self._filepath_fabricbase)
+        datafile = self.read_base_file(self._filepath_fabricbase)
         if datafile:
             if profile_type in datafile:
-                profile_template = datafile.get(profile_type)
+                profile_template = copy.deepcopy(datafile.get(profile_type))
                 return profile_template
         return None
 
@@ -361,6 +380,7 @@ class FabricTopology(Topology):
             "working_dir": orderer_template.get("working_dir"),
             "network_mode": self.network_mode,
             "command": orderer_template.get("command"),
+            "probes": [{"type": "tcp", "port": orderer.get("port")}],
         }
         return orderer_kwargs
 
@@ -424,6 +444,7 @@ class FabricTopology(Topology):
             "network_mode": self.network_mode,
             "command": command,
             "environment": node.get("environment"),
+            "probes": [{"type": "tcp", "port": node.get("port")}],
         }
         return node_kwargs
 
@@ -448,12 +469,8 @@ class FabricTopology(Topology):
                     CA.get("ca_fqdn"), "container", CA.get("profile"), **CA_kwargs
                 )
 
-    def get_network_ip(self):
-        available_ips = list(self._ip_network.hosts())
-        available_index = len(self._ip_network_assigned)
-        ip = str(available_ips[available_index]) + "/" + str(self._ip_network.prefixlen)
-        self._ip_network_assigned.append(available_ips[available_index])
-        return ip
+    def get_network_ip(self, key=None):
+        return self._ip_pool.allocate(key)
 
     def _fill_org_anchors(self):
         for org in self.orgs.values():
@@ -496,7 +513,7 @@ class FabricTopology(Topology):
                             peer_fqdn = peer.get("peer_fqdn")
                             intf = peer.get("intf")
                             intf_name = "eth" + str(intf)
-                            intf_ip = self.get_network_ip()
+                            intf_ip = self.get_network_ip(peer_fqdn + ":" + intf_name)
                             self.add_link_nodes(
                                 peer_fqdn,
                                 net_name,
@@ -515,7 +532,7 @@ class FabricTopology(Topology):
                             ca_fqdn = CA.get("ca_fqdn")
                             intf = CA.get("intf")
                             intf_name = "eth" + str(intf)
-                            intf_ip = self.get_network_ip()
+                            intf_ip = self.get_network_ip(ca_fqdn + ":" + intf_name)
                             self.add_link_nodes(
                                 ca_fqdn,
                                 net_name,
@@ -535,7 +552,7 @@ class FabricTopology(Topology):
                         orderer_fqdn = orderer.get("orderer_fqdn")
                         intf = orderer.get("intf")
                         intf_name = "eth" + str(intf)
-                        intf_ip = self.get_network_ip()
+                        intf_ip = self.get_network_ip(orderer_fqdn + ":" + intf_name)
                         self.add_link_nodes(
                             orderer_fqdn,
                             net_name,
@@ -568,7 +585,9 @@ class FabricTopology(Topology):
                                 peer_fqdn = peer.get("peer_fqdn")
                                 intf = peer.get("intf")
                                 intf_name = "eth" + str(intf)
-                                intf_ip = self.get_network_ip()
+                                intf_ip = self.get_network_ip(
+                                    peer_fqdn + ":" + intf_name
+                                )
                                 self.add_link_nodes(
                                     peer_fqdn,
                                     net_name,
@@ -588,7 +607,7 @@ class FabricTopology(Topology):
                                 ca_fqdn = CA.get("ca_fqdn")
                                 intf = CA.get("intf")
                                 intf_name = "eth" + str(intf)
-                                intf_ip = self.get_network_ip()
+                                intf_ip = self.get_network_ip(ca_fqdn + ":" + intf_name)
                                 self.add_link_nodes(
                                     ca_fqdn,
                                     net_name,
@@ -821,6 +840,105 @@ class FabricTopology(Topology):
             logger.debug("Return code %s - output %s", return_code, answer)
             return return_code, answer
 
+    def _call_all(self, cmds):
+        """Runs the (independent) commands concurrently
+
+        Arguments:
+            cmds {list} -- The commands (each a list of args)
+
+        Returns:
+            list -- The (return code, output) of each command
+        """
+        processes = []
+        for args in cmds:
+            try:
+                p = subprocess.Popen(
+                    args,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                )
+                logger.debug("process started %s", p.pid)
+            except OSError:
+                p = None
+            processes.append(p)
+
+        outputs = []
+        for p in processes:
+            if p:
+                out, err = p.communicate()
+                answer = out if p.returncode == 0 else err
+                outputs.append((p.returncode, answer))
+            else:
+                outputs.append((-1, "ERROR: exception OSError"))
+
+        logger.debug("Return codes and outputs %s", outputs)
+        return outputs
+
+    def _cache_key(self, *specs):
+        specs_str = json.dumps(specs, sort_keys=True, default=str)
+        return hashlib.sha256(specs_str.encode("utf-8")).hexdigest()
+
+    def _cache_load(self, key, names):
+        """Copies the files/folders (names) cached with key into the
+        settings folder
+
+        Returns:
+            bool -- If the names were cached (and copied)
+        """
+        if not self._cache_dir:
+            return False
+
+        cache_path = os.path.join(self._cache_dir, key)
+        if not os.path.isdir(cache_path):
+            return False
+
+        output_path = self._full_path(self.get_settings())
+
+        for name in names:
+            src = os.path.join(cache_path, name)
+            dst = os.path.join(output_path, name)
+
+            if os.path.isdir(src):
+                shutil.rmtree(dst, ignore_errors=True)
+                shutil.copytree(src, dst)
+            else:
+                shutil.copy2(src, dst)
+
+        logger.info(f"Loaded Fabric cached {names} - {cache_path}")
+        return True
+
+    def _cache_save(self, key, names):
+        """Copies the files/folders (names) generated in the settings
+        folder into the cache, indexed by key
+        """
+        if not self._cache_dir:
+            return
+
+        cache_path = os.path.join(self._cache_dir, key)
+        tmp_path = cache_path + ".tmp"
+        output_path = self._full_path(self.get_settings())
+
+        try:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+
+            for name in names:
+                src = os.path.join(output_path, name)
+                dst = os.path.join(tmp_path, name)
+
+                if os.path.isdir(src):
+                    shutil.copytree(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+
+            os.rename(tmp_path, cache_path)
+            logger.info(f"Saved Fabric cache {names} - {cache_path}")
+
+        except OSError as e:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            logger.debug(f"Could not save Fabric cache {cache_path} - {repr(e)}")
+
     def _build_crypto_config(self):
         crypto_config = {"OrdererOrgs": [], "PeerOrgs": []}
 
@@ -857,6 +975,10 @@ class FabricTopology(Topology):
         logger.info("Saving Fabric crypto config file %s", filepath)
         self.write_file(crypto_config, filepath)
 
+        self._crypto_key = self._cache_key(crypto_config, output_path)
+        if self._cache_load(self._crypto_key, CRYPTO_DIRS):
+            return
+
         cmd = [self._join_full_path("../../deps/fabric/", "cryptogen")]
         args = ["generate", "--config", filepath, "--output", output_path]
         cmd.extend(args)
@@ -864,7 +986,10 @@ class FabricTopology(Topology):
             "Generating  crypto-config.yaml folder structure - calling cryptogen"
         )
         logger.debug("Calling %s", cmd)
-        self._call(cmd)
+        return_code, _ = self._call(cmd)
+
+        if return_code == 0:
+            self._cache_save(self._crypto_key, CRYPTO_DIRS)
 
     def get_node_dir(self, node, orderer=False):
         _tmp_dir = self.get_settings()
@@ -1027,17 +1152,17 @@ class FabricTopology(Topology):
             "org1MSP",
         ]
 
-        self._build_configtx_call(cmd, genesis_args)
-        self._build_configtx_call(cmd, channel_args)
-        self._build_configtx_call(cmd, anchor_args1)
-        self._build_configtx_call(cmd, anchor_args2)
-
-    def _build_configtx_call(self, cmd, args):
-        cmd_list = []
-        cmd_list.append(cmd)
-        cmd_list.extend(args)
-        logger.debug("Calling %s", cmd_list)
-        self._call(cmd_list)
+        configtx_args = [genesis_args, channel_args, anchor_args1, anchor_args2]
+
+        # artifacts depend on the crypto material (e.g., msp certs)
+        configtx_key = self._cache_key(self._crypto_key, self._config_tx, configtx_args)
+        if self._cache_load(configtx_key, CONFIGTX_FILES):
+            return
+
+        outputs = self._call_all([[cmd] + args for args in configtx_args])
+
+        if all(return_code == 0 for return_code, _ in outputs):
+            self._cache_save(configtx_key, CONFIGTX_FILES)
 
     def _get_org_users(self, org, is_orderer=False):
         org_dir = self.get_org_dir(org, orderer=is_orderer)
@@ -1,19 +1,31 @@
 import os
+import copy
 import json
+import hashlib
 import logging
-import ipaddress
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 import iroha
 
-from umbra.design.basis import Topology
+from umbra.design.basis import Topology, AddressPool
 from umbra.design.base.iroha.iroha_genesis import genesis_base as iroha_genesis
 
 logger = logging.getLogger(__name__)
 
 
+# file of the keys generated per account/node (fqdn), None disables it,
+# it holds private keys, so it is only readable by its owner (mode 0600)
+IROHA_KEYS_CACHE = "/tmp/umbra/cache/iroha/keys.json"
+IROHA_KEYS_CACHE_MODE = 0o600
+# max amount of threads writing the nodes config files
+IROHA_WRITERS = 8
+
+
 class IrohaTopology(Topology):
-    def __init__(self, name, clear_dir=True):
+    def __init__(
+        self, name, clear_dir=True, keys_cache=IROHA_KEYS_CACHE, keys_seed=None
+    ):
         Topology.__init__(self, name, model="iroha")
         self.project_network = "umbra"
         self.network_mode = "umbra"
@@ -30,8 +42,11 @@ class IrohaTopology(Topology):
         self._postgres_command = (
             "docker-entrypoint.sh -c 'max_prepared_transactions=100'"
         )
-        self._ip_network = ipaddress.IPv4Network("172.31.0.0/16")
-        self._ip_network_assigned = []
+        self._ip_pool = AddressPool()
+        self._keys_cache = keys_cache
+        self._keys_seed = keys_seed
+        self._keys = None
+        self._keys_updated = False
         self._format_iroha_admin()
         self._format_iroha_test()
         self._cfgs()
@@ -53,23 +68,24 @@ class IrohaTopology(Topology):
         self._networks = {}
         self._node_postgres_port = 5432
         self._torii_port = 10101
-        self._ip_network = ipaddress.IPv4Network("172.31.0.0/16")
-        self._ip_network_assigned = []
+        self._ip_pool = AddressPool()
         self.clear_cfgs()
 
     def _format_iroha_admin(self):
-        keys = self._format_node_keys()
+        account = "admin@" + self.domain
+        keys = self._format_node_keys(account)
         admin = {
             "keys": keys,
-            "account": "admin@" + self.domain,
+            "account": account,
         }
         self._admin = admin
 
     def _format_iroha_test(self):
-        keys = self._format_node_keys()
+        account = "test@" + self.domain
+        keys = self._format_node_keys(account)
         test = {
             "keys": keys,
-            "account": "test@" + self.domain,
+            "account": account,
         }
         self._test = test
 
@@ -118,18 +134,78 @@ class IrohaTopology(Topology):
         self._make_dir(cfgs_folder)
 
     def _load_base_profile(self, profile_type):
-        datafile = self.read_file(self._filepath_fabricbase)
+        datafile = self.read_base_file(self._filepath_fabricbase)
         if datafile:
             if profile_type in datafile:
-                profile_template = datafile.get(profile_type)
+                profile_template = copy.deepcopy(datafile.get(profile_type))
                 return profile_template
         return None
 
-    def _format_node_keys(self):
-        priv = iroha.IrohaCrypto.private_key()
-        pub = iroha.IrohaCrypto.derive_public_key(priv)
-        keys = {"pub": pub.decode("ascii"), "priv": priv.decode("ascii")}
-        return keys
+    def _load_keys(self):
+        self._keys = {}
+
+        if self._keys_cache:
+            try:
+                with open(self._keys_cache, "r") as infile:
+                    self._keys = json.load(infile)
+            except (OSError, ValueError):
+                logger.debug(f"Iroha keys cache {self._keys_cache} not loaded")
+
+    def _save_keys(self):
+        if not self._keys_cache or not self._keys_updated:
+            return
+
+        try:
+            self._make_dir(os.path.dirname(self._keys_cache))
+            tmp_filepath = self._keys_cache + ".tmp"
+            fd = os.open(
+                tmp_filepath,
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                IROHA_KEYS_CACHE_MODE,
+            )
+            # a leftover tmp file keeps its mode, set it anyway
+            os.fchmod(fd, IROHA_KEYS_CACHE_MODE)
+            with os.fdopen(fd, "w") as outfile:
+                json.dump(self._keys, outfile)
+            os.replace(tmp_filepath, self._keys_cache)
+            self._keys_updated = False
+        except OSError as e:
+            logger.debug(f"Iroha keys cache not saved - {repr(e)}")
+
+    def _format_node_keys(self, account):
+        """Gets the keypair of an account/node (fqdn), from the keys
+        cache or generated (derived from the keys seed if defined)
+
+        Seeded keys are sha256(seed/account), so anyone knowing the
+        seed can derive the private keys: use them only for test
+        networks (reproducible experiments), never with real assets.
+
+        Arguments:
+            account {string} -- The account id (e.g., admin@umbra) or node fqdn
+
+        Returns:
+            dict -- The keypair (pub, priv)
+        """
+        if self._keys is None:
+            self._load_keys()
+
+        key_id = account if self._keys_seed is None else f"{self._keys_seed}/{account}"
+
+        if key_id not in self._keys:
+            if self._keys_seed is None:
+                priv = iroha.IrohaCrypto.private_key()
+            else:
+                priv = hashlib.sha256(key_id.encode("utf-8")).hexdigest()
+                priv = priv.encode("ascii")
+
+            pub = iroha.IrohaCrypto.derive_public_key(priv)
+            self._keys[key_id] = {
+                "pub": pub.decode("ascii"),
+                "priv": priv.decode("ascii"),
+            }
+            self._keys_updated = True
+
+        return dict(self._keys[key_id])
 
     def _peer_format_fields_list(self, info, fields):
         fields_frmt = []
@@ -170,6 +246,7 @@ class IrohaTopology(Topology):
             "network_mode": self.network_mode,
             "command": command,
             "environment": node.get("environment"),
+            "probes": [{"type": "grpc", "port": node.get("port")}],
         }
         return node_kwargs
 
@@ -245,7 +322,7 @@ class IrohaTopology(Topology):
         node_settings = self._check_node_settings(settings)
         node_key = self._format_node_key(name)
         node_postgres_host = self._format_node_postgres(name)
-        node_keys = self._format_node_keys()
+        node_keys = self._format_node_keys(node_fqdn)
 
         node = {
             "name": name,
@@ -359,12 +436,8 @@ class IrohaTopology(Topology):
                 src_net["tun_ids"] = src_net_tun_id + 1
                 dst_net["tun_ids"] = dst_net_tun_id + 1
 
-    def get_network_ip(self):
-        available_ips = list(self._ip_network.hosts())
-        available_index = len(self._ip_network_assigned)
-        ip = str(available_ips[available_index]) + "/" + str(self._ip_network.prefixlen)
-        self._ip_network_assigned.append(available_ips[available_index])
-        return ip
+    def get_network_ip(self, key=None):
+        return self._ip_pool.allocate(key)
 
     def _build_network(self):
 
@@ -383,7 +456,7 @@ class IrohaTopology(Topology):
                         node_fqdn = node.get("fqdn")
                         intf = node.get("intf")
                         intf_name = "eth" + str(intf)
-                        intf_ip = self.get_network_ip()
+                        intf_ip = self.get_network_ip(node_fqdn + ":" + intf_name)
                         self.add_link_nodes(
                             node_fqdn,
                             net_name,
@@ -490,8 +563,11 @@ class IrohaTopology(Topology):
 
         self.umbra = info
 
-    def _make_node_settings(self, node):
-        settings = self._load_base_profile("node_settings")
+    def _make_node_settings(self, node, base_settings=None):
+        if base_settings:
+            settings = copy.deepcopy(base_settings)
+        else:
+            settings = self._load_base_profile("node_settings")
 
         node_settings = node.get("settings")
         settings.update(node_settings)
@@ -525,48 +601,48 @@ class IrohaTopology(Topology):
                 f"Unknown file format to be saved {file_format} - file {filename} not saved"
             )
 
-    def _make_nodes_configs(self):
-
-        filename_admin_pub_key = "admin@" + self.domain + ".pub"
-        filename_admin_priv_key = "admin@" + self.domain + ".priv"
-        admin_pub_key = self._admin.get("keys").get("pub")
-        admin_priv_key = self._admin.get("keys").get("priv")
-
-        filename_test_pub_key = "test@" + self.domain + ".pub"
-        filename_test_priv_key = "test@" + self.domain + ".priv"
-        test_pub_key = self._test.get("keys").get("pub")
-        test_priv_key = self._test.get("keys").get("priv")
+    def _make_node_configs(self, node, base_settings, genesis, users_keys):
+        self._make_node_settings(node, base_settings)
 
-        for node in self._nodes.values():
-            self._make_node_settings(node)
-
-            node_folder = node.get("folder")
-            self._save_file("genesis.block", node_folder, self._genesis)
-
-            node_key = node.get("nodekey")
-            node_keys = node.get("keys")
-            filename_pub_key = node_key + ".pub"
-            filename_priv_key = node_key + ".priv"
-            self._save_file(
-                filename_pub_key, node_folder, node_keys.get("pub"), file_format="txt"
-            )
-            self._save_file(
-                filename_priv_key, node_folder, node_keys.get("priv"), file_format="txt"
-            )
+        node_folder = node.get("folder")
+        genesis_filepath = self._join_full_path(node_folder, "genesis.block")
+        self.writefile_txt([genesis], genesis_filepath)
+
+        node_key = node.get("nodekey")
+        node_keys = node.get("keys")
+        keys = [
+            (node_key + ".pub", node_keys.get("pub")),
+            (node_key + ".priv", node_keys.get("priv")),
+        ]
+        keys.extend(users_keys)
 
-            self._save_file(
-                filename_admin_pub_key, node_folder, admin_pub_key, file_format="txt"
-            )
-            self._save_file(
-                filename_admin_priv_key, node_folder, admin_priv_key, file_format="txt"
-            )
+        for filename, key in keys:
+            self._save_file(filename, node_folder, key, file_format="txt")
 
-            self._save_file(
-                filename_test_pub_key, node_folder, test_pub_key, file_format="txt"
-            )
-            self._save_file(
-                filename_test_priv_key, node_folder, test_priv_key, file_format="txt"
-            )
+    def _make_nodes_configs(self):
+        """Writes the config files of all nodes (settings, genesis and
+        keys) concurrently, the genesis being serialized only once
+        """
+        users = {"admin@" + self.domain: self._admin, "test@" + self.domain: self._test}
+
+        users_keys = []
+        for account, user in users.items():
+            users_keys.append((account + ".pub", user.get("keys").get("pub")))
+            users_keys.append((account + ".priv", user.get("keys").get("priv")))
+
+        base_settings = self._load_base_profile("node_settings")
+        genesis = json.dumps(self._genesis, indent=4, sort_keys=True)
+
+        with ThreadPoolExecutor(max_workers=IROHA_WRITERS) as executor:
+            writes = [
+                executor.submit(
+                    self._make_node_configs, node, base_settings, genesis, users_keys
+                )
+                for node in self._nodes.values()
+            ]
+
+            for write in writes:
+                write.result()
 
     def update_nodes_environment_address(self):
         logger.debug(f"Updating nodes environment address")
@@ -589,6 +665,7 @@ class IrohaTopology(Topology):
         self._make_nodes_configs_dirs()
         self._build_genesis()
         self._make_nodes_configs()
+        self._save_keys()
 
     def _build_network_dns(self):
         dns_names = {}
@@ -0,0 +1,359 @@
+import logging
+from collections import defaultdict, deque
+
+
+logger = logging.getLogger(__name__)
+
+
+# max load of an environment above its share of the total load
+PLACEMENT_BALANCE = 0.1
+# max refinement passes over all the groups
+PLACEMENT_PASSES = 10
+# traffic of a link without bandwidth in its profile
+PLACEMENT_TRAFFIC = 1.0
+PLACEMENT_RESOURCES = ["cpus", "memory"]
+
+
+class Placement:
+    """Plans the assignment of the nodes of a topology to the
+    environments (hosts) of an experiment
+
+    Nodes are placed in groups: a group is a network (switch)
+    together with the containers attached to it, as all of them
+    must be in the same environment. Each link between groups
+    placed in different environments becomes a GRE tunnel, so
+    the planner partitions the groups minimizing the traffic of
+    those links, while balancing the cpus/memory load of each
+    environment to its share of the total capacity.
+
+    The partition is made in two steps: a greedy growing of the
+    groups (heaviest first, then its neighbours) into the
+    environment with most traffic to it that still fits, and
+    refinement passes moving single groups to the environment
+    with most traffic to it (Fiduccia-Mattheyses style), while
+    the balance constraint holds.
+    """
+
+    def __init__(self, environments, capacities=None, balance=PLACEMENT_BALANCE):
+        """
+        Arguments:
+            environments {list} -- The environments ids
+
+        Keyword Arguments:
+            capacities {dict} -- Resources (cpus, memory) of each
+            environment host, equal capacities if None (default: {None})
+            balance {float} -- Max load above the share of the
+            environment (default: {PLACEMENT_BALANCE})
+        """
+        self.environments = list(environments)
+        self.capacities = capacities if capacities else {}
+        self.balance = balance
+        self.groups = {}
+        self.traffic = defaultdict(lambda: defaultdict(float))
+        self.assignment = {}
+
+    @classmethod
+    def from_topology(cls, topology, environments, capacities=None, **kwargs):
+        """Creates the groups and traffic of a built topology graph
+        (see Topology.build): each switch is a group with the
+        resources (node profiles) of the containers linked to it
+
+        Arguments:
+            topology {Topology} -- The topology
+            environments {list} -- The environments ids
+
+        Keyword Arguments:
+            capacities {dict} -- Resources of each environment (default: {None})
+
+        Returns:
+            Placement -- The placement of the topology groups
+        """
+        placement = cls(environments, capacities, **kwargs)
+        graph = topology.graph
+        group_of = {}
+
+        for n, data in graph.nodes(data=True):
+            if data.get("type") == "switch":
+                placement.add_group(n)
+                group_of[n] = n
+
+        for n, data in graph.nodes(data=True):
+            if data.get("type") == "switch":
+                continue
+
+            switches = sorted(
+                neigh for neigh in graph.neighbors(n) if neigh in group_of
+            )
+            group = switches[0] if switches else n
+            if group not in placement.groups:
+                placement.add_group(group)
+            group_of[n] = group
+
+            resources = topology.profile.get_node(data).get("resources", {})
+            placement.add_resources(group, resources)
+
+        for src, dst, data in graph.edges(data=True):
+            if group_of.get(src) != group_of.get(dst):
+                resources = topology.profile.get_link(data).get("resources", {})
+                traffic = resources.get("bw") or PLACEMENT_TRAFFIC
+                placement.add_traffic(group_of.get(src), group_of.get(dst), traffic)
+
+        return placement
+
+    def add_group(self, name, resources=None, environment=None):
+        """Adds a group of nodes to be placed
+
+        Arguments:
+            name {string} -- The group name (e.g., network name)
+
+        Keyword Arguments:
+            resources {dict} -- Resources of the group nodes (default: {None})
+            environment {string} -- Environment the group is pinned to (default: {None})
+        """
+        self.groups[name] = {
+            "resources": {res: 0.0 for res in PLACEMENT_RESOURCES},
+            "environment": environment,
+        }
+        if resources:
+            self.add_resources(name, resources)
+
+    def add_resources(self, name, resources):
+        group_resources = self.groups[name]["resources"]
+        for res in PLACEMENT_RESOURCES:
+            group_resources[res] += float(resources.get(res) or 0)
+
+    def add_traffic(self, src, dst, traffic=PLACEMENT_TRAFFIC):
+        if src != dst:
+            self.traffic[src][dst] += traffic
+            self.traffic[dst][src] += traffic
+
+    def _capacity(self, env, res):
+        capacity = self.capacities.get(env, {}).get(res)
+        if capacity is None:
+            return None
+        return float(capacity)
+
+    def _totals(self):
+        totals = {
+            res: sum(g["resources"][res] for g in self.groups.values())
+            for res in PLACEMENT_RESOURCES
+        }
+        return totals
+
+    def _limits(self):
+        totals = self._totals()
+        limits = {env: {} for env in self.environments}
+
+        for res in PLACEMENT_RESOURCES:
+            # environments without capacity get an equal split of the total
+            capacities = {env: self._capacity(env, res) for env in self.environments}
+            weights = {
+                env: cap if cap is not None else totals[res] / len(self.environments)
+                for env, cap in capacities.items()
+            }
+            weights_sum = sum(weights.values())
+
+            for env in self.environments:
+                share = totals[res] * weights[env] / weights_sum if weights_sum else 0.0
+                limit = share * (1 + self.balance)
+                if capacities[env] is not None:
+                    limit = min(capacities[env], limit)
+                limits[env][res] = limit
+
+        return limits
+
+    def _fits(self, name, env, loads, limits):
+        resources = self.groups[name]["resources"]
+        return all(
+            loads[env][res] + resources[res] <= limits[env][res] + 1e-9
+            for res in PLACEMENT_RESOURCES
+        )
+
+    def _utilization(self, name, env, loads, limits):
+        resources = self.groups[name]["resources"]
+        return max(
+            (
+                (loads[env][res] + resources[res]) / limits[env][res]
+                if limits[env][res]
+                else 0.0
+            )
+            for res in PLACEMENT_RESOURCES
+        )
+
+    def _affinity(self, name, env):
+        return sum(
+            traffic
+            for neigh, traffic in self.traffic[name].items()
+            if self.assignment.get(neigh) == env
+        )
+
+    def _move(self, name, env, loads):
+        resources = self.groups[name]["resources"]
+        current = self.assignment.get(name)
+
+        if current is not None:
+            for res in PLACEMENT_RESOURCES:
+                loads[current][res] -= resources[res]
+
+        for res in PLACEMENT_RESOURCES:
+            loads[env][res] += resources[res]
+
+        self.assignment[name] = env
+
+    def _order(self):
+        weight = {
+            name: sum(group["resources"].values())
+            for name, group in self.groups.items()
+        }
+        pending = sorted(self.groups, key=lambda name: (-weight[name], name))
+        visited = set()
+        order = []
+
+        for root in pending:
+            if root in visited:
+                continue
+
+            visited.add(root)
+            queue = deque([root])
+            while queue:
+                name = queue.popleft()
+                order.append(name)
+                neighbours = sorted(
+                    (n for n in self.traffic[name] if n not in visited),
+                    key=lambda n: (-self.traffic[name][n], n),
+                )
+                visited.update(neighbours)
+                queue.extend(neighbours)
+
+        return order
+
+    def _place(self, loads, limits):
+        for name in self._order():
+            pinned = self.groups[name]["environment"]
+            if pinned:
+                self._move(name, pinned, loads)
+                continue
+
+            fitting = [
+                env for env in self.environments if self._fits(name, env, loads, limits)
+            ]
+            candidates = fitting if fitting else self.environments
+
+            env = min(
+                candidates,
+                key=lambda e: (
+                    -self._affinity(name, e),
+                    self._utilization(name, e, loads, limits),
+                ),
+            )
+            self._move(name, env, loads)
+
+    def _refine(self, loads, limits):
+        for _ in range(PLACEMENT_PASSES):
+            moves = 0
+
+            for name in sorted(self.groups):
+                if self.groups[name]["environment"]:
+                    continue
+
+                current = self.assignment[name]
+                current_affinity = self._affinity(name, current)
+                best, best_gain = None, 0.0
+
+                for env in self.environments:
+                    if env == current or not self._fits(name, env, loads, limits):
+                        continue
+
+                    gain = self._affinity(name, env) - current_affinity
+                    if gain > best_gain:
+                        best, best_gain = env, gain
+
+                if best is not None:
+                    self._move(name, best, loads)
+                    moves += 1
+
+            if not moves:
+                break
+
+    def plan(self):
+        """Partitions the groups into the environments
+
+        Returns:
+            tuple -- (dict, dict) the environment of each group,
+            and the predicted load report (see report)
+        """
+        self.assignment = {}
+
+        if not self.environments:
+            logger.info("Placement not planned - no environments")
+            return {}, {}
+
+        limits = self._limits()
+        loads = {
+            env: {res: 0.0 for res in PLACEMENT_RESOURCES} for env in self.environments
+        }
+
+        self._place(loads, limits)
+        self._refine(loads, limits)
+
+        report = self.report()
+        logger.info(
+            f"Placement planned - {len(self.groups)} groups in "
+            f"{len(self.environments)} environments, "
+            f"{report['tunnels']} tunnels"
+        )
+        return dict(self.assignment), report
+
+    def report(self):
+        """Predicted load of each environment for the current
+        assignment: groups, resources (load and share of the total),
+        capacity and utilization (if the capacity is known),
+        along with the tunnels (links between environments)
+
+        Returns:
+            dict -- The placement report
+        """
+        totals = self._totals()
+        environments = {}
+
+        for env in self.environments:
+            groups = sorted(n for n, e in self.assignment.items() if e == env)
+            load = {
+                res: sum(self.groups[n]["resources"][res] for n in groups)
+                for res in PLACEMENT_RESOURCES
+            }
+            capacity = {res: self._capacity(env, res) for res in PLACEMENT_RESOURCES}
+            utilization = {
+                res: load[res] / capacity[res] if capacity[res] else None
+                for res in PLACEMENT_RESOURCES
+            }
+            share = {
+                res: load[res] / totals[res] if totals[res] else 0.0
+                for res in PLACEMENT_RESOURCES
+            }
+            environments[env] = {
+                "groups": groups,
+                "load": load,
+                "share": share,
+                "capacity": capacity,
+                "utilization": utilization,
+                "overcommitted": any(
+                    u is not None and u > 1.0 for u in utilization.values()
+                ),
+            }
+
+        tunnels, tunneled, total = 0, 0.0, 0.0
+        for src, neighbours in self.traffic.items():
+            for dst, traffic in neighbours.items():
+                if src < dst:
+                    total += traffic
+                    if self.assignment.get(src) != self.assignment.get(dst):
+                        tunnels += 1
+                        tunneled += traffic
+
+        report = {
+            "environments": environments,
+            "tunnels": tunnels,
+            "traffic": {"total": total, "tunneled": tunneled},
+        }
+        return report
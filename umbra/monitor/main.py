@@ -1,3 +1,4 @@
+import time
 import logging
 import json
 import asyncio
@@ -6,6 +7,7 @@ from google.protobuf import json_format
 
 from umbra.common.protobuf.umbra_grpc import MonitorBase
 from umbra.common.protobuf.umbra_pb2 import Directrix, Status
+from umbra.common.clock import stamp
 
 from umbra.monitor.tools import Tools
 
@@ -20,9 +22,11 @@ class Monitor(MonitorBase):
 
     async def Measure(self, stream):
         directrix: Directrix = await stream.recv_message()
+        received = time.time()
         directrix_dict = json_format.MessageToDict(
             directrix, preserving_proto_field_name=True
         )
         status_dict = await self.tools.measure(directrix_dict)
         status = json_format.ParseDict(status_dict, Status())
+        stamp(status, received)
         await stream.send_message(status)
@@ -0,0 +1,430 @@
+import os
+import json
+import time
+import logging
+import asyncio
+
+from grpclib.client import Channel
+from grpclib.exceptions import GRPCError
+from google.protobuf import json_format
+
+from umbra.common.protobuf.umbra_pb2 import Stats
+from umbra.common.protobuf.umbra_grpc import BrokerStub
+
+
+logger = logging.getLogger(__name__)
+
+
+SPOOL_FOLDER = "/tmp/umbra/spool/"
+
+# max amount of bytes kept on disk by a spool (all segments)
+SPOOL_MAX_BYTES = 256 * 1024 * 1024
+SPOOL_SEGMENTS = 16
+
+# records/seconds written before a segment is fsync'ed
+FSYNC_BATCH = 64
+FSYNC_INTERVAL = 1.0
+
+# in-memory queue of messages waiting to be sent to the broker
+OUTBOX_QUEUE_SIZE = 1024
+# max messages/second replayed from spool when the broker is back
+REPLAY_RATE = 50
+RETRY_INTERVAL = 5.0
+SEND_TIMEOUT = 5.0
+
+
+class Spool:
+    """Bounded append-only disk queue of json records
+
+    Records are appended as json lines into segment files
+    (segment-<seq>.log) inside folder, writes are fsync'ed in
+    batches. A read cursor (segment seq and byte offset) is
+    persisted in folder so a restarted monitor replays
+    whatever was left in its spool.
+    When the max_bytes bound is reached the oldest segment
+    is dropped.
+    Inside an event loop (monitor) the fsync runs in the loop
+    default executor, so it does not block the loop.
+    """
+
+    def __init__(
+        self,
+        folder,
+        max_bytes=SPOOL_MAX_BYTES,
+        segments=SPOOL_SEGMENTS,
+        fsync_batch=FSYNC_BATCH,
+        fsync_interval=FSYNC_INTERVAL,
+    ):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.segment_bytes = max(1, max_bytes // segments)
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._writer = None
+        self._write_seq = 1
+        self._write_offset = 0
+        self._read_seq = 1
+        self._read_offset = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._dropped = 0
+        self._make_dir()
+        self._recover()
+
+    def _make_dir(self):
+        try:
+            os.makedirs(self.folder)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            logger.debug(f"Spool dir {self.folder} creation error: {repr(e)}")
+
+    def _segment_path(self, seq):
+        filename = "segment-{:08d}.log".format(seq)
+        return os.path.join(self.folder, filename)
+
+    def _cursor_path(self):
+        return os.path.join(self.folder, "cursor")
+
+    def _segments(self):
+        seqs = []
+        for filename in os.listdir(self.folder):
+            if filename.startswith("segment-") and filename.endswith(".log"):
+                seqs.append(int(filename[len("segment-") : -len(".log")]))
+        return sorted(seqs)
+
+    def _recover(self):
+        seqs = self._segments()
+
+        if seqs:
+            self._write_seq = seqs[-1]
+            self._write_offset = os.path.getsize(self._segment_path(seqs[-1]))
+            self._read_seq, self._read_offset = seqs[0], 0
+
+            try:
+                with open(self._cursor_path(), "r") as f:
+                    seq, offset = f.read().split()
+                    if int(seq) in seqs:
+                        self._read_seq, self._read_offset = int(seq), int(offset)
+            except (OSError, ValueError):
+                pass
+
+            logger.info(
+                f"Spool recovered {len(seqs)} segments - cursor "
+                f"{self._read_seq}:{self._read_offset}"
+            )
+
+    def _open_writer(self):
+        if not self._writer:
+            self._writer = open(self._segment_path(self._write_seq), "ab")
+
+    def _close_writer(self, wait=False):
+        if self._writer:
+            self._sync(wait)
+            self._writer.close()
+            self._writer = None
+
+    def _fsync(self, fd):
+        try:
+            os.fsync(fd)
+        except OSError as e:
+            logger.debug(f"Spool segment fsync error: {repr(e)}")
+        finally:
+            os.close(fd)
+
+    def _sync(self, wait=False):
+        if self._writer and self._pending:
+            self._writer.flush()
+            # the segment may be closed (rotated) before the fsync runs
+            fd = os.dup(self._writer.fileno())
+            self._pending = 0
+            self._last_sync = time.monotonic()
+
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+
+            if loop and not wait:
+                loop.run_in_executor(None, self._fsync, fd)
+            else:
+                self._fsync(fd)
+
+    def _rotate(self):
+        self._close_writer()
+        self._write_seq += 1
+        self._write_offset = 0
+        self._enforce_bound()
+
+    def _size(self):
+        size = 0
+        for seq in self._segments():
+            size += os.path.getsize(self._segment_path(seq))
+        return size - self._read_offset
+
+    def _enforce_bound(self):
+        while self._read_seq < self._write_seq and self._size() > self.max_bytes:
+            path = self._segment_path(self._read_seq)
+            try:
+                with open(path, "rb") as f:
+                    skipped = f.read()[self._read_offset :].count(b"\n")
+                os.remove(path)
+            except OSError:
+                skipped = 0
+            self._dropped += skipped
+            logger.info(
+                f"Spool full - dropped segment {self._read_seq} with {skipped} records"
+            )
+            self._read_seq += 1
+            self._read_offset = 0
+            self._save_cursor()
+
+    def _save_cursor(self):
+        try:
+            with open(self._cursor_path(), "w") as f:
+                f.write(f"{self._read_seq} {self._read_offset}")
+        except OSError as e:
+            logger.debug(f"Could not save spool cursor - {repr(e)}")
+
+    def empty(self):
+        return (self._read_seq, self._read_offset) == (
+            self._write_seq,
+            self._write_offset,
+        )
+
+    def dropped(self):
+        return self._dropped
+
+    def append(self, record):
+        line = json.dumps(record).encode("utf-8") + b"\n"
+
+        if self._write_offset and self._write_offset + len(line) > self.segment_bytes:
+            self._rotate()
+
+        self._open_writer()
+        self._writer.write(line)
+        self._write_offset += len(line)
+        self._pending += 1
+
+        elapsed = time.monotonic() - self._last_sync
+        if self._pending >= self.fsync_batch or elapsed >= self.fsync_interval:
+            self._sync()
+
+    def read(self, count):
+        """Reads up to count records from the spool cursor on
+
+        Arguments:
+            count {int} -- Max amount of records to be read
+
+        Returns:
+            list -- Tuples (record, position), position is the
+            cursor value to be committed once record is consumed
+            (record is None if it could not be decoded)
+        """
+        if self._writer:
+            self._writer.flush()
+
+        records = []
+        seq, offset = self._read_seq, self._read_offset
+
+        while len(records) < count and (seq, offset) != (
+            self._write_seq,
+            self._write_offset,
+        ):
+            path = self._segment_path(seq)
+            end = self._write_offset if seq == self._write_seq else None
+
+            # line by line, so batches do not read the whole segment rest
+            try:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    while len(records) < count and (end is None or offset < end):
+                        limit = -1 if end is None else end - offset
+                        line = f.readline(limit)
+                        if not line.endswith(b"\n"):
+                            break
+                        offset += len(line)
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            logger.debug(f"Spool corrupted record at {seq}:{offset}")
+                            record = None
+                        records.append((record, (seq, offset)))
+            except OSError:
+                logger.debug(f"Spool segment {seq} not read")
+
+            if len(records) < count:
+                if seq < self._write_seq:
+                    seq, offset = seq + 1, 0
+                else:
+                    break
+
+        return records
+
+    def commit(self, position):
+        seq, offset = position
+
+        for old_seq in range(self._read_seq, seq):
+            try:
+                os.remove(self._segment_path(old_seq))
+            except OSError:
+                pass
+
+        self._read_seq, self._read_offset = seq, offset
+
+        if self.empty() and self._write_offset:
+            self._close_writer()
+            try:
+                os.remove(self._segment_path(self._write_seq))
+            except OSError:
+                pass
+            self._write_seq += 1
+            self._write_offset = 0
+            self._read_seq, self._read_offset = self._write_seq, 0
+
+        self._save_cursor()
+
+    def close(self):
+        self._close_writer(wait=True)
+        self._save_cursor()
+
+
+class Outbox:
+    """Sends Stats messages to the broker off the sampling loop
+
+    Tools put messages in a bounded in-memory queue that a single
+    task drains to the broker. Messages that could not be sent
+    (broker unreachable or queue full) are persisted in a Spool,
+    and replayed in order (at most replay_rate per second) as soon
+    as the broker is reachable again.
+    """
+
+    def __init__(
+        self,
+        uuid,
+        queue_size=OUTBOX_QUEUE_SIZE,
+        replay_rate=REPLAY_RATE,
+        retry_interval=RETRY_INTERVAL,
+        spool=None,
+    ):
+        self.uuid = uuid
+        self.queue_size = queue_size
+        self.replay_rate = replay_rate
+        self.retry_interval = retry_interval
+        self.spool = spool if spool else Spool(os.path.join(SPOOL_FOLDER, str(uuid)))
+        self._queue = None
+        self._task = None
+        self._channels = {}
+
+    def _ensure_running(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, address, message):
+        self._ensure_running()
+        record = {"address": address, "message": message}
+
+        if not self.spool.empty():
+            self.spool.append(record)
+        else:
+            try:
+                self._queue.put_nowait(record)
+            except asyncio.QueueFull:
+                logger.debug("Outbox queue full - spooling message")
+                self.spool.append(record)
+
+    def _channel(self, address):
+        if address not in self._channels:
+            host, port = address.split(":")
+            self._channels[address] = Channel(host, port)
+        return self._channels[address]
+
+    def _drop_channel(self, address):
+        channel = self._channels.pop(address, None)
+        if channel:
+            channel.close()
+
+    async def send(self, address, message):
+        ack = False
+
+        try:
+            stub = BrokerStub(self._channel(address))
+            info = json_format.ParseDict(message, Stats())
+            reply = await stub.Collect(info, timeout=SEND_TIMEOUT)
+
+        except (GRPCError, OSError, asyncio.TimeoutError) as e:
+            logger.info(f"Could not reach broker for Stats")
+            logger.debug(f"Exception: {repr(e)}")
+            self._drop_channel(address)
+
+        except Exception as e:
+            logger.debug(f"Exception: {repr(e)}")
+            self._drop_channel(address)
+
+        else:
+            if reply.error:
+                logger.info(f"Broker could not store Stats - {reply.error}")
+            else:
+                ack = True
+
+        return ack
+
+    def _spool_queue(self):
+        while not self._queue.empty():
+            self.spool.append(self._queue.get_nowait())
+
+    async def _replay(self):
+        records = self.spool.read(self.replay_rate)
+        position = None
+
+        for record, record_position in records:
+            if record:
+                ack = await self.send(record.get("address"), record.get("message"))
+                if not ack:
+                    break
+            position = record_position
+            await asyncio.sleep(1.0 / self.replay_rate)
+
+        if position:
+            self.spool.commit(position)
+
+        if records and position == records[-1][1]:
+            return True
+
+        logger.info(
+            f"Replay of spooled Stats interrupted - retry in {self.retry_interval}s"
+        )
+        return False
+
+    async def _run(self):
+        try:
+            while True:
+                if not self.spool.empty():
+                    replayed = await self._replay()
+                    if not replayed:
+                        await asyncio.sleep(self.retry_interval)
+                    continue
+
+                record = await self._queue.get()
+                ack = await self.send(record.get("address"), record.get("message"))
+
+                if not ack:
+                    self.spool.append(record)
+                    self._spool_queue()
+                    await asyncio.sleep(self.retry_interval)
+
+        except asyncio.CancelledError:
+            logger.debug("Outbox task cancelled - spooling queued messages")
+            self._spool_queue()
+            self.spool.close()
+            raise
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+
+        for address in list(self._channels.keys()):
+            self._drop_channel(address)
@@ -13,13 +13,9 @@ import platform as pl
 
 from subprocess import check_output, CalledProcessError
 
-from grpclib.client import Channel
-from grpclib.exceptions import GRPCError
-from google.protobuf import json_format
-
+from umbra.common import dockers
 from umbra.common.scheduler import Handler
-from umbra.common.protobuf.umbra_pb2 import Stats
-from umbra.common.protobuf.umbra_grpc import BrokerStub
+from umbra.monitor.spool import Outbox
 
 
 logger = logging.getLogger(__name__)
@@ -39,40 +35,11 @@ class Tool:
         self.output = {}
         self._tstart = None
         self._tstop = None
+        self.outbox = None
         self.cfg()
 
-    async def _send(self, address, message):
-        logger.info(f"Sending message Stats")
-
-        try:
-            host, port = address.split(":")
-            channel = Channel(host, port)
-            stub = BrokerStub(channel)
-
-            info = json_format.ParseDict(message, Stats())
-            reply = await stub.Collect(info)
-            info_reply = json_format.MessageToDict(
-                reply, preserving_proto_field_name=True
-            )
-
-        except GRPCError as e:
-            logger.info(f"Error in reaching: Stats")
-            logger.debug(f"Exception in stats: {repr(e)}")
-            info_reply = {}
-
-        except OSError as e:
-            logger.info(f"Could not reach channel for Stats")
-            logger.debug(f"Exception: {repr(e)}")
-            info_reply = {}
-
-        except Exception as e:
-            logger.debug(f"Exception: {repr(e)}")
-            info_reply = {}
-
-        finally:
-            channel.close()
-            logger.info(f"Reply message Stats {info_reply}")
-            # return info_reply
+    def set_outbox(self, outbox):
+        self.outbox = outbox
 
     def format_metrics(self, metrics):
         message = {
@@ -82,17 +49,32 @@ class Tool:
         }
         return message
 
+    def stamp_metrics(self, metrics):
+        """Adds the sampling time to each measurement, so metrics
+        replayed later (e.g., from the outbox spool) are stored
+        with the time they were taken
+
+        Arguments:
+            metrics {list} -- Measurements to be flushed
+        """
+        now = str(int(time.time() * 1000))
+
+        for measurement in metrics:
+            fields = measurement.setdefault("fields", {})
+            fields["timestamp"] = {
+                "name": "timestamp",
+                "type": "timestamp",
+                "unit": "ms",
+                "value": now,
+            }
+
     async def flush(self, metrics):
+        self.stamp_metrics(metrics)
         message = self.format_metrics(metrics)
-
         address = self.output.get("address")
 
-        # loop = asyncio.get_event_loop()
-        # loop.create_task(self._send(stub, message))
-        asyncio.create_task(self._send(address, message))
-
-        # reply = asyncio.run(self._send(stub, message))
-        # logger.info(f"Message stats send - reply {reply}")
+        logger.info(f"Flushing message Stats")
+        self.outbox.put(address, message)
 
     async def process_call(self):
         """Performs the async execution of cmd in a subprocess
@@ -524,10 +506,10 @@ class MonContainer(Tool):
 
     def connect(self):
         try:
-            self._dc = docker.from_env()
+            self._dc = dockers.client()
             # self._dc = docker.APIClient(base_url='unix://var/run/docker.sock')
             # self._dc = docker.DockerClient(base_url=self.url)
-            logger.info(self._dc.version())
+            self._containers = dockers.containers()
 
         except Exception as e:
             self._dc = None
@@ -605,10 +587,9 @@ class MonContainer(Tool):
     def _stats(self, name=None):
         summary_stats = {}
 
-        container = self._dc.containers.get(name)
-        if container:
-            stats = container.stats(stream=False)
-        else:
+        try:
+            stats = self._containers.call(name, "stats", stream=False)
+        except docker.errors.NotFound:
             return summary_stats
 
         stats_cpu = self._stats_cpu(stats)
@@ -1079,6 +1060,7 @@ class Tools:
         self.tools_instances = {}
         self.load_tools()
         self.handler = Handler()
+        self.outbox = Outbox(info.get("uuid"))
 
     def load_tools(self):
         for tool_cls in self.TOOLS:
@@ -1102,6 +1084,7 @@ class Tools:
                 tool_cls = self.toolset[source_name]
                 tool = tool_cls()
                 tool.init(flush, source)
+                tool.set_outbox(self.outbox)
                 source_call = tool.call
 
                 calls[source_id] = (source_call, source_sched)
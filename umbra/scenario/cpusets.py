@@ -0,0 +1,309 @@
+import os
+import glob
+import math
+import logging
+
+import psutil
+
+
+logger = logging.getLogger(__name__)
+
+
+# cores reserved for the umbra components (not given to containers)
+CPUSETS_RESERVED = 2
+CPUSETS_NUMA_FOLDER = "/sys/devices/system/node/"
+CPUSETS_ONLINE = "/sys/devices/system/cpu/online"
+# umbra components pinned to the reserved cores
+CPUSETS_PROCESSES = ["umbra-broker", "umbra-monitor", "umbra-scenario"]
+
+
+def parse_cpulist(cpulist):
+    """Parses a cpu list (e.g., 0-3,8,10-11) into its cores
+
+    Arguments:
+        cpulist {string} -- The cpu list
+
+    Returns:
+        list -- The cores (int) sorted
+    """
+    cores = set()
+
+    for field in cpulist.strip().split(","):
+        if not field:
+            continue
+        if "-" in field:
+            first, last = field.split("-")
+            cores.update(range(int(first), int(last) + 1))
+        else:
+            cores.add(int(field))
+
+    return sorted(cores)
+
+
+def format_cpulist(cores):
+    """Formats cores into a cpu list (e.g., 0-3,8), the format
+    of the docker cpuset_cpus option
+
+    Arguments:
+        cores {list} -- The cores (int)
+
+    Returns:
+        string -- The cpu list
+    """
+    ranges = []
+
+    for core in sorted(cores):
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+
+    fields = [str(a) if a == b else f"{a}-{b}" for a, b in ranges]
+    return ",".join(fields)
+
+
+def host_cores(path=CPUSETS_ONLINE):
+    """Reads the online cores of the host, not the ones of this
+    process (which can be pinned to the reserved cores already)
+
+    Keyword Arguments:
+        path {string} -- The sysfs online cpu list (default: {CPUSETS_ONLINE})
+
+    Returns:
+        list -- The cores (int) sorted
+    """
+    try:
+        with open(path, "r") as infile:
+            cores = parse_cpulist(infile.read())
+    except (OSError, ValueError):
+        cores = []
+
+    return cores if cores else list(range(os.cpu_count() or 1))
+
+
+def numa_nodes(folder=CPUSETS_NUMA_FOLDER):
+    """Reads the cores of each NUMA node of the host
+
+    Keyword Arguments:
+        folder {string} -- The sysfs nodes folder (default: {CPUSETS_NUMA_FOLDER})
+
+    Returns:
+        dict -- The cores (list) indexed by NUMA node id
+    """
+    nodes = {}
+
+    for path in glob.glob(os.path.join(folder, "node[0-9]*", "cpulist")):
+        node_id = int(os.path.basename(os.path.dirname(path))[len("node") :])
+        try:
+            with open(path, "r") as infile:
+                nodes[node_id] = parse_cpulist(infile.read())
+        except (OSError, ValueError):
+            continue
+
+    return nodes
+
+
+class CpuSets:
+    """Assigns disjoint sets of cores to the containers of an
+    environment, so they do not float over all the host cores
+    (and over the cores of the umbra components)
+
+    The first reserved cores (lowest ids) are kept for the umbra
+    components. A container gets as many cores as its cpus
+    (rounded up), preferring the NUMA node with the fewest free
+    cores that still fits all of them (best fit), and spanning
+    NUMA nodes only if no single node fits. If there are not
+    enough free cores, the container is not pinned (None).
+    """
+
+    def __init__(self, cores=None, numa=None, reserved=CPUSETS_RESERVED):
+        """
+        Keyword Arguments:
+            cores {list} -- Host cores available, the online ones
+            if None (default: {None})
+            numa {dict} -- Cores indexed by NUMA node, read from the
+            host if None, or a single node if False (default: {None})
+            reserved {int} -- Cores reserved for umbra (default: {CPUSETS_RESERVED})
+        """
+        if cores is None:
+            cores = host_cores()
+        cores = sorted(cores)
+
+        if numa is None:
+            numa = numa_nodes()
+        if not numa:
+            numa = {0: cores}
+
+        self.reserved = cores[: min(reserved, max(len(cores) - 1, 0))]
+        available = set(cores) - set(self.reserved)
+
+        self.numa = {
+            node: sorted(available.intersection(node_cores))
+            for node, node_cores in numa.items()
+        }
+        known = set(core for node_cores in self.numa.values() for core in node_cores)
+        if available - known:
+            self.numa[-1] = sorted(available - known)
+
+        self.free = set(available)
+        self.allocated = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Creates the cpusets from the settings of an environment
+        (e.g., {"reserved": 2, "numa": True}), None if not enabled
+
+        Arguments:
+            settings {dict} -- The cpusets settings
+
+        Returns:
+            CpuSets -- The cpusets of the environment (or None)
+        """
+        if not settings:
+            return None
+
+        numa = None if settings.get("numa", True) else False
+        cores = settings.get("cores")
+        if isinstance(cores, str):
+            cores = parse_cpulist(cores)
+
+        return cls(
+            cores=cores,
+            numa=numa,
+            reserved=int(settings.get("reserved", CPUSETS_RESERVED)),
+        )
+
+    def _count(self, cpus):
+        try:
+            return max(int(math.ceil(float(cpus))), 1)
+        except (TypeError, ValueError):
+            return 1
+
+    def _pick(self, count, keep=None):
+        keep = sorted(keep) if keep else []
+        if len(keep) >= count:
+            return keep[:count]
+
+        free = self.free.difference(keep)
+        free_nodes = {
+            node: sorted(free.intersection(node_cores))
+            for node, node_cores in self.numa.items()
+        }
+        needed = count - len(keep)
+
+        if keep:
+            kept_nodes = [
+                node
+                for node, node_cores in self.numa.items()
+                if set(keep).intersection(node_cores)
+            ]
+            for node in kept_nodes:
+                if len(free_nodes[node]) >= needed:
+                    return keep + free_nodes[node][:needed]
+
+        fitting = [node for node, cores in free_nodes.items() if len(cores) >= needed]
+        if fitting:
+            node = min(fitting, key=lambda n: (len(free_nodes[n]), n))
+            return keep + free_nodes[node][:needed]
+
+        if len(free) >= needed:
+            picked = []
+            for node in sorted(free_nodes, key=lambda n: -len(free_nodes[n])):
+                picked.extend(free_nodes[node][: needed - len(picked)])
+            return keep + picked
+
+        return None
+
+    def allocate(self, name, cpus):
+        """Assigns a set of cores to a container
+
+        Arguments:
+            name {string} -- The container name
+            cpus {float} -- The container cpus (profile resources)
+
+        Returns:
+            string -- The cpu list of the container (None if not pinned)
+        """
+        self.release(name)
+
+        cores = self._pick(self._count(cpus))
+        if cores is None:
+            logger.info(f"Cpuset not allocated - {name} cpus {cpus} - no free cores")
+            return None
+
+        self.free.difference_update(cores)
+        self.allocated[name] = cores
+        cpulist = format_cpulist(cores)
+        logger.debug(f"Cpuset allocated - {name} cpus {cpus} - cores {cpulist}")
+        return cpulist
+
+    def resize(self, name, cpus):
+        """Resizes the set of cores of a container, keeping the
+        cores it already has whenever possible
+
+        Arguments:
+            name {string} -- The container name
+            cpus {float} -- The container cpus
+
+        Returns:
+            string -- The cpu list of the container (None if not pinned)
+        """
+        current = self.allocated.pop(name, [])
+        self.free.update(current)
+
+        cores = self._pick(self._count(cpus), keep=current)
+        if cores is None:
+            cores = current
+
+        if not cores:
+            return None
+
+        self.free.difference_update(cores)
+        self.allocated[name] = cores
+        return format_cpulist(cores)
+
+    def release(self, name=None):
+        """Releases the cores of a container (or of all containers)
+
+        Keyword Arguments:
+            name {string} -- The container name (default: {None})
+        """
+        names = [name] if name else list(self.allocated)
+
+        for name in names:
+            self.free.update(self.allocated.pop(name, []))
+
+    def get(self, name):
+        cores = self.allocated.get(name)
+        return format_cpulist(cores) if cores else None
+
+    def pin_processes(self, names=CPUSETS_PROCESSES):
+        """Pins the running umbra components (by their command
+        line) to the reserved cores
+
+        Keyword Arguments:
+            names {list} -- Names of the components (default: {CPUSETS_PROCESSES})
+
+        Returns:
+            list -- The pids of the pinned processes
+        """
+        pinned = []
+        if not self.reserved:
+            return pinned
+
+        for proc in psutil.process_iter(["pid", "cmdline"]):
+            cmdline = " ".join(proc.info.get("cmdline") or [])
+            if not any(name in cmdline for name in names):
+                continue
+
+            try:
+                proc.cpu_affinity(self.reserved)
+                pinned.append(proc.info.get("pid"))
+            except (psutil.Error, OSError, ValueError) as e:
+                logger.debug(f"Process {proc.info.get('pid')} not pinned - {e}")
+
+        logger.info(
+            f"Pinned processes {pinned} to reserved cores "
+            f"{format_cpulist(self.reserved)}"
+        )
+        return pinned
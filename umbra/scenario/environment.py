@@ -16,6 +16,11 @@ from mininet import clean
 
 import docker
 
+from umbra.common import dockers
+from umbra.scenario.snapshots import Snapshots, topology_key
+from umbra.scenario.cpusets import CpuSets
+from umbra.scenario.teardown import Teardown, TEARDOWN_LABEL
+
 
 logger = logging.getLogger(__name__)
 
@@ -98,9 +103,10 @@ class EnvironmentParser:
 
 
 class Environment:
-    def __init__(self, topo):
+    def __init__(self, topo, progress=None):
         self.parser = EnvironmentParser()
         self.topo = topo
+        self.progress = progress
         self.net = None
         self.nodes = {}
         self.switches = {}
@@ -108,12 +114,17 @@ class Environment:
         self._docker_client = None
         self._connected_to_docker = False
         self._docker_network = None
+        self._containers = dockers.containers()
+        self.snapshots = Snapshots()
+        self.topo_key = None
+        self.restored = None
+        self.cpusets = None
         logger.debug("Environment Instance Created")
         logger.debug(f"{json.dumps(self.topo, indent=4)}")
 
     def connect_docker(self):
         try:
-            self._docker_client = docker.from_env()
+            self._docker_client = dockers.client()
         except Exception as e:
             self._docker_client = None
             logger.warn(
@@ -203,8 +214,8 @@ class Environment:
 
         if self._connected_to_docker:
             try:
-                container = self._docker_client.containers.get(container_name)
-                container.remove()
+                self._containers.call(container_name, "remove")
+                self._containers.drop(container_name)
 
             except docker.errors.APIError as e:
                 logger.debug(f"Docker container not removed - API Error {e}")
@@ -217,32 +228,19 @@ class Environment:
             logger.debug(f"Could not remove docker container")
             return False
 
-    def remove_docker_container_chaincodes(self):
+    def remove_docker_containers(self, key=None, names=None):
         self.connect_docker()
-        chaincodes_removed = {}
 
         if self._connected_to_docker:
-            try:
-                containers = self._docker_client.containers.list()
-                for container in containers:
-                    container_name = container.name
-                    if "dev-peer" in container_name:
-                        ack = self.remove_docker_container(container_name)
-                        chaincodes_removed[container_name] = ack
-
-            except docker.errors.APIError as e:
-                logger.debug(f"Docker container chaincodes not removed - API Error {e}")
-                return False
-            else:
-                logger.debug(
-                    f"Docker container chaincodes removed {chaincodes_removed}"
-                )
+            removed = Teardown(self._docker_client).run(key, names=names)
+            for container_name in removed:
+                self._containers.drop(container_name)
 
-                ack_all = all(list(chaincodes_removed.values()))
-                return ack_all
+            logger.debug(f"Docker containers removed {removed}")
+            return all(removed.values())
 
         else:
-            logger.debug(f"Could not remove docker container")
+            logger.debug(f"Could not remove docker containers")
             return False
 
     def _create_network(self):
@@ -263,6 +261,10 @@ class Environment:
         memory = resources.get("memory", 1024)
         cpu_bw_p, cpu_bw_q = calculate_cpu_cfs_values(resources)
 
+        cpuset = None
+        if self.cpusets:
+            cpuset = self.cpusets.allocate(node.get("name"), resources.get("cpus", 1))
+
         mng_ip = node.get("mng_intf", None)
 
         logger.debug("Adding container: %s - %s", node.get("name"), node.get("image"))
@@ -275,7 +277,7 @@ class Environment:
             volumes=node.get("volumes", []),
             cpu_period=cpu_bw_p,
             cpu_quota=cpu_bw_q,
-            cpuset_cpus="",
+            cpuset_cpus=cpuset if cpuset else "",
             mem_limit=str(memory) + "m",
             memswap_limit=0,
             environment=node.get("env", None),
@@ -284,6 +286,7 @@ class Environment:
             working_dir=node.get("working_dir", None),
             extra_hosts=node.get("extra_hosts", {}),
             network_mode=node.get("network_mode", "none"),
+            labels={TEARDOWN_LABEL: str(self.topo_key)},
         )
 
         logger.debug("Added container: %s", node.get("name"))
@@ -510,42 +513,106 @@ class Environment:
         logger.info("%s", info)
         return info
 
+    def restore(self, phase):
+        """Restores the snapshot of a phase into the container nodes
+        (before they are added to the network)
+
+        Arguments:
+            phase {string} -- The snapshot phase name
+        """
+        self.restored = None
+
+        if phase:
+            nodes = self.topo.get("nodes", {})
+            ok, err_msg = self.snapshots.restore(self.topo_key, phase, nodes)
+            self.restored = phase if ok else None
+
+    def snapshot(self, phase):
+        nodes = list(self.topo.get("nodes", {}).keys())
+        return self.snapshots.save(self.topo_key, phase, nodes)
+
+    def _progress(self, phase):
+        logger.info(f"Experiment start - {phase}")
+        if self.progress:
+            self.progress(phase)
+
     def start(self):
+        self.topo_key = topology_key(self.topo)
+        snapshot = self.topo.get("snapshot", {})
+        self.cpusets = CpuSets.from_settings(self.topo.get("cpusets"))
+        if self.cpusets:
+            self.cpusets.pin_processes()
         self.topo = self.parser.build(self.topo)
+        self._progress("restore")
+        self.restore(snapshot.get("restore"))
+        self._progress("network")
         self.create_docker_network()
         self._create_network()
+        self._progress("nodes")
         self._add_nodes()
+        self._progress("switches")
         self._add_switches()
+        self._progress("links")
         self._add_links()
+        self._progress("start")
         self._start_network()
+        self._progress("tunnels")
         self._add_tun_links()
+        self._progress("running")
         logger.info("Experiment running")
 
         self.nodes_info = self.parse_info(self.net.hosts, "hosts")
         info = {
             "hosts": self.nodes_info.get("hosts"),
             "topology": self.net_topo_info(),
+            "restored": self.restored,
+            "cpusets": self.cpusets.allocated if self.cpusets else {},
         }
         return True, info
 
+    def container_names(self):
+        nodes = self.topo.get("nodes", {})
+        return [
+            node.get("name")
+            for node in nodes.values()
+            if node.get("type") == "container"
+        ]
+
     def _stop_network(self):
         if self.net:
-            self.net.stop()
-            logger.info("Stopped network: %r" % self.net)
+            try:
+                self.net.stop()
+            except Exception as e:
+                logger.info(f"Network not stopped cleanly - exception {repr(e)}")
+                return False
+            else:
+                logger.info("Stopped network: %r" % self.net)
 
-    def mn_cleanup(self):
+        return True
+
+    def mn_cleanup(self, key=None, names=None):
+        removed = self.remove_docker_containers(key, names)
         clean.cleanup()
-        self.remove_docker_container_chaincodes()
         self.remove_docker_network()
         self.prune_docker_volumes()
+        return removed
 
     def stop(self):
-        self._stop_network()
-        self.mn_cleanup()
+        # the network is stopped first (links, then containers), and
+        # the leftover containers of this topology only (e.g., fabric
+        # chaincodes) are force-removed concurrently afterwards
+        stopped = self._stop_network()
+        removed = self.mn_cleanup(key=self.topo_key, names=self.container_names())
         self.nodes = {}
         self.switches = {}
         self.nodes_info = {}
         self.net = None
+        self.cpusets = None
+
+        if not stopped:
+            return False, "Network not stopped cleanly"
+        if not removed:
+            return False, "Docker containers not removed"
         return True, {}
 
     def stats(self):
@@ -585,6 +652,9 @@ class Environment:
             ok = False
             return ok, err_msg
 
+        if cores is None and self.cpusets and cpu_quota > 0 and cpu_period > 0:
+            cores = self.cpusets.resize(node_name, cpu_quota / cpu_period)
+
         try:
             self.nodes[node_name].updateCpuLimit(
                 cpu_quota, cpu_period, cpu_shares, cores
@@ -623,8 +693,7 @@ class Environment:
 
             if self._connected_to_docker:
                 try:
-                    docker_container = self._docker_client.containers.get(node)
-                    docker_container.unpause()
+                    self._containers.call(node, "unpause")
 
                 except docker.errors.NotFound as e:
                     logger.debug(f"Docker container not found - {e}")
@@ -650,8 +719,7 @@ class Environment:
 
             if self._connected_to_docker:
                 try:
-                    docker_container = self._docker_client.containers.get(node)
-                    docker_container.pause()
+                    self._containers.call(node, "pause")
 
                 except docker.errors.NotFound as e:
                     logger.debug(f"Docker container not found - {e}")
@@ -667,6 +735,15 @@ class Environment:
         return False
 
     def update_node_resources(self, node, resources):
+        if self.cpusets and resources and "cpuset_cpus" not in resources:
+            cpu_quota = resources.get("cpu_quota", -1)
+            cpu_period = resources.get("cpu_period", -1)
+
+            if cpu_quota > 0 and cpu_period > 0:
+                cpuset = self.cpusets.resize(node, cpu_quota / cpu_period)
+                if cpuset:
+                    resources = dict(resources, cpuset_cpus=cpuset)
+
         self.nodes[node].update_resources(**resources)
 
     def update_node(self, node, online, resources):
@@ -763,4 +840,7 @@ class Environment:
 
                 ack, err_msg = self.update_node(node, online, resources)
 
+            if ev_group == "snapshot":
+                ack, err_msg = self.snapshot(event.get("phase"))
+
         return ack, err_msg
\ No newline at end of file
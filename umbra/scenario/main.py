@@ -3,6 +3,7 @@ import logging
 import signal
 import time
 import json
+import queue
 from multiprocessing import Process
 from multiprocessing import Queue
 
@@ -10,20 +11,139 @@ from google.protobuf import json_format
 
 from umbra.common.protobuf.umbra_grpc import ScenarioBase
 from umbra.common.protobuf.umbra_pb2 import Workflow, Status
+from umbra.common.clock import stamp
 
 from umbra.scenario.environment import Environment
+from umbra.scenario.probes import Probes, PROBES_TIMEOUT
+from umbra.scenario.timeline import Timeline
+from umbra.scenario.snapshots import Snapshots, topology_key
 
 
 logger = logging.getLogger(__name__)
 
 
+# seconds between checks of the playground worker process
+WORKER_POLL = 1.0
+# actions whose progress (busy state) is exposed in the stats replies
+WORKER_LONG_ACTIONS = ["start", "stop", "ready"]
+# actions that do not touch Containernet, run as tasks of the worker
+# loop concurrently with the other (serialized) actions
+WORKER_CONCURRENT_ACTIONS = ["ready", "schedule", "executed", "snapshots"]
+
+
+def run_playground(in_queue, out_queue):
+    playground = Playground(in_queue, out_queue)
+    asyncio.run(playground.run())
+
+
 class Playground:
     def __init__(self, in_queue, out_queue):
+        self.in_queue = in_queue
+        self.out_queue = out_queue
         self.exp_topo = None
+        self.timeline = Timeline(self.update_event)
+        self._command = None
+
+    def progress(self, phase):
+        if self.out_queue and self._command:
+            self.out_queue.put(
+                {
+                    "type": "progress",
+                    "id": self._command,
+                    "phase": phase,
+                    "time": time.time(),
+                }
+            )
+
+    async def call(self, action, scenario):
+        if action == "start":
+            reply = self.start(scenario)
+
+        elif action == "stop":
+            reply = self.stop()
+
+        elif action == "update":
+            reply = self.update(scenario)
+
+        elif action == "stats":
+            reply = self.stats()
+
+        elif action == "ready":
+            reply = await self.ready(scenario)
+
+        elif action == "snapshots":
+            reply = self.snapshots(scenario)
+
+        elif action == "schedule":
+            reply = self.schedule(scenario)
+
+        elif action == "executed":
+            reply = self.executed(scenario)
+
+        else:
+            logger.debug(f"Unkown playground command {action}")
+            reply = {"ok": False, "msg": {}}
+
+        return reply
+
+    async def execute(self, command, serialized=True):
+        uid = command.get("id")
+        self.out_queue.put({"type": "started", "id": uid})
+
+        if serialized:
+            self._command = uid
+
+        try:
+            reply = await self.call(command.get("action"), command.get("scenario"))
+        except Exception as e:
+            logger.info(f"Playground command exception {repr(e)}")
+            reply = {"ok": "False", "msg": {"info": {}, "error": repr(e)}}
+
+        self.out_queue.put({"type": "reply", "id": uid, "reply": reply})
+
+        if serialized:
+            self._command = None
+
+    async def run(self):
+        """Executes the commands (id, action, scenario) of the
+        in_queue, putting into the out_queue the messages (by type):
+        started, progress and reply of each one
+
+        Commands that operate Containernet (e.g., start, stop, update)
+        are executed one at a time, in order, while the ones that
+        do not (WORKER_CONCURRENT_ACTIONS) run as tasks, so a long
+        one (e.g., ready, waiting for probes) does not delay the others
+        (e.g., schedule of timeline events)
+
+        The loop keeps running the timeline events (see schedule)
+        while waiting for commands, until a None command arrives
+        """
+        loop = asyncio.get_running_loop()
+        logger.info("Playground worker running")
+        tasks = set()
+
+        while True:
+            command = await loop.run_in_executor(None, self.in_queue.get)
+            if command is None:
+                break
+
+            if command.get("action") in WORKER_CONCURRENT_ACTIONS:
+                task = loop.create_task(self.execute(command, serialized=False))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            else:
+                await self.execute(command)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.stop()
+        logger.info("Playground worker stopped")
 
     def start(self, scenario):
         self.clear()
-        self.exp_topo = Environment(scenario)
+        self.exp_topo = Environment(scenario, progress=self.progress)
         ok, info = self.exp_topo.start()
         logger.info("hosts info %s", info)
 
@@ -41,15 +161,18 @@ class Playground:
     def stop(self):
         logger.info("Stopping topo %s", self.exp_topo)
 
-        ack = True
+        ack, error = True, ""
         if self.exp_topo:
-            ack = self.exp_topo.stop()
+            ack, info = self.exp_topo.stop()
+            if not ack:
+                error = info
 
         self.exp_topo = None
+        self.timeline.clear()
 
         msg = {
             "info": {},
-            "error": "",
+            "error": error,
         }
 
         ack = {
@@ -88,32 +211,259 @@ class Playground:
 
         return ack
 
+    def update_event(self, event):
+        if not self.exp_topo:
+            return False, "No topology running"
+        return self.exp_topo.update(event)
+
+    def schedule(self, timeline):
+        scheduled = self.timeline.schedule(timeline.get("events", []))
+
+        ack = {
+            "ok": "True",
+            "msg": {
+                "info": {"scheduled": scheduled},
+                "error": "",
+            },
+        }
+
+        return ack
+
+    def executed(self, options):
+        info = {
+            "events": self.timeline.executed(options.get("since", 0)),
+            "pending": self.timeline.pending(),
+        }
+
+        ack = {
+            "ok": "True",
+            "msg": {
+                "info": info,
+                "error": "",
+            },
+        }
+
+        return ack
+
+    def snapshots(self, scenario):
+        phases = scenario.get("snapshot", {}).get("phases", [])
+        key = topology_key(scenario)
+        available = Snapshots().available(key, phases)
+
+        ack = {
+            "ok": "True",
+            "msg": {
+                "info": {"key": key, "available": available},
+                "error": "",
+            },
+        }
+
+        return ack
+
+    async def ready(self, options):
+        ok, info, error = True, {}, ""
+
+        if self.exp_topo:
+            nodes = self.exp_topo.topo.get("nodes", {})
+            probes = Probes(nodes)
+            ok, info = await probes.check(
+                timeout=float(options.get("timeout", PROBES_TIMEOUT))
+            )
+
+        if not ok:
+            not_ready = [name for name, node in info.items() if not node.get("ready")]
+            error = f"Nodes not ready: {not_ready}"
+
+        ack = {
+            "ok": str(ok),
+            "msg": {
+                "info": info,
+                "error": error,
+            },
+        }
+
+        return ack
+
     def clear(self):
         exp = Environment({})
         exp.mn_cleanup()
         logger.info("Experiments cleanup OK")
 
 
+class PlaygroundWorker:
+    """Runs the Playground (i.e., Containernet operations) in a
+    dedicated process, fed by a command queue, so the long ones
+    (e.g., start of a topology) do not block the gRPC server loop
+
+    Commands are executed in order by the worker (see Playground.run).
+    The long actions (WORKER_LONG_ACTIONS) running are exposed in the
+    stats replies (busy), and while one of them blocks the worker
+    (e.g., start), stats are answered right away with its progress
+    (phases reported by Environment).
+    If the worker process exits, the commands waiting for it fail
+    and a new worker is started on the next command.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.in_queue = None
+        self.out_queue = None
+        self.busy = {}
+        self._ids = 0
+        self._replies = {}
+        self._loop = None
+        self._reader = None
+        self._reader_queue = None
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def _start(self):
+        self.in_queue = Queue()
+        self.out_queue = Queue()
+        self.process = Process(
+            target=run_playground, args=(self.in_queue, self.out_queue), daemon=True
+        )
+        self.process.start()
+        logger.info(f"Playground worker started - pid {self.process.pid}")
+
+    def _ensure(self):
+        if not self.alive():
+            self._fail("Playground worker exited")
+            self._start()
+
+        # a reader per out_queue, the one of a restarted worker may
+        # still be waiting on the queue of the process that exited
+        loop = asyncio.get_running_loop()
+        if (
+            self._loop is not loop
+            or self._reader_queue is not self.out_queue
+            or self._reader.done()
+        ):
+            if self._loop is loop and not self._reader.done():
+                self._reader.cancel()
+
+            self._loop = loop
+            self._reader_queue = self.out_queue
+            self._reader = loop.create_task(self._read(self.out_queue))
+
+    def _get(self, out_queue):
+        try:
+            return out_queue.get(timeout=WORKER_POLL)
+        except queue.Empty:
+            return None
+
+    async def _read(self, out_queue):
+        loop = asyncio.get_running_loop()
+
+        while out_queue is self.out_queue:
+            message = await loop.run_in_executor(None, self._get, out_queue)
+
+            if message:
+                self._handle(message)
+            elif not self.alive():
+                self._fail("Playground worker exited")
+                break
+
+    def _handle(self, message):
+        msg_type, uid = message.get("type"), message.get("id")
+
+        if msg_type == "started":
+            action = self._replies.get(uid, (None, None))[1]
+            if action in WORKER_LONG_ACTIONS:
+                self.busy[uid] = {
+                    "action": action,
+                    "started": time.time(),
+                    "progress": [],
+                }
+
+        elif msg_type == "progress":
+            if uid in self.busy:
+                self.busy[uid]["progress"].append(
+                    {"phase": message.get("phase"), "time": message.get("time")}
+                )
+                logger.info(f"Playground progress: {message.get('phase')}")
+
+        elif msg_type == "reply":
+            self.busy.pop(uid, None)
+
+            future, _ = self._replies.pop(uid, (None, None))
+            if future and not future.done():
+                future.set_result(message.get("reply"))
+
+    def _fail(self, error):
+        for future, _ in self._replies.values():
+            if not future.done():
+                future.set_result({"ok": "False", "msg": {"info": {}, "error": error}})
+
+        if self._replies:
+            logger.info(f"{error} - {len(self._replies)} commands failed")
+
+        self._replies = {}
+        self.busy = {}
+
+    def progress(self):
+        info = [
+            {
+                "action": busy.get("action"),
+                "elapsed": time.time() - busy.get("started"),
+                "progress": busy.get("progress"),
+            }
+            for busy in self.busy.values()
+        ]
+        return info
+
+    def blocked(self):
+        return any(
+            busy.get("action") not in WORKER_CONCURRENT_ACTIONS
+            for busy in self.busy.values()
+        )
+
+    async def call(self, action, scenario):
+        """Executes an action in the worker process
+
+        Arguments:
+            action {string} -- The Playground action (e.g., start)
+            scenario {dict} -- The action scenario (e.g., topology)
+
+        Returns:
+            dict -- The Playground reply (ok, msg)
+        """
+        self._ensure()
+
+        if action == "stats" and self.blocked():
+            info = {"busy": self.progress()}
+            return {"ok": "True", "msg": {"info": info, "error": ""}}
+
+        self._ids += 1
+        uid = self._ids
+        future = self._loop.create_future()
+        self._replies[uid] = (future, action)
+
+        self.in_queue.put({"id": uid, "action": action, "scenario": scenario})
+        reply = await future
+
+        info = reply.get("msg", {}).get("info")
+        if action == "stats" and self.busy and isinstance(info, dict):
+            info["busy"] = self.progress()
+
+        return reply
+
+    def stop(self):
+        if self.alive():
+            self.in_queue.put(None)
+            self.process.join(WORKER_POLL)
+
+
 class Scenario(ScenarioBase):
     def __init__(self, info):
         self.info = info
-        self.playground = Playground(None, None)
+        self.worker = PlaygroundWorker()
 
     async def play(self, id, action, scenario):
-        if action == "start":
-            reply = self.playground.start(scenario)
-
-        elif action == "stop":
-            reply = self.playground.stop()
+        reply = await self.worker.call(action, scenario)
 
-        elif action == "update":
-            reply = self.playground.update(scenario)
-
-        elif action == "stats":
-            reply = self.playground.stats()
-
-        else:
-            logger.debug(f"Unkown playground command {action}")
+        if not reply.get("msg"):
             return False, {}
 
         ack, info = reply.get("ok"), reply.get("msg")
@@ -139,6 +489,7 @@ class Scenario(ScenarioBase):
 
     async def Establish(self, stream):
         deploy = await stream.recv_message()
+        received = time.time()
 
         scenario_bytes = deploy.scenario
         scenario = self.parse_bytes(scenario_bytes)
@@ -156,10 +507,12 @@ class Scenario(ScenarioBase):
         built_info = self.serialize_bytes(msg.get("info"))
 
         built = Status(id=id, error=built_error, info=built_info)
+        stamp(built, received)
         await stream.send_message(built)
 
     async def Stats(self, stream):
         wflow_raw = await stream.recv_message()
+        received = time.time()
         scenario = self.parse_bytes(wflow_raw.scenario)
 
         wflow_dict = json_format.MessageToDict(
@@ -175,4 +528,5 @@ class Scenario(ScenarioBase):
         topo_info = self.serialize_bytes(msg.get("info"))
 
         reply = Status(id=ev_id, ok=ok, error=error, info=topo_info)
+        stamp(reply, received)
         await stream.send_message(reply)
\ No newline at end of file
@@ -0,0 +1,175 @@
+import time
+import asyncio
+import logging
+
+from grpclib.client import Channel
+from grpclib.const import Status as GRPCStatus
+from grpclib.exceptions import GRPCError
+from grpclib.health.v1.health_pb2 import HealthCheckRequest, HealthCheckResponse
+from grpclib.health.v1.health_grpc import HealthStub
+
+from umbra.common import dockers
+
+
+logger = logging.getLogger(__name__)
+
+
+# max seconds waiting for all the nodes to be ready
+PROBES_TIMEOUT = 120.0
+# seconds between attempts of a node probes
+PROBES_INTERVAL = 1.0
+# max seconds of each probe attempt
+PROBE_TIMEOUT = 3.0
+
+# grpc statuses telling that a server did not answer the health check,
+# other errors mean a server answered without the health service
+GRPC_UNAVAILABLE = [GRPCStatus.UNAVAILABLE, GRPCStatus.DEADLINE_EXCEEDED]
+
+
+class Probes:
+    """Checks the readiness of the nodes of an environment
+
+    Nodes define their readiness checks in the field probes, a list
+    of probes that must all succeed, of types:
+    - tcp: {"type": "tcp", "port": 7051} port accepts connections
+    - grpc: {"type": "grpc", "port": 50051} a grpc server answers
+    the health check (servers without the health service count as ready)
+    - exec: {"type": "exec", "command": "peer channel list"} command
+    executed inside the node container exits with code 0
+
+    Ports are translated by the node port_bindings, and connected
+    on host (default 127.0.0.1) unless the probe defines its own host.
+    All nodes are probed concurrently, each one retrying every
+    interval until it is ready or the timeout expires.
+    """
+
+    def __init__(self, nodes, host="127.0.0.1"):
+        self.nodes = nodes
+        self.host = host
+
+    def _address(self, node, probe):
+        port = probe.get("port")
+        bindings = node.get("port_bindings") or {}
+        port = bindings.get(str(port), bindings.get(port, port))
+        return probe.get("host", self.host), int(port)
+
+    async def _tcp(self, node, probe):
+        host, port = self._address(node, probe)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout=PROBE_TIMEOUT
+        )
+        writer.close()
+        return True, ""
+
+    async def _grpc(self, node, probe):
+        host, port = self._address(node, probe)
+        channel = Channel(host, port)
+
+        try:
+            stub = HealthStub(channel)
+            reply = await stub.Check(HealthCheckRequest(), timeout=PROBE_TIMEOUT)
+        except GRPCError as e:
+            if e.status in GRPC_UNAVAILABLE:
+                return False, f"grpc status {e.status}"
+            return True, ""
+        finally:
+            channel.close()
+
+        if reply.status != HealthCheckResponse.SERVING:
+            return False, f"grpc health status {reply.status}"
+
+        return True, ""
+
+    def _exec_run(self, node, probe):
+        exit_code, output = dockers.containers().call(
+            node.get("name"), "exec_run", probe.get("command")
+        )
+        return exit_code == 0, output.decode("utf-8", "replace")[-200:]
+
+    async def _exec(self, node, probe):
+        loop = asyncio.get_event_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(None, self._exec_run, node, probe),
+            timeout=PROBE_TIMEOUT,
+        )
+
+    async def probe(self, node, probe):
+        """Runs a single probe attempt
+
+        Returns:
+            tuple -- (bool, string) if the probe succeeded and its error
+        """
+        probers = {
+            "tcp": self._tcp,
+            "grpc": self._grpc,
+            "exec": self._exec,
+        }
+        prober = probers.get(probe.get("type"))
+
+        if not prober:
+            return False, f"unknown probe type {probe.get('type')}"
+
+        try:
+            ok, error = await prober(node, probe)
+        except Exception as e:
+            ok, error = False, repr(e)
+
+        return ok, error
+
+    async def _check_node(self, name, node, deadline, interval):
+        probes = node.get("probes", [])
+        start = time.monotonic()
+        attempts = 0
+        error = ""
+
+        while True:
+            attempts += 1
+            outputs = await asyncio.gather(
+                *(self.probe(node, probe) for probe in probes)
+            )
+            errors = [error for ok, error in outputs if not ok]
+
+            if not errors:
+                ready = True
+                break
+
+            error = "; ".join(errors)
+
+            if time.monotonic() + interval > deadline:
+                ready = False
+                break
+
+            await asyncio.sleep(interval)
+
+        info = {
+            "ready": ready,
+            "elapsed": time.monotonic() - start,
+            "attempts": attempts,
+            "error": "" if ready else error,
+        }
+        logger.info(f"Node {name} readiness: {info}")
+        return name, info
+
+    async def check(self, timeout=PROBES_TIMEOUT, interval=PROBES_INTERVAL):
+        """Probes all the nodes concurrently
+
+        Keyword Arguments:
+            timeout {float} -- Max seconds to wait for all nodes (default: {PROBES_TIMEOUT})
+            interval {float} -- Seconds between node probes attempts (default: {PROBES_INTERVAL})
+
+        Returns:
+            tuple -- (bool, dict) if all nodes are ready, and the
+            readiness info (ready, elapsed, attempts, error) per node
+        """
+        deadline = time.monotonic() + timeout
+
+        checks = [
+            self._check_node(name, node, deadline, interval)
+            for name, node in self.nodes.items()
+            if node.get("probes")
+        ]
+
+        outputs = await asyncio.gather(*checks)
+        info = dict(outputs)
+        ok = all(node_info.get("ready") for node_info in info.values())
+        return ok, info
@@ -0,0 +1,213 @@
+import os
+import json
+import hashlib
+import logging
+
+import docker
+
+from umbra.common import dockers
+
+
+logger = logging.getLogger(__name__)
+
+
+SNAPSHOTS_FOLDER = "/tmp/umbra/snapshots/"
+SNAPSHOTS_IMAGE = "umbra-snapshot"
+SNAPSHOTS_MANIFEST = "manifest.json"
+
+
+def topology_key(topo):
+    """Hashes an environment topology (without its snapshot and
+    cpusets settings), so snapshots are only restored into the same topology
+
+    Arguments:
+        topo {dict} -- The environment topology (nodes, links)
+
+    Returns:
+        string -- The topology key
+    """
+    topo_data = {
+        key: value for key, value in topo.items() if key not in ("snapshot", "cpusets")
+    }
+    topo_str = json.dumps(topo_data, sort_keys=True, default=str)
+    return hashlib.sha256(topo_str.encode("utf-8")).hexdigest()[:16]
+
+
+class Snapshots:
+    """Saves and restores the state of the containers of a topology
+    after a named (setup) phase, keyed by the topology key
+
+    A snapshot of a node keeps the container filesystem (docker
+    commit into the image SNAPSHOTS_IMAGE) and the contents of its
+    volumes (named or anonymous, as tar archives in the folder
+    <folder>/<key>/<phase>). Restoring a node replaces its image
+    and mounts new volumes populated with the archived contents,
+    before the nodes are started.
+    """
+
+    def __init__(self, folder=SNAPSHOTS_FOLDER):
+        self.folder = folder
+        self._docker_client = None
+
+    def _client(self):
+        if not self._docker_client:
+            self._docker_client = dockers.client()
+        return self._docker_client
+
+    def _path(self, key, phase):
+        return os.path.join(self.folder, key, phase)
+
+    def _manifest(self, key, phase):
+        filepath = os.path.join(self._path(key, phase), SNAPSHOTS_MANIFEST)
+
+        try:
+            with open(filepath, "r") as infile:
+                return json.load(infile)
+        except (OSError, ValueError):
+            return None
+
+    def exists(self, key, phase):
+        return self._manifest(key, phase) is not None
+
+    def available(self, key, phases):
+        return [phase for phase in phases if self.exists(key, phase)]
+
+    def _tag(self, key, phase, name):
+        tag = f"{key}-{phase}-{name}".lower()
+        return "".join(c if c.isalnum() or c in "_.-" else "_" for c in tag)[:128]
+
+    def _save_node(self, key, phase, name):
+        client = self._client()
+        path = self._path(key, phase)
+        container = dockers.node_container(client, name)
+
+        tag = self._tag(key, phase, name)
+        container.commit(repository=SNAPSHOTS_IMAGE, tag=tag)
+
+        volumes = []
+        mounts = container.attrs.get("Mounts", [])
+        for index, mount in enumerate(m for m in mounts if m.get("Type") == "volume"):
+            archive = f"{name}-{index}.tar"
+            bits, _ = container.get_archive(mount.get("Destination"))
+
+            with open(os.path.join(path, archive), "wb") as outfile:
+                for chunk in bits:
+                    outfile.write(chunk)
+
+            volumes.append(
+                {"destination": mount.get("Destination"), "archive": archive}
+            )
+
+        return {"image": f"{SNAPSHOTS_IMAGE}:{tag}", "volumes": volumes}
+
+    def save(self, key, phase, nodes):
+        """Takes the snapshot of the (running) container nodes
+
+        Arguments:
+            key {string} -- The topology key (see topology_key)
+            phase {string} -- The snapshot phase name
+            nodes {list} -- Names of the container nodes
+
+        Returns:
+            tuple -- (bool, string) if the snapshot was saved and its error
+        """
+        path = self._path(key, phase)
+        os.makedirs(path, exist_ok=True)
+        manifest = {"key": key, "phase": phase, "nodes": {}}
+
+        try:
+            for name in nodes:
+                manifest["nodes"][name] = self._save_node(key, phase, name)
+
+        except (docker.errors.APIError, docker.errors.NotFound, OSError) as e:
+            logger.info(f"Snapshot {phase} not saved - error {repr(e)}")
+            return False, repr(e)
+
+        filepath = os.path.join(path, SNAPSHOTS_MANIFEST)
+        with open(filepath + ".tmp", "w") as outfile:
+            json.dump(manifest, outfile)
+        os.replace(filepath + ".tmp", filepath)
+
+        logger.info(f"Snapshot {phase} saved - {len(nodes)} nodes in {path}")
+        return True, None
+
+    def _restore_volume(self, image, volume, destination, archive):
+        client = self._client()
+
+        try:
+            client.volumes.get(volume).remove(force=True)
+        except docker.errors.NotFound:
+            pass
+
+        client.volumes.create(volume)
+
+        helper = client.containers.create(
+            image, command="true", volumes=[f"{volume}:{destination}:rw"]
+        )
+
+        try:
+            parent = os.path.dirname(destination.rstrip("/")) or "/"
+            with open(archive, "rb") as infile:
+                helper.put_archive(parent, infile.read())
+        finally:
+            helper.remove(force=True)
+
+    def _mount(self, volumes, volume, destination):
+        mounted = []
+
+        for spec in volumes:
+            fields = spec.split(":")
+            if len(fields) > 1 and fields[1].rstrip("/") == destination.rstrip("/"):
+                continue
+            mounted.append(spec)
+
+        mounted.append(f"{volume}:{destination}:rw")
+        return mounted
+
+    def restore(self, key, phase, nodes):
+        """Restores the snapshot into the (not yet started) nodes,
+        replacing their image and volumes
+
+        Arguments:
+            key {string} -- The topology key (see topology_key)
+            phase {string} -- The snapshot phase name
+            nodes {dict} -- The topology container nodes indexed by name
+
+        Returns:
+            tuple -- (bool, string) if the snapshot was restored and its error
+        """
+        manifest = self._manifest(key, phase)
+        if not manifest:
+            return False, f"Snapshot {phase} not found for topology {key}"
+
+        path = self._path(key, phase)
+        restored = {}
+
+        try:
+            for name, snapshot in manifest.get("nodes", {}).items():
+                if name not in nodes:
+                    continue
+
+                image = snapshot.get("image")
+                volumes = nodes[name].get("volumes", [])
+
+                for index, volume_info in enumerate(snapshot.get("volumes", [])):
+                    volume = self._tag(key, phase, f"{name}-{index}")
+                    destination = volume_info.get("destination")
+                    archive = os.path.join(path, volume_info.get("archive"))
+
+                    self._restore_volume(image, volume, destination, archive)
+                    volumes = self._mount(volumes, volume, destination)
+
+                restored[name] = (image, volumes)
+
+        except (docker.errors.APIError, docker.errors.NotFound, OSError) as e:
+            logger.info(f"Snapshot {phase} not restored - error {repr(e)}")
+            return False, repr(e)
+
+        for name, (image, volumes) in restored.items():
+            nodes[name]["image"] = image
+            nodes[name]["volumes"] = volumes
+
+        logger.info(f"Snapshot {phase} restored from {path}")
+        return True, None
@@ -0,0 +1,132 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import docker
+
+from umbra.common import dockers
+
+
+logger = logging.getLogger(__name__)
+
+
+# label of every container created by umbra (value: topology key)
+TEARDOWN_LABEL = "umbra.topology"
+# label Containernet sets in the containers it creates, used when its
+# addDocker does not pass the umbra label along
+TEARDOWN_CONTAINERNET_LABEL = "com.containernet"
+# containers created on behalf of umbra nodes (e.g., fabric chaincodes),
+# which umbra can not label, selected by name
+TEARDOWN_PATTERNS = ["dev-peer"]
+# max containers removed at the same time
+TEARDOWN_WORKERS = 16
+
+
+class Teardown:
+    """Removes the containers of experiments concurrently
+
+    Containers are selected by the label TEARDOWN_LABEL (the ones
+    umbra creates), by their names (the Containernet ones of a
+    topology, or any labeled by Containernet if no topology key is
+    given) and by name patterns (the ones created by the nodes
+    themselves), and force-removed (killed, without a stop
+    grace period) along with their anonymous volumes, by a bounded
+    pool of workers.
+    """
+
+    def __init__(self, docker_client=None, workers=TEARDOWN_WORKERS):
+        self._docker_client = docker_client
+        self.workers = workers
+
+    def _client(self):
+        if not self._docker_client:
+            self._docker_client = dockers.client()
+        return self._docker_client
+
+    def select(self, key=None, patterns=TEARDOWN_PATTERNS, names=None):
+        """Lists the containers (running or not) to be removed
+
+        Keyword Arguments:
+            key {string} -- Only the containers of this topology key,
+            or of any topology if None (default: {None})
+            patterns {list} -- Substrings of container names (default: {TEARDOWN_PATTERNS})
+            names {list} -- Node names of the topology, their
+            Containernet containers are selected too (default: {None})
+
+        Returns:
+            list -- The containers
+        """
+        client = self._client()
+        label = f"{TEARDOWN_LABEL}={key}" if key else TEARDOWN_LABEL
+        labels = [label] if key else [label, TEARDOWN_CONTAINERNET_LABEL]
+
+        selected = {}
+        for label in labels:
+            filters = {"label": label}
+            for container in client.containers.list(all=True, filters=filters):
+                selected[container.name] = container
+
+        for name in names or []:
+            try:
+                container = dockers.node_container(client, name)
+            except docker.errors.NotFound:
+                continue
+            selected[container.name] = container
+
+        if patterns:
+            for container in client.containers.list(all=True):
+                if any(pattern in container.name for pattern in patterns):
+                    selected[container.name] = container
+
+        return list(selected.values())
+
+    def _remove(self, container):
+        try:
+            container.remove(force=True, v=True)
+        except docker.errors.NotFound:
+            return True
+        except docker.errors.APIError as e:
+            logger.debug(f"Docker container {container.name} not removed - {e}")
+            return False
+        return True
+
+    def remove(self, containers):
+        """Force-removes containers concurrently
+
+        Arguments:
+            containers {list} -- The containers
+
+        Returns:
+            dict -- If each container (by name) was removed
+        """
+        if not containers:
+            return {}
+
+        workers = max(min(self.workers, len(containers)), 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            acks = list(executor.map(self._remove, containers))
+
+        removed = {container.name: ack for container, ack in zip(containers, acks)}
+        logger.info(
+            f"Docker containers removed {sum(acks)} of {len(containers)} "
+            f"- {workers} workers"
+        )
+        return removed
+
+    def run(self, key=None, patterns=TEARDOWN_PATTERNS, names=None):
+        """Selects and removes the containers of experiments
+
+        Keyword Arguments:
+            key {string} -- The topology key (default: {None})
+            patterns {list} -- Substrings of container names (default: {TEARDOWN_PATTERNS})
+            names {list} -- Node names of the topology (default: {None})
+
+        Returns:
+            dict -- If each container (by name) was removed
+        """
+        try:
+            containers = self.select(key, patterns, names)
+        except docker.errors.APIError as e:
+            logger.debug(f"Docker containers not listed - API Error {e}")
+            return {}
+
+        return self.remove(containers)
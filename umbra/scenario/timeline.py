@@ -0,0 +1,145 @@
+import time
+import asyncio
+import logging
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+
+# seconds before a trigger time the timer stops sleeping coarsely
+TIMELINE_SPIN = 0.002
+# max amount of execution records kept by a timeline
+TIMELINE_MAX_RECORDS = 100000
+
+
+def triggers(start, schedule):
+    """Expands an event schedule into its absolute trigger times,
+    following the semantics of the scheduler Handler (from, repeat,
+    interval and until)
+
+    Arguments:
+        start {float} -- Time (epoch seconds) the events timeline begins
+        schedule {dict} -- The event schedule
+
+    Returns:
+        list -- The trigger times (epoch seconds) of the event iterations
+    """
+    begin = schedule.get("from", 0)
+    finish = schedule.get("until", 0)
+    repeat = schedule.get("repeat", 0) or 1
+    interval = schedule.get("interval", 0)
+
+    times = []
+    for iteration in range(repeat):
+        if iteration and finish and iteration * interval >= finish:
+            break
+        times.append(start + begin + iteration * interval)
+
+    return times
+
+
+class Timeline:
+    """Executes the events of a scenario at absolute trigger times
+
+    The broker pushes the events (id, at, event) ahead of time, each
+    one is triggered by a local timer at its time (epoch seconds) and
+    executed by the call (e.g., Playground update). Each execution is
+    recorded with: seq, id, iteration, scheduled/started/finished
+    times (ms), duration (s), outcome and size (of the call output),
+    so the broker can retrieve the actual execution times.
+    """
+
+    def __init__(self, call, max_records=TIMELINE_MAX_RECORDS):
+        self.call = call
+        self._records = deque(maxlen=max_records)
+        self._tasks = set()
+        self._seq = 0
+
+    def clear(self):
+        for task in self._tasks:
+            task.cancel()
+
+        self._tasks = set()
+        self._records.clear()
+
+    def pending(self):
+        return len(self._tasks)
+
+    async def _wait(self, at):
+        delay = at - time.time()
+
+        if delay > TIMELINE_SPIN:
+            await asyncio.sleep(delay - TIMELINE_SPIN)
+
+        while time.time() < at:
+            await asyncio.sleep(0)
+
+    def _execute(self, uid, event):
+        started = time.time()
+
+        try:
+            ok, info = self.call(event)
+        except Exception as e:
+            logger.info(f"Timeline event {uid} exception {repr(e)}")
+            ok, info = False, repr(e)
+
+        outcome = "ok" if str(ok) == "True" else "error"
+        return started, time.time(), outcome, len(repr(info)) if info else 0
+
+    async def _trigger(self, uid, iteration, at, event):
+        await self._wait(at)
+        started, finished, outcome, size = self._execute(uid, event)
+
+        self._seq += 1
+        record = {
+            "seq": self._seq,
+            "id": uid,
+            "iteration": iteration,
+            "scheduled": int(at * 1000),
+            "started": int(started * 1000),
+            "finished": int(finished * 1000),
+            "duration": finished - started,
+            "outcome": outcome,
+            "size": size,
+        }
+        self._records.append(record)
+        logger.debug(f"Timeline event executed: {record}")
+
+    def schedule(self, events):
+        """Schedules the events on local timers
+
+        Arguments:
+            events {list} -- Dicts with id, iteration, at (epoch
+            seconds) and event (the scenario update of the event)
+
+        Returns:
+            int -- The amount of events scheduled
+        """
+        loop = asyncio.get_event_loop()
+
+        for event in sorted(events, key=lambda event: event.get("at")):
+            task = loop.create_task(
+                self._trigger(
+                    event.get("id"),
+                    event.get("iteration", 0),
+                    event.get("at"),
+                    event.get("event"),
+                )
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        logger.info(f"Timeline scheduled {len(events)} events")
+        return len(events)
+
+    def executed(self, since=0):
+        """Exports the records of the events executed
+
+        Keyword Arguments:
+            since {int} -- Only records with seq bigger than since (default: {0})
+
+        Returns:
+            list -- The records
+        """
+        return [record for record in self._records if record["seq"] > since]
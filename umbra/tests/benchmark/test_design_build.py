@@ -0,0 +1,123 @@
+import os
+import time
+import logging
+import unittest
+import tracemalloc
+
+from umbra.design.basis import Topology, Experiment
+
+
+logger = logging.getLogger(__name__)
+
+
+# benchmarks only run if set (e.g., UMBRA_BENCHMARK=1), as their
+# timings depend on the load of the host
+BENCHMARK_ENV = "UMBRA_BENCHMARK"
+BENCHMARK_SIZES = [100, 1000, 5000]
+BENCHMARK_CONTAINERS_PER_SWITCH = 20
+BENCHMARK_ENVIRONMENTS = 4
+
+
+def make_topology(size, model=5):
+    """Creates a topology of size nodes: a random graph (see
+    Graph.create_random) of switches spread over the environments,
+    each switch with its containers, all with profiles and lifecycles
+
+    Arguments:
+        size {int} -- The number of nodes (switches and containers)
+
+    Keyword Arguments:
+        model {int} -- The random graph model of switches (default: {5})
+
+    Returns:
+        Topology -- The topology
+    """
+    topo = Topology(f"bench-{size}", "benchmark")
+    n_switches = max(size // (BENCHMARK_CONTAINERS_PER_SWITCH + 1), 3)
+    graph = topo.create_random(model, {"nodes": n_switches, "neighbour_edges": 2})
+    topo.create_graph()
+
+    for sw in graph.nodes:
+        env = f"env{sw % BENCHMARK_ENVIRONMENTS}"
+        topo.add_node(f"s{sw}", "switch", "switch", environment=env)
+
+    for src, dst in graph.edges:
+        same_env = src % BENCHMARK_ENVIRONMENTS == dst % BENCHMARK_ENVIRONMENTS
+        link_type = "internal" if same_env else "external"
+        topo.add_link_nodes(f"s{src}", f"s{dst}", link_type, "links")
+
+    workflow = topo.create_node_lifecycle("setup", {"a": 1}, "run", "container")
+
+    for index in range(size - n_switches):
+        sw = index % n_switches
+        env = f"env{sw % BENCHMARK_ENVIRONMENTS}"
+        name = f"node{index}"
+        topo.add_node(name, "container", "nodes", environment=env)
+        topo.add_link_nodes(name, f"s{sw}", "internal", "links")
+        topo.add_node_lifecycle([workflow], name)
+
+    topo.add_node_profile(topo.create_node_profile(2, 1024, None), profile="nodes")
+    topo.add_link_profile(topo.create_link_profile(1000, 1, 0), profile="links")
+    return topo
+
+
+def measure(phase, call, results):
+    tracemalloc.start()
+    start = time.perf_counter()
+    output = call()
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results[phase] = {"time": duration, "memory": peak}
+    return output
+
+
+def benchmark(size):
+    """Runs the design phases of a topology of size nodes, tracking
+    the time (seconds) and peak memory (bytes) of each phase
+
+    Arguments:
+        size {int} -- The number of nodes
+
+    Returns:
+        dict -- The time and memory indexed by phase
+    """
+    results = {}
+    topo = measure("generate", lambda: make_topology(size), results)
+    measure("build", topo.build, results)
+    envs = measure("build_environments", topo.build_environments, results)
+
+    exp = Experiment(topo.name)
+    exp.set_topology(topo)
+    measure("dump", exp.dump, results)
+
+    assert sum(len(env["nodes"]) for env in envs.values()) >= size
+    return results
+
+
+@unittest.skipUnless(os.environ.get(BENCHMARK_ENV), f"set {BENCHMARK_ENV} to run")
+class TestDesignBuild(unittest.TestCase):
+    def test_build_scale(self):
+        results = {size: benchmark(size) for size in BENCHMARK_SIZES}
+
+        for size, phases in results.items():
+            for phase, stats in phases.items():
+                logger.info(
+                    f"size {size} phase {phase}: "
+                    f"time {stats['time']:.4f}s memory {stats['memory'] / 1024:.0f}KiB"
+                )
+
+        smallest, largest = BENCHMARK_SIZES[1], BENCHMARK_SIZES[-1]
+        ratio = largest / smallest
+
+        for phase in ["build", "build_environments", "dump"]:
+            small = results[smallest][phase]
+            large = results[largest][phase]
+            assert large["time"] < max(small["time"], 0.01) * ratio * 3
+            assert large["memory"] < max(small["memory"], 1024) * ratio * 3
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
@@ -0,0 +1,60 @@
+import logging
+import unittest
+import asyncio
+
+from umbra.common.scheduler import Handler
+from umbra.broker.results import EventsResults
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestBrokerResults(unittest.TestCase):
+    async def call_ok(self):
+        await asyncio.sleep(0.01)
+        return "response"
+
+    async def call_error(self):
+        raise ValueError("event failed")
+
+    async def events(self, results):
+        handler = Handler()
+        calls = {
+            1: (self.call_ok, {"from": 0.01, "repeat": 3, "interval": 0.01}),
+            2: (self.call_error, {"from": 0}),
+        }
+        return await handler.run(calls, record=results.add)
+
+    def test_events_results(self):
+        sunk = []
+        results = EventsResults()
+        results.set_sink(sunk.extend)
+        results.register(1, "fabric", "chaincode_invoke")
+        results.register(2, "scenario", "update")
+
+        outputs = asyncio.run(self.events(results))
+        assert outputs[1] == "response"
+
+        records = results.export()
+        assert len(records) == 4
+        assert sunk == records
+
+        ok = [record for record in records if record["id"] == 1]
+        assert [record["iteration"] for record in ok] == [0, 1, 2]
+        assert all(record["outcome"] == "ok" for record in ok)
+        assert all(record["category"] == "fabric" for record in ok)
+        assert all(record["size"] == len("response") for record in ok)
+        assert all(record["finished"] >= record["started"] for record in ok)
+        assert all(record["duration"] >= 0.01 for record in ok)
+
+        error = [record for record in records if record["id"] == 2]
+        assert error[0]["outcome"] == "error"
+        assert error[0]["action"] == "update"
+
+        since = records[1]["seq"]
+        assert results.export(since) == records[2:]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,80 @@
+import math
+import logging
+import unittest
+import tempfile
+
+from umbra.broker.collector import LocalStorage
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestBrokerStorage(unittest.TestCase):
+    def points(self, start, count):
+        points = []
+        for n in range(count):
+            point = {
+                "measurement": "container",
+                "tags": {"environment": "env", "node": f"peer{n % 2}"},
+                "fields": {"cpu_percent": float(n), "status": "running"},
+                "time": start + n,
+            }
+            if n >= count // 2:
+                point["fields"]["memory_percent"] = 1.0
+            points.append(point)
+        return points
+
+    def test_local_storage_write_read(self):
+        with tempfile.TemporaryDirectory() as folder:
+            storage = LocalStorage({}, folder=folder)
+
+            ack, err = storage.write(self.points(1000, 10), "env")
+            assert ack is True
+            assert err == ""
+            storage.close()
+
+            assert storage.measurements("env") == ["container"]
+
+            partitions = storage.read("env", "container")
+            assert len(partitions) == 1
+
+            partition = partitions[0]
+            assert list(partition["time"]) == list(range(1000, 1010))
+            assert list(partition["numeric"]["cpu_percent"]) == [
+                float(n) for n in range(10)
+            ]
+
+            memory = list(partition["numeric"]["memory_percent"])
+            assert all(math.isnan(value) for value in memory[:5])
+            assert memory[5:] == [1.0] * 5
+
+            codes, values = partition["dictionary"]["node"]
+            assert [values[code] for code in codes] == ["peer0", "peer1"] * 5
+
+            codes, values = partition["dictionary"]["field_status"]
+            assert values == ["running"]
+
+    def test_local_storage_partitions(self):
+        with tempfile.TemporaryDirectory() as folder:
+            storage = LocalStorage({}, folder=folder)
+            window = storage.PARTITION_SECONDS * 1000
+
+            storage.write(self.points(0, 4), "env")
+            storage.write(self.points(window, 4), "env")
+            storage.close()
+
+            assert len(storage.read("env", "container")) == 2
+            assert len(storage.read("env", "container", start=window)) == 1
+            assert len(storage.read("env", "container", stop=window)) == 1
+
+            reopened = LocalStorage({}, folder=folder)
+            reopened.write(self.points(4, 4), "env")
+            reopened.close()
+
+            partitions = reopened.read("env", "container", stop=window)
+            assert list(partitions[0]["time"]) == list(range(8))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import shutil
+import logging
+import unittest
+import tempfile
+import subprocess
+from unittest import mock
+
+import networkx as nx
+
+from umbra.cli.bundle import (
+    Bundle,
+    BUNDLE_CHECKSUMS,
+    BUNDLE_IMAGES,
+    BUNDLE_INSTALL,
+    BUNDLE_INSTALL_SCRIPT,
+    BUNDLE_MANIFEST,
+    BUNDLE_PYTHON,
+    topology_images,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FakeTopology:
+    def __init__(self):
+        self.graph = nx.MultiGraph()
+        self.graph.add_node("peer0", type="container", image="fabric-peer:2.2.1")
+        self.graph.add_node("peer1", type="container", image="fabric-peer:2.2.1")
+        self.graph.add_node("orderer", type="container", image="fabric-orderer:2.2.1")
+        self.graph.add_node("s0", type="switch")
+
+
+class LocalBundle(Bundle):
+    def _wheelhouse(self):
+        os.makedirs(os.path.join(self.path, "wheelhouse"))
+        with open(os.path.join(self.path, "wheelhouse", "umbra.whl"), "w") as f:
+            f.write("wheel")
+
+    def _binaries(self):
+        os.makedirs(os.path.join(self.path, "bin"))
+
+    def _images(self):
+        os.makedirs(os.path.join(self.path, "images"))
+        for image in self.images:
+            filename = image.replace("/", "_").replace(":", "_") + ".tar"
+            with open(os.path.join(self.path, "images", filename), "w") as f:
+                f.write(image)
+
+
+class TestCLIBundle(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "source")
+        os.makedirs(os.path.join(self.source, ".git"))
+        with open(os.path.join(self.source, "setup.py"), "w") as f:
+            f.write("")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_topology_images(self):
+        images = topology_images(FakeTopology())
+        assert images == ["fabric-orderer:2.2.1", "fabric-peer:2.2.1"]
+
+    def test_build_verify(self):
+        folder = os.path.join(self.folder, "bundles")
+        bundle = LocalBundle("fabric", ["fabric-peer:2.2.1"], folder, self.source)
+
+        ack, path = bundle.build()
+        assert ack and path == bundle.path
+        assert bundle.images == sorted(BUNDLE_IMAGES + ["fabric-peer:2.2.1"])
+        assert os.access(os.path.join(path, BUNDLE_INSTALL), os.X_OK)
+        assert bundle.verify()
+
+        if shutil.which("sha256sum"):
+            result = subprocess.run(["sha256sum", "-c", BUNDLE_CHECKSUMS], cwd=path)
+            assert result.returncode == 0
+
+        # reused while valid
+        mtime = os.stat(os.path.join(path, BUNDLE_CHECKSUMS)).st_mtime_ns
+        assert bundle.build() == (True, path)
+        assert os.stat(os.path.join(path, BUNDLE_CHECKSUMS)).st_mtime_ns == mtime
+
+        with open(os.path.join(path, "wheelhouse", "umbra.whl"), "w") as f:
+            f.write("tampered")
+        assert not bundle.verify()
+
+        with open(os.path.join(path, "extra"), "w") as f:
+            f.write("")
+        assert not bundle.verify()
+
+        ack, path = bundle.build()
+        assert ack and bundle.verify()
+        assert not os.path.exists(os.path.join(path, "extra"))
+
+    def test_images_changed(self):
+        folder = os.path.join(self.folder, "bundles")
+        bundle = LocalBundle("fabric", ["fabric-peer:2.2.1"], folder, self.source)
+        other = LocalBundle("fabric", ["fabric-peer:2.3.0"], folder, self.source)
+        assert bundle.name != other.name
+
+        ack, path = bundle.build()
+        assert ack and bundle.verify()
+
+        # same folder, other images: not reused
+        other.path = path
+        assert not other.verify()
+
+        with open(os.path.join(path, BUNDLE_MANIFEST), "w") as f:
+            f.write("{")
+        bundle._checksums()
+        assert not bundle.verify()
+
+    def test_wheelhouse_python(self):
+        bundle = Bundle("fabric", folder=self.folder, source=self.source)
+        assert f"{BUNDLE_PYTHON} -m pip install" in BUNDLE_INSTALL_SCRIPT
+
+        with mock.patch("umbra.cli.bundle.shutil.which", return_value=None):
+            with self.assertRaises(OSError):
+                bundle._wheelhouse()
+
+        with mock.patch(
+            "umbra.cli.bundle.shutil.which", return_value="/usr/bin/python3.8"
+        ), mock.patch("umbra.cli.bundle.subprocess.run") as run:
+            bundle._wheelhouse()
+
+        args = run.call_args[0][0]
+        assert args[:3] == ["/usr/bin/python3.8", "-m", "pip"]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
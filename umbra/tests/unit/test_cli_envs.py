@@ -0,0 +1,115 @@
+import time
+import logging
+import unittest
+
+from umbra.cli.envs import Environments, Proxy, RemotePlugin
+
+
+logger = logging.getLogger(__name__)
+
+
+class FakeChannel:
+    def __init__(self, out, err):
+        self.out = list(out)
+        self.err = list(err)
+
+    def recv_ready(self):
+        return bool(self.out)
+
+    def recv(self, size):
+        return self.out.pop(0)
+
+    def recv_stderr_ready(self):
+        return bool(self.err)
+
+    def recv_stderr(self, size):
+        return self.err.pop(0)
+
+    def exit_status_ready(self):
+        return not self.out and not self.err
+
+
+class FakeProxy:
+    def __init__(self, envid):
+        self.envid = envid
+
+    def load(self, env_cfg):
+        pass
+
+    def implement(self, actions):
+        time.sleep(0.3)
+        if self.envid == "env3":
+            raise OSError("host unreachable")
+        return True, {"start": {"ack": True, "msg": [self.envid]}}
+
+
+class FakePlugin:
+    def __init__(self):
+        self.commands = []
+
+    def execute_command(self, cmd, daemon=False):
+        self.commands.append(cmd)
+        return True, ""
+
+
+class FakeEnvironments(Environments):
+    def _proxy(self, envid):
+        return FakeProxy(envid)
+
+
+class TestCLIEnvs(unittest.TestCase):
+    def test_remote_stream(self):
+        plugin = RemotePlugin("env1")
+        channel = FakeChannel([b"line 1\nli", b"ne 2\n", b"end"], [b"warning"])
+
+        out, err = plugin._stream(channel)
+        assert out == b"line 1\nline 2\nend"
+        assert err == b"warning"
+
+    def test_implement_concurrent(self):
+        envs = FakeEnvironments()
+        envs.env_cfgs = {
+            f"env{index}": {
+                "id": f"env{index}",
+                "remote": True,
+                "host": {"address": f"10.0.0.{index}"},
+            }
+            for index in range(4)
+        }
+
+        start = time.time()
+        ack, messages = envs.implement_env_cfgs("start")
+        assert time.time() - start < 1.0
+
+        assert not ack
+        assert envs.stats_env_cfgs()["env0"]["start"]["ack"]
+        assert not envs.stats_env_cfgs()["env3"]["error"]["ack"]
+
+    def test_start_broker_storage(self):
+        proxy = Proxy("env1")
+        proxy.envid = "env1"
+        proxy._plugin = FakePlugin()
+
+        info = {
+            "uuid": "default-broker",
+            "address": "127.0.0.1:8956",
+            "storage": "local",
+            "storage_folder": "/tmp/umbra/metrics/exp1/",
+        }
+        output = proxy._workflow_start("broker", info)
+
+        assert output["ack"]
+        assert proxy._plugin.commands == [
+            "umbra-broker --uuid default-broker --address 127.0.0.1:8956 --debug"
+            " --storage local --storage-folder /tmp/umbra/metrics/exp1/ &"
+        ]
+
+        # the scenario events ahead of time dispatch is opt-in
+        proxy._plugin.commands = []
+        proxy._workflow_start("broker", dict(info, dispatch="ahead"))
+        assert " --dispatch ahead &" in proxy._plugin.commands[0]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
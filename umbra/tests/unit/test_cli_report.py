@@ -0,0 +1,87 @@
+import json
+import logging
+import unittest
+import tempfile
+
+from umbra.broker.collector import LocalStorage
+from umbra.cli.report import Report, summarize, _array
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestCLIReport(unittest.TestCase):
+    def store(self, folder):
+        storage = LocalStorage({}, folder=folder)
+        points = []
+        for n in range(20):
+            for node in ["peer0", "peer1"]:
+                cpu = 90.0 if node == "peer0" and 8 <= n <= 10 else 10.0
+                points.append(
+                    {
+                        "measurement": "container",
+                        "tags": {"environment": "env", "source": node},
+                        "fields": {"cpu_percent": cpu, "net_bytes": float(n * 100)},
+                        "time": 1000 * n,
+                    }
+                )
+        storage.write(points, "env")
+        storage.close()
+
+    def test_summarize(self):
+        summary = summarize(_array([1.0, 2.0, 3.0, 4.0]), times=[0, 1000, 2000, 3000])
+        assert summary["count"] == 4
+        assert summary["mean"] == 2.5
+        assert summary["p50"] == 2.5
+        assert summary["max"] == 4.0
+        assert summary["rate"] == 1.0
+
+    def test_report_build(self):
+        events = [
+            {
+                "id": 1,
+                "category": "fabric",
+                "scheduled": 9000,
+                "started": 9500,
+                "finished": 10000,
+                "outcome": "ok",
+            },
+            {
+                "id": 2,
+                "category": "fabric",
+                "scheduled": 11000,
+                "started": 11000,
+                "finished": 13000,
+                "outcome": "error",
+            },
+        ]
+
+        with tempfile.TemporaryDirectory() as folder:
+            self.store(folder)
+            report = Report(folder=folder, events=events)
+            output = report.build()
+
+            container = output["environments"]["env"]["container"]
+            assert container["samples"] == 40
+            assert container["sources"]["peer0"]["cpu_percent"]["max"] == 90.0
+            assert container["sources"]["peer1"]["cpu_percent"]["max"] == 10.0
+            assert container["sources"]["peer0"]["net_bytes"]["rate"] == 100.0
+
+            event = output["events"][0]
+            assert event["lateness"] == 0.5
+            assert event["peaks"]["env"]["peer0"]["container.cpu_percent"] == 90.0
+
+            fabric = output["transactions"]["fabric"]
+            assert fabric["ok"] == 1 and fabric["error"] == 1
+            assert fabric["latency"]["mean"] == 0.5
+
+            paths = report.save(output, folder=folder)
+            with open(paths[0]) as f:
+                assert json.load(f)["transactions"] == output["transactions"]
+            with open(paths[1]) as f:
+                assert "peer0" in f.read()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import logging
+import unittest
+import tempfile
+import subprocess
+
+from umbra.cli.sync import Sync, build_manifest, diff_manifests
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalSync(Sync):
+    def _exec(self, command, data=None, writer=None):
+        proc = subprocess.Popen(
+            command,
+            shell=True,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if writer:
+            writer(proc.stdin)
+        elif data is not None:
+            proc.stdin.write(data)
+        proc.stdin.close()
+        out, err = proc.stdout.read(), proc.stderr.read()
+        return proc.wait(), out, err
+
+
+class TestCLISync(unittest.TestCase):
+    def write(self, folder, relpath, content):
+        filepath = os.path.join(folder, relpath)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, "w") as outfile:
+            outfile.write(content)
+
+    def read(self, folder, relpath):
+        with open(os.path.join(folder, relpath), "r") as infile:
+            return infile.read()
+
+    def test_manifest(self):
+        with tempfile.TemporaryDirectory() as folder:
+            self.write(folder, "a.txt", "a")
+            self.write(folder, "crypto/b.pem", "b")
+
+            manifest = build_manifest(folder)
+            assert sorted(manifest) == ["a.txt", os.path.join("crypto", "b.pem")]
+
+            cached = {k: dict(v, hash="cached") for k, v in manifest.items()}
+            assert build_manifest(folder, cached)["a.txt"]["hash"] == "cached"
+
+            remote = dict(manifest, old={"hash": "x"})
+            remote["a.txt"] = {"hash": "y"}
+            assert diff_manifests(manifest, remote) == (["a.txt"], ["old"])
+
+    def test_put(self):
+        with tempfile.TemporaryDirectory() as base:
+            local = os.path.join(base, "local", "settings")
+            remote = os.path.join(base, "remote")
+            sync = LocalSync(None, cache_dir=os.path.join(base, "cache"))
+
+            self.write(local, "config.yaml", "v1")
+            self.write(local, "crypto/key.pem", "key")
+            self.write(local, "old.txt", "old")
+
+            stats = sync.put(local, remote)
+            assert stats["changed"] == 3 and stats["sent"] > 0
+            assert self.read(remote, "settings/crypto/key.pem") == "key"
+
+            stats = sync.put(local, remote)
+            assert stats == {"changed": 0, "deleted": 0, "sent": 0}
+
+            self.write(local, "config.yaml", "v2")
+            os.remove(os.path.join(local, "old.txt"))
+
+            stats = sync.put(local, remote)
+            assert stats["changed"] == 1 and stats["deleted"] == 1
+            assert self.read(remote, "settings/config.yaml") == "v2"
+            assert not os.path.exists(os.path.join(remote, "settings/old.txt"))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
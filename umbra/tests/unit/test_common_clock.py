@@ -0,0 +1,50 @@
+import time
+import logging
+import unittest
+
+from umbra.common.clock import Clock, Clocks, stamp, remote_time
+from umbra.common.protobuf.umbra_pb2 import Status
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestCommonClock(unittest.TestCase):
+    def test_clock_filter(self):
+        clock = Clock(samples=4)
+        assert clock.offset() == 0.0
+
+        # remote clock 2s ahead, asymmetric delays bias the long calls
+        clock.sample(100.0, 101.0, 102.9)
+        clock.sample(110.0, 110.02, 112.01)
+        clock.sample(120.0, 125.0, 124.0)
+
+        assert abs(clock.offset() - 2.0) < 1e-6
+        info = clock.info()
+        assert abs(info["rtt"] - 0.02) < 1e-6
+        assert info["samples"] == 3
+
+    def test_clocks_stamp(self):
+        clocks = Clocks()
+
+        reply = Status(id="1")
+        clocks.sample("env", 10.0, 10.1, reply)
+        assert clocks.info() == {}
+        assert remote_time(reply) is None
+
+        received = time.time()
+        stamp(reply, received)
+        assert received <= remote_time(reply) <= time.time()
+
+        sent = received - 5.05
+        clocks.sample("env", sent, sent + 0.1, reply)
+        assert abs(clocks.offset("env") - 5.0) < 0.01
+        assert clocks.offset("other") == 0.0
+
+        assert abs(clocks.to_local("env", 1005.0) - 1000.0) < 0.01
+        assert abs(clocks.to_remote("env", 1000.0) - 1005.0) < 0.01
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
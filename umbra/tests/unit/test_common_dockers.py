@@ -0,0 +1,64 @@
+import logging
+import unittest
+
+import docker
+
+from umbra.common.dockers import Containers
+
+
+logger = logging.getLogger(__name__)
+
+
+class FakeContainer:
+    def __init__(self, name, version):
+        self.name = name
+        self.version = version
+        self.removed = False
+
+    def pause(self):
+        if self.removed:
+            raise docker.errors.NotFound("container recreated")
+        return self.version
+
+
+class FakeContainers:
+    def __init__(self):
+        self.gets = 0
+        self.version = 0
+
+    def get(self, name):
+        self.gets += 1
+        if name == "missing":
+            raise docker.errors.NotFound("no such container")
+        self.version += 1
+        return FakeContainer(name, self.version)
+
+
+class FakeClient:
+    def __init__(self):
+        self.containers = FakeContainers()
+
+
+class TestCommonDockers(unittest.TestCase):
+    def test_containers_cache(self):
+        client = FakeClient()
+        containers = Containers(client)
+
+        assert containers.call("peer0", "pause") == 1
+        assert containers.call("peer0", "pause") == 1
+        assert client.containers.gets == 1
+
+        containers.get("peer0").removed = True
+        assert containers.call("peer0", "pause") == 2
+        assert client.containers.gets == 2
+
+        containers.drop("peer0")
+        assert containers.call("peer0", "pause") == 3
+
+        self.assertRaises(docker.errors.NotFound, containers.call, "missing", "pause")
+        assert client.containers.gets == 4
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
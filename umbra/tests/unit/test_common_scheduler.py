@@ -0,0 +1,214 @@
+import logging
+import unittest
+import asyncio
+
+from umbra.common.scheduler import Handler, QueueHandler
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestCommonScheduler(unittest.TestCase):
+    def setUp(self):
+        self.counter = 0
+
+    async def call(self):
+        self.counter += 1
+        return {"iteration": self.counter}
+
+    def run_calls(self, results, sink=None):
+        handler = Handler()
+        if sink:
+            handler.set_sink(sink)
+
+        sched = {"repeat": 50, "results": results}
+        return asyncio.run(handler._schedule(1, self.call, sched))
+
+    def test_retention_last(self):
+        outputs = self.run_calls({"policy": "last", "keep": 3})
+        assert [output["iteration"] for output in outputs] == [48, 49, 50]
+
+        outputs = self.run_calls({})
+        assert outputs == [{"iteration": 100}]
+
+    def test_retention_all(self):
+        outputs = self.run_calls({"policy": "all"})
+        assert len(outputs) == 50
+
+    def test_retention_summary(self):
+        outputs = self.run_calls({"policy": "summary"})
+        summary = outputs.pop()
+        assert summary["iterations"] == 50
+        assert summary["outcomes"] == {"ok": 50}
+        assert summary["duration"]["count"] == 50
+        assert summary["duration"]["min"] <= summary["duration"]["mean"]
+
+    def test_retention_sink(self):
+        sunk = []
+        outputs = self.run_calls(
+            {"policy": "sink"}, sink=lambda uid, result: sunk.append(result)
+        )
+        assert outputs == []
+        assert len(sunk) == 50
+
+    def test_run_last_result(self):
+        handler = Handler()
+        calls = {1: (self.call, {"repeat": 5, "results": {"policy": "summary"}})}
+        outputs = asyncio.run(handler.run(calls))
+        assert outputs[1]["iterations"] == 5
+
+    def test_queue_handler(self):
+        running = {"now": 0, "max": 0}
+
+        async def call():
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+            return "ok"
+
+        calls = {
+            uid: (call, {"from": (uid % 10) * 0.01, "repeat": 2, "interval": 0.01})
+            for uid in range(500)
+        }
+
+        records = []
+        handler = QueueHandler(max_concurrency=50)
+        outputs = asyncio.run(
+            handler.run(calls, record=lambda uid, info: records.append(uid))
+        )
+
+        assert outputs == {uid: "ok" for uid in range(500)}
+        assert len(records) == 1000
+        assert running["max"] == 50
+
+        stats = handler.stats()
+        assert stats["queue_depth"] == 0 and stats["running"] == 0
+        assert stats["dispatched"] == 1000
+        assert stats["lateness"]["count"] == 1000
+        assert stats["lateness"]["max"] > 0
+
+    def test_queue_handler_lazy(self):
+        pulled = []
+
+        def calls():
+            for uid in range(20):
+                pulled.append(uid)
+                yield uid, (self.call, {"from": uid * 0.05})
+
+        async def run(handler):
+            task = asyncio.create_task(handler.run(calls()))
+            await asyncio.sleep(0.1)
+            pulled_early = len(pulled)
+            outputs = await task
+            return pulled_early, outputs
+
+        handler = QueueHandler(lookahead=0.05)
+        pulled_early, outputs = asyncio.run(run(handler))
+
+        assert pulled_early < 10
+        assert len(outputs) == 20
+        assert handler.stats()["queue_depth_max"] < 10
+
+    async def dependencies(self, handler, lazy=False):
+        order = []
+
+        def call(name, fail=False, result=None):
+            async def run():
+                await asyncio.sleep(0.05)
+                order.append(name)
+                if fail:
+                    raise ValueError(name)
+                return result if result is not None else name
+
+            return run
+
+        calls = {
+            "create": (call("create"), {"from": 0}),
+            "join": (call("join", fail=True), {"after": "create"}),
+            "install": (call("install"), {"after": "join", "on": "success"}),
+            "info": (call("info"), {"after": ["join"]}),
+            "setup": (call("setup", result=(False, {"error": "setup"})), {"from": 0}),
+            "configure": (call("configure"), {"after": "setup", "on": "success"}),
+            "ready": (call("ready"), {"when": "ready"}),
+            "missing": (call("missing"), {"after": "unknown"}),
+            "cycle": (call("cycle"), {"after": "cycle"}),
+        }
+
+        if lazy:
+            calls = iter(list(calls.items()))
+
+        records = {}
+        run = asyncio.create_task(
+            handler.run(calls, record=lambda uid, info: records.update({uid: info}))
+        )
+        await asyncio.sleep(0.3)
+        handler.release("ready")
+        outputs = await run
+        return order, records, outputs
+
+    def test_dependencies(self):
+        handlers = [(Handler(), False), (QueueHandler(), False), (QueueHandler(), True)]
+
+        for handler, lazy in handlers:
+            order, records, outputs = asyncio.run(
+                asyncio.wait_for(self.dependencies(handler, lazy), timeout=3)
+            )
+
+            assert order.index("create") < order.index("join") < order.index("info")
+            assert order[-1] == "ready"
+            assert "install" not in order and "configure" not in order
+            assert "missing" in order and "cycle" in order
+
+            assert records["install"]["outcome"] == "skipped"
+            assert records["join"]["outcome"] == "error"
+            assert records["setup"]["outcome"] == "error"
+            assert records["configure"]["outcome"] == "skipped"
+            assert records["join"]["started"] >= records["create"]["finished"]
+            assert outputs["info"] == "info"
+
+    async def restored(self, handler, lazy):
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        order, times = [], {}
+
+        def call(name):
+            async def run():
+                order.append(name)
+                times[name] = loop.time() - start
+                return name
+
+            return run
+
+        calls = {
+            "deploy": (call("deploy"), {"after": "create", "on": "success"}),
+            "query": (call("query"), {"after": ["create", "deploy"]}),
+            "tick": (call("tick"), {"from": 0.2}),
+            "later": (call("later"), {"from": 0.4}),
+        }
+        if lazy:
+            calls = iter(list(calls.items()))
+
+        outputs = await handler.run(calls, completed=["create"])
+        return order, times, outputs
+
+    def test_dependencies_completed(self):
+        handlers = [
+            (Handler(), False),
+            (QueueHandler(), False),
+            (QueueHandler(lookahead=0.05), True),
+        ]
+
+        for handler, lazy in handlers:
+            order, times, outputs = asyncio.run(
+                asyncio.wait_for(self.restored(handler, lazy), timeout=3)
+            )
+
+            assert order == ["deploy", "query", "tick", "later"]
+            assert times["query"] < 0.2
+            assert outputs["query"] == "query"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,93 @@
+import time
+import logging
+import unittest
+
+from umbra.design.basis import AddressPool, Topology
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestDesignBasis(unittest.TestCase):
+    def test_address_pool(self):
+        pool = AddressPool(["10.0.0.0/30", "10.0.1.0/24"])
+
+        assert pool.allocate() == "10.0.0.1/30"
+        assert pool.allocate("peer0:eth1") == "10.0.0.2/30"
+        assert pool.allocate("peer0:eth1") == "10.0.0.2/30"
+        assert pool.allocate() == "10.0.1.1/24"
+        assert pool.address(255) == "10.0.1.254/24"
+
+        pool.release("peer0:eth1")
+        assert pool.allocate("peer1:eth1") == "10.0.0.2/30"
+
+        assert pool.allocate_at(10) == "10.0.1.9/24"
+        self.assertRaises(ValueError, pool.allocate_at, 10)
+        self.assertRaises(ValueError, pool.address, 256)
+
+        allocated = len(pool)
+        self.assertRaises(ValueError, pool.allocate_at, 256, "peer2:eth1")
+        assert len(pool) == allocated
+        assert pool.allocate("peer2:eth1") == "10.0.1.2/24"
+
+    def test_address_pool_hashed(self):
+        pool_a = AddressPool(hashed=True)
+        pool_b = AddressPool(hashed=True)
+
+        for index in range(10):
+            pool_a.allocate(f"node{index}:eth1")
+
+        for index in reversed(range(10)):
+            pool_b.allocate(f"node{index}:eth1")
+
+        assert pool_a.allocate("node3:eth1") == pool_b.allocate("node3:eth1")
+
+    def allocate(self, pool, count):
+        start = time.perf_counter()
+        addresses = {pool.allocate(f"node{index}:eth1") for index in range(count)}
+        return addresses, time.perf_counter() - start
+
+    def test_address_pool_scale(self):
+        _, small = self.allocate(AddressPool(), 1000)
+
+        pool = AddressPool()
+        addresses, large = self.allocate(pool, 10000)
+        assert len(addresses) == 10000
+        assert pool.allocate() == "172.31.39.17/16"
+
+        # linear (not quadratic) in the allocated addresses
+        assert large < max(small, 0.01) * 10 * 3
+
+    def test_build_environments(self):
+        topo = Topology("test", "test")
+        topo.add_node("s1", "switch", "switch", environment="env1")
+        topo.add_node("s2", "switch", "switch", environment="env2")
+        topo.add_node("peer0", "container", "nodes", environment="env1")
+        topo.add_node("peer1", "container", "nodes", environment="env2")
+        topo.add_link_nodes("peer0", "s1", "internal", "links")
+        topo.add_link_nodes("s2", "peer1", "internal", "links")
+        topo.add_link_nodes("s1", "s2", "external", "links")
+
+        envs = topo.build_environments()
+        assert set(envs["env1"]["nodes"]) == {"s1", "peer0"}
+        assert set(envs["env1"]["links"]) == {"s1-peer0", "s1-s2"}
+        assert set(envs["env2"]["nodes"]) == {"s2", "peer1"}
+        assert set(envs["env2"]["links"]) == {"s2-peer1", "s2-s1"}
+
+    def test_build_profile_lookup(self):
+        topo = Topology("test", "test")
+        topo.add_node("peer0", "container", "nodes")
+        topo.add_node_profile(topo.create_node_profile(1, 512, None), profile="nodes")
+        topo.add_node_profile(topo.create_node_profile(2, 1024, None), profile="nodes")
+
+        workflow = topo.create_node_lifecycle("setup", {}, "run", "container")
+        topo.add_node_lifecycle([workflow], "peer0")
+
+        node = topo.build()["nodes"]["peer0"]
+        assert node["resources"]["cpus"] == 2
+        assert node["lifecycle"] == [workflow]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,74 @@
+import json
+import logging
+import unittest
+
+from umbra.design.basis import Events
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestDesignEvents(unittest.TestCase):
+    def build_events(self):
+        events = Events()
+        events.add({"from": 0.5}, "fabric", {"action": "info_channels"})
+        events.add_generator(
+            {"from": 1},
+            "fabric",
+            template={
+                "action": "chaincode_invoke",
+                "chaincode_args": ["move", "{src}", "{dst}", "{amount}"],
+            },
+            params={
+                "src": {"type": "choice", "values": ["a", "b", "c"]},
+                "dst": {"type": "choice", "values": ["d", "e"]},
+                "amount": {"type": "randint", "min": 1, "max": 100},
+                "seq": {"type": "sequence", "start": 10, "step": 2},
+            },
+            count=1000,
+            rate=100,
+            arrival="poisson",
+            seed=7,
+        )
+        events.add({"from": 3}, "fabric", {"action": "info_channel"})
+        return events
+
+    def test_events_generator(self):
+        events = self.build_events()
+        data = json.loads(json.dumps(events.build()))
+        assert len(data) == 3
+
+        parsed = Events()
+        parsed.parse(data)
+        expanded = list(parsed.expand(parsed.get_by_category("fabric")))
+        assert len(expanded) == 1002
+
+        begins = [event["schedule"]["from"] for event in expanded]
+        assert begins == sorted(begins)
+        assert expanded[0]["event"]["action"] == "info_channels"
+
+        generated = [event for event in expanded if isinstance(event["id"], str)]
+        assert len(generated) == 1000
+        assert generated[0]["id"] == "2-0"
+        assert generated[0]["schedule"]["from"] == 1
+        assert generated[3]["event"]["seq"] == 16
+
+        args = generated[0]["event"]["chaincode_args"]
+        assert args[1] in ["a", "b", "c"] and args[2] in ["d", "e"]
+        assert args[3] == str(generated[0]["event"]["amount"])
+
+        again = list(parsed.expand(parsed.get_by_category("fabric")))
+        assert again == expanded
+
+    def test_events_generator_invalid(self):
+        events = Events()
+        events.add_generator(
+            {}, "fabric", {}, {"x": {"type": "normal"}}, count=10, rate=1
+        )
+        events.add_generator({}, "fabric", {}, {}, count=10, rate=0)
+        assert events.build() == {}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import logging
+import unittest
+import tempfile
+
+from umbra.design.fabric import FabricTopology
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestDesignFabric(unittest.TestCase):
+    def test_artifacts_cache(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cache_dir = os.path.join(folder, "cache")
+            settings = os.path.join(folder, "settings")
+            os.makedirs(os.path.join(settings, "peerOrganizations", "org1"))
+
+            fab_topo = FabricTopology("test", clear_dir=False, cache_dir=cache_dir)
+            fab_topo.settings = settings
+
+            with open(os.path.join(settings, "channel.tx"), "w") as outfile:
+                outfile.write("tx")
+            with open(
+                os.path.join(settings, "peerOrganizations", "org1", "ca"), "w"
+            ) as outfile:
+                outfile.write("ca")
+
+            key = fab_topo._cache_key({"orgs": ["org1"]}, settings)
+            assert key == fab_topo._cache_key({"orgs": ["org1"]}, settings)
+            assert key != fab_topo._cache_key({"orgs": ["org2"]}, settings)
+
+            assert not fab_topo._cache_load(key, ["channel.tx", "peerOrganizations"])
+            fab_topo._cache_save(key, ["channel.tx", "peerOrganizations"])
+
+            os.remove(os.path.join(settings, "channel.tx"))
+            os.remove(os.path.join(settings, "peerOrganizations", "org1", "ca"))
+
+            assert fab_topo._cache_load(key, ["channel.tx", "peerOrganizations"])
+            assert os.path.isfile(os.path.join(settings, "channel.tx"))
+            assert os.path.isfile(
+                os.path.join(settings, "peerOrganizations", "org1", "ca")
+            )
+
+    def test_base_profile_and_write_file(self):
+        fab_topo = FabricTopology("test", clear_dir=False, cache_dir=None)
+
+        template = fab_topo._load_base_profile("orderer-base")
+        template["volumes"].append("changed")
+        assert "changed" not in fab_topo._load_base_profile("orderer-base")["volumes"]
+
+        with tempfile.TemporaryDirectory() as folder:
+            filepath = os.path.join(folder, "crypto-config.yaml")
+            data = {"OrdererOrgs": [{"Name": "orderer"}], "PeerOrgs": []}
+
+            fab_topo.write_file(data, filepath)
+            assert fab_topo.read_file(filepath) == data
+
+            os.utime(filepath, (0, 0))
+            fab_topo.write_file(data, filepath)
+            assert os.path.getmtime(filepath) == 0
+
+            data["PeerOrgs"].append({"Name": "org1"})
+            fab_topo.write_file(data, filepath)
+            assert os.path.getmtime(filepath) > 0
+            assert fab_topo.read_file(filepath) == data
+
+    def test_call_all(self):
+        fab_topo = FabricTopology("test", clear_dir=False, cache_dir=None)
+        outputs = fab_topo._call_all([["echo", "a"], ["false"], ["/nonexistent/cmd"]])
+
+        assert outputs[0] == (0, b"a\n")
+        assert outputs[1][0] != 0
+        assert outputs[2][0] == -1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import logging
+import unittest
+import tempfile
+
+from umbra.design.iroha import IrohaTopology
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestDesignIroha(unittest.TestCase):
+    def test_keys_cache(self):
+        with tempfile.TemporaryDirectory() as folder:
+            keys_cache = os.path.join(folder, "keys.json")
+
+            iroha_topo = IrohaTopology("test", clear_dir=False, keys_cache=keys_cache)
+            keys = iroha_topo._format_node_keys("node1.umbra")
+            assert keys == iroha_topo._format_node_keys("node1.umbra")
+            assert keys != iroha_topo._format_node_keys("node2.umbra")
+
+            iroha_topo._save_keys()
+            assert os.path.isfile(keys_cache)
+            assert os.stat(keys_cache).st_mode & 0o777 == 0o600
+
+            rerun_topo = IrohaTopology("test", clear_dir=False, keys_cache=keys_cache)
+            assert rerun_topo._admin == iroha_topo._admin
+            assert rerun_topo._format_node_keys("node1.umbra") == keys
+
+    def test_keys_seed(self):
+        topo_a = IrohaTopology("test", clear_dir=False, keys_cache=None, keys_seed=1)
+        topo_b = IrohaTopology("test", clear_dir=False, keys_cache=None, keys_seed=1)
+        topo_c = IrohaTopology("test", clear_dir=False, keys_cache=None, keys_seed=2)
+
+        keys = topo_a._format_node_keys("node1.umbra")
+        assert keys == topo_b._format_node_keys("node1.umbra")
+        assert keys != topo_c._format_node_keys("node1.umbra")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
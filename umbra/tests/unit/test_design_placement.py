@@ -0,0 +1,72 @@
+import logging
+import unittest
+
+from umbra.design.basis import Topology
+from umbra.design.placement import Placement
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestDesignPlacement(unittest.TestCase):
+    def test_plan_clusters(self):
+        placement = Placement(["env1", "env2"])
+
+        for name in ["a1", "a2", "a3", "b1", "b2", "b3"]:
+            placement.add_group(name, {"cpus": 2, "memory": 1024})
+
+        for src, dst in [("a1", "a2"), ("a2", "a3"), ("a1", "a3")]:
+            placement.add_traffic(src, dst, 10)
+        for src, dst in [("b1", "b2"), ("b2", "b3"), ("b1", "b3")]:
+            placement.add_traffic(src, dst, 10)
+        placement.add_traffic("a3", "b1", 1)
+
+        assignment, report = placement.plan()
+
+        assert assignment["a1"] == assignment["a2"] == assignment["a3"]
+        assert assignment["b1"] == assignment["b2"] == assignment["b3"]
+        assert assignment["a1"] != assignment["b1"]
+        assert report["tunnels"] == 1
+        assert report["traffic"] == {"total": 61.0, "tunneled": 1.0}
+        assert report["environments"]["env1"]["load"]["cpus"] == 6
+
+    def test_plan_capacities_and_pinned(self):
+        capacities = {"env1": {"cpus": 6, "memory": 6000}, "env2": {"cpus": 2}}
+        placement = Placement(["env1", "env2"], capacities=capacities)
+
+        placement.add_group("s0", {"cpus": 1}, environment="env2")
+        for index in range(1, 8):
+            placement.add_group(f"s{index}", {"cpus": 1})
+            placement.add_traffic(f"s{index - 1}", f"s{index}")
+
+        assignment, report = placement.plan()
+
+        assert assignment["s0"] == "env2"
+        assert report["environments"]["env1"]["load"]["cpus"] == 6
+        assert report["environments"]["env2"]["load"]["cpus"] == 2
+        assert not report["environments"]["env1"]["overcommitted"]
+
+    def test_from_topology(self):
+        topo = Topology("test", "test")
+        topo.add_node("s1", "switch", None)
+        topo.add_node("s2", "switch", None)
+        for name, switch in [("peer0", "s1"), ("peer1", "s1"), ("peer2", "s2")]:
+            topo.add_node(name, "container", "nodes")
+            topo.add_link_nodes(name, switch, "internal", "links")
+        topo.add_link_nodes("s1", "s2", "internal", "links")
+
+        topo.add_node_profile(topo.create_node_profile(2, 1024, None), profile="nodes")
+        topo.add_link_profile(topo.create_link_profile(100, 1, 0), profile="links")
+
+        placement = Placement.from_topology(topo, ["env1"])
+        assert placement.groups["s1"]["resources"] == {"cpus": 4.0, "memory": 2048.0}
+        assert placement.traffic["s1"]["s2"] == 100
+
+        assignment, report = placement.plan()
+        assert assignment == {"s1": "env1", "s2": "env1"}
+        assert report["tunnels"] == 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
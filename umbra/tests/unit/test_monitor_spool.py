@@ -0,0 +1,131 @@
+import os
+import logging
+import unittest
+import asyncio
+import tempfile
+import threading
+from unittest import mock
+
+from umbra.monitor.spool import Spool, Outbox
+
+
+logger = logging.getLogger(__name__)
+
+
+class FlakyOutbox(Outbox):
+    def __init__(self, spool):
+        Outbox.__init__(
+            self, "test", replay_rate=1000, retry_interval=0.01, spool=spool
+        )
+        self.online = False
+        self.sent = []
+
+    async def send(self, address, message):
+        if self.online:
+            self.sent.append(message.get("seq"))
+        return self.online
+
+
+class TestMonitorSpool(unittest.TestCase):
+    def test_spool_append_read_commit(self):
+        with tempfile.TemporaryDirectory() as folder:
+            spool = Spool(folder, max_bytes=4096, segments=4)
+            assert spool.empty()
+
+            for seq in range(100):
+                spool.append({"seq": seq})
+
+            records = spool.read(1000)
+            assert [record.get("seq") for record, _ in records] == list(range(100))
+
+            _, position = records[49]
+            spool.commit(position)
+            spool.close()
+
+            recovered = Spool(folder, max_bytes=4096, segments=4)
+            records = recovered.read(1000)
+            assert [record.get("seq") for record, _ in records] == list(range(50, 100))
+
+            _, position = records[-1]
+            recovered.commit(position)
+            assert recovered.empty()
+
+    def test_spool_read_batches(self):
+        with tempfile.TemporaryDirectory() as folder:
+            spool = Spool(folder, max_bytes=1024 * 1024, segments=1)
+
+            for seq in range(100):
+                spool.append({"seq": seq})
+            # a partial (not flushed yet) record at the segment end
+            spool._writer.write(b'{"seq": 1')
+
+            seqs = []
+            while not spool.empty():
+                records = spool.read(10)
+                assert len(records) == 10
+                seqs.extend(record.get("seq") for record, _ in records)
+                spool.commit(records[-1][1])
+
+            assert seqs == list(range(100))
+
+    def test_spool_bound(self):
+        with tempfile.TemporaryDirectory() as folder:
+            spool = Spool(folder, max_bytes=2048, segments=4)
+
+            for seq in range(1000):
+                spool.append({"seq": seq})
+
+            records = spool.read(1000)
+            assert spool.dropped() > 0
+            assert len(records) + spool.dropped() == 1000
+            assert records[-1][0].get("seq") == 999
+
+    async def append_in_loop(self, spool):
+        for seq in range(10):
+            spool.append({"seq": seq})
+        await asyncio.sleep(0.1)
+
+    def test_spool_fsync_off_loop(self):
+        threads = []
+        fsync = os.fsync
+
+        def record_fsync(fd):
+            threads.append(threading.current_thread())
+            fsync(fd)
+
+        with tempfile.TemporaryDirectory() as folder:
+            spool = Spool(folder, fsync_batch=2)
+
+            with mock.patch("umbra.monitor.spool.os.fsync", record_fsync):
+                asyncio.run(self.append_in_loop(spool))
+
+            assert len(threads) == 5
+            assert threading.main_thread() not in threads
+            assert len(spool.read(100)) == 10
+
+    async def replay(self, outbox):
+        for seq in range(10):
+            outbox.put("127.0.0.1:8956", {"seq": seq})
+            await asyncio.sleep(0.001)
+
+        await asyncio.sleep(0.05)
+        outbox.online = True
+
+        for seq in range(10, 15):
+            outbox.put("127.0.0.1:8956", {"seq": seq})
+
+        await asyncio.sleep(0.2)
+        outbox.close()
+
+    def test_outbox_replay_in_order(self):
+        with tempfile.TemporaryDirectory() as folder:
+            outbox = FlakyOutbox(Spool(folder))
+            asyncio.run(self.replay(outbox))
+
+            assert outbox.sent == list(range(15))
+            assert outbox.spool.empty()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import logging
+import unittest
+import tempfile
+
+from umbra.scenario.cpusets import (
+    CpuSets,
+    host_cores,
+    parse_cpulist,
+    format_cpulist,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestScenarioCpuSets(unittest.TestCase):
+    def test_cpulist(self):
+        assert parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+        assert format_cpulist([11, 0, 1, 2, 3, 8, 10]) == "0-3,8,10-11"
+        assert format_cpulist([]) == ""
+
+    def test_allocate_numa(self):
+        numa = {0: list(range(0, 8)), 1: list(range(8, 16))}
+        cpusets = CpuSets(cores=range(16), numa=numa, reserved=2)
+
+        assert cpusets.reserved == [0, 1]
+        assert cpusets.allocate("peer0", 4) == "2-5"
+        assert cpusets.allocate("peer1", 2.5) == "8-10"
+        assert cpusets.allocate("peer2", 4) == "11-14"
+        assert cpusets.allocate("peer3", 4) is None
+        assert cpusets.allocate("peer3", 3) == "6-7,15"
+
+        cpusets.release("peer0")
+        assert cpusets.allocate("peer4", 1) == "2"
+
+    def test_resize(self):
+        cpusets = CpuSets(cores=range(8), numa=False, reserved=1)
+
+        assert cpusets.allocate("peer0", 2) == "1-2"
+        assert cpusets.allocate("peer1", 2) == "3-4"
+        assert cpusets.resize("peer0", 3) == "1-2,5"
+        assert cpusets.resize("peer0", 1) == "1"
+        assert cpusets.resize("peer1", 10) == "3-4"
+        assert cpusets.get("peer1") == "3-4"
+
+    def test_from_settings(self):
+        assert CpuSets.from_settings(None) is None
+
+        cpusets = CpuSets.from_settings({"cores": "0-3", "numa": False})
+        assert cpusets.reserved == [0, 1]
+        assert cpusets.allocate("peer0", 1) == "2"
+
+    def test_host_cores(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "online")
+            with open(path, "w") as f:
+                f.write("0-3,6\n")
+            assert host_cores(path) == [0, 1, 2, 3, 6]
+
+            missing = os.path.join(folder, "missing")
+            assert host_cores(missing) == list(range(os.cpu_count()))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
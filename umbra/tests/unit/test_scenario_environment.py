@@ -0,0 +1,107 @@
+import logging
+import unittest
+from unittest import mock
+
+from umbra.scenario.environment import Environment, EnvironmentParser
+from umbra.scenario.cpusets import CpuSets
+
+
+logger = logging.getLogger(__name__)
+
+
+class FakeNet:
+    def __init__(self, calls, error=None):
+        self.calls = calls
+        self.error = error
+
+    def stop(self):
+        self.calls.append("stop")
+        if self.error:
+            raise self.error
+
+
+class TestScenarioEnvironment(unittest.TestCase):
+    def stop(self, error=None, removed=True):
+        calls = []
+        env = Environment({"nodes": {"peer0": {"name": "peer0", "type": "container"}}})
+        env.net = FakeNet(calls, error)
+        env.topo_key = "abc"
+
+        def remove_docker_containers(key=None, names=None):
+            calls.append(("remove", key, names))
+            return removed
+
+        with mock.patch.object(
+            env, "remove_docker_containers", side_effect=remove_docker_containers
+        ), mock.patch.object(env, "remove_docker_network"), mock.patch.object(
+            env, "prune_docker_volumes"
+        ):
+            ack, info = env.stop()
+
+        return calls, ack, info, env
+
+    def test_stop(self):
+        calls, ack, info, env = self.stop()
+
+        assert calls == ["stop", ("remove", "abc", ["peer0"])]
+        assert ack is True and info == {}
+        assert env.net is None and env.nodes == {}
+
+    def test_stop_errors(self):
+        calls, ack, info, _ = self.stop(error=RuntimeError("veth"))
+        assert calls == ["stop", ("remove", "abc", ["peer0"])]
+        assert ack is False and "Network" in info
+
+        calls, ack, info, _ = self.stop(removed=False)
+        assert ack is False and "containers" in info
+
+    def test_start_twice_cpusets(self):
+        # the first start pins the (long-lived) worker process to the
+        # reserved cores, the next ones must still see all host cores
+        affinity = {0, 1, 2, 3}
+
+        def pin_processes(cpusets, names=None):
+            affinity.intersection_update(cpusets.reserved)
+            return []
+
+        steps = [
+            "restore",
+            "create_docker_network",
+            "_create_network",
+            "_add_nodes",
+            "_add_switches",
+            "_add_links",
+            "_start_network",
+            "_add_tun_links",
+            "parse_info",
+            "net_topo_info",
+        ]
+        topo = {"nodes": {}, "cpusets": {"reserved": 1, "numa": False}}
+
+        with mock.patch(
+            "umbra.scenario.cpusets.host_cores", return_value=[0, 1, 2, 3]
+        ), mock.patch(
+            "umbra.scenario.cpusets.os.sched_getaffinity",
+            side_effect=lambda pid: set(affinity),
+        ), mock.patch.object(
+            CpuSets, "pin_processes", autospec=True, side_effect=pin_processes
+        ), mock.patch.object(
+            EnvironmentParser, "build", autospec=True, side_effect=lambda p, t: t
+        ), mock.patch.multiple(
+            Environment, **dict.fromkeys(steps, mock.DEFAULT)
+        ):
+            for _ in range(2):
+                env = Environment(dict(topo))
+                env.net = mock.Mock()
+                ack, _ = env.start()
+
+                assert ack
+                assert env.cpusets.reserved == [0]
+                assert env.cpusets.free == {1, 2, 3}
+
+        assert affinity == {0}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,62 @@
+import logging
+import unittest
+import asyncio
+
+from grpclib.server import Server
+
+from umbra.scenario.probes import Probes
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestScenarioProbes(unittest.TestCase):
+    async def probes(self):
+        async def accept(reader, writer):
+            writer.close()
+
+        tcp_server = await asyncio.start_server(accept, "127.0.0.1", 0)
+        tcp_port = tcp_server.sockets[0].getsockname()[1]
+
+        grpc_server = Server([])
+        await grpc_server.start("127.0.0.1", 0)
+        grpc_port = grpc_server._server.sockets[0].getsockname()[1]
+
+        nodes = {
+            "peer0": {
+                "name": "peer0",
+                "port_bindings": {"7051": tcp_port},
+                "probes": [{"type": "tcp", "port": 7051}],
+            },
+            "node0": {
+                "name": "node0",
+                "probes": [{"type": "grpc", "port": grpc_port}],
+            },
+            "switch": {"name": "switch"},
+        }
+
+        ok, info = await Probes(nodes).check(timeout=1, interval=0.1)
+        assert ok
+        assert set(info.keys()) == {"peer0", "node0"}
+        assert info["peer0"]["attempts"] == 1
+
+        tcp_server.close()
+        await tcp_server.wait_closed()
+
+        ok, info = await Probes(nodes).check(timeout=0.3, interval=0.1)
+        assert not ok
+        assert info["node0"]["ready"]
+        assert not info["peer0"]["ready"]
+        assert info["peer0"]["attempts"] > 1
+        assert info["peer0"]["error"]
+
+        grpc_server.close()
+        await grpc_server.wait_closed()
+
+    def test_probes(self):
+        asyncio.run(self.probes())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
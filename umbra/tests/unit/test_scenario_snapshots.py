@@ -0,0 +1,111 @@
+import os
+import json
+import logging
+import unittest
+import tempfile
+
+import docker
+
+from umbra.scenario.snapshots import Snapshots, topology_key, SNAPSHOTS_MANIFEST
+from umbra.design.basis import Experiment
+
+
+logger = logging.getLogger(__name__)
+
+
+class FakeContainer:
+    def __init__(self, name):
+        self.name = name
+        self.attrs = {"Mounts": [{"Type": "volume", "Destination": "/data"}]}
+        self.committed = None
+
+    def commit(self, repository=None, tag=None):
+        self.committed = (repository, tag)
+
+    def get_archive(self, path):
+        return [self.name.encode()], {}
+
+
+class FakeContainers:
+    def __init__(self, containers):
+        self.containers = {c.name: c for c in containers}
+
+    def get(self, name):
+        if name not in self.containers:
+            raise docker.errors.NotFound(name)
+        return self.containers[name]
+
+
+class FakeClient:
+    def __init__(self, containers):
+        self.containers = FakeContainers(containers)
+
+
+class TestScenarioSnapshots(unittest.TestCase):
+    def test_topology_key(self):
+        topo = {"nodes": {"peer0": {"image": "hyperledger/fabric-peer"}}, "links": {}}
+        key = topology_key(topo)
+
+        assert key == topology_key(dict(topo, snapshot={"restore": "setup"}))
+        assert key != topology_key({"nodes": {}, "links": {}})
+
+    def test_available_and_mount(self):
+        with tempfile.TemporaryDirectory() as folder:
+            snapshots = Snapshots(folder=folder)
+            path = os.path.join(folder, "abc", "channel")
+            os.makedirs(path)
+
+            assert snapshots.available("abc", ["channel", "chaincode"]) == []
+
+            with open(os.path.join(path, SNAPSHOTS_MANIFEST), "w") as outfile:
+                json.dump({"key": "abc", "phase": "channel", "nodes": {}}, outfile)
+
+            assert snapshots.available("abc", ["channel", "chaincode"]) == ["channel"]
+
+            ok, error = snapshots.restore("abc", "chaincode", {})
+            assert not ok and error
+
+            volumes = [
+                "/var/run/:/host/var/run/:rw",
+                "peer0.org1:/var/hyperledger/production:rw",
+            ]
+            mounted = snapshots._mount(
+                volumes, "snap-0", "/var/hyperledger/production/"
+            )
+            assert mounted == [
+                "/var/run/:/host/var/run/:rw",
+                "snap-0:/var/hyperledger/production/:rw",
+            ]
+
+    def test_save_node_names(self):
+        # containernet containers are named mn.<node>, others <node>
+        containers = [FakeContainer("mn.peer0"), FakeContainer("orderer")]
+
+        with tempfile.TemporaryDirectory() as folder:
+            snapshots = Snapshots(folder=folder)
+            snapshots._docker_client = FakeClient(containers)
+
+            ok, error = snapshots.save("abc", "channel", ["peer0", "orderer"])
+            assert ok and error is None
+            assert all(container.committed for container in containers)
+
+            ok, error = snapshots.save("abc", "channel", ["peer1"])
+            assert not ok and "peer1" in error
+
+    def test_experiment_snapshot(self):
+        exp = Experiment("test")
+        ev_channel = exp.add_event({"from": 1}, "fabric", {"action": "create_channel"})
+        ev_join = exp.add_event({"from": 2}, "fabric", {"action": "join_channel"})
+
+        ev_snapshot = exp.snapshot("channel", [ev_channel, ev_join])
+
+        event = exp.events.get().get(ev_snapshot)
+        assert event["category"] == "scenario"
+        assert event["event"] == {"group": "snapshot", "phase": "channel"}
+        assert event["schedule"]["after"] == [ev_channel, ev_join]
+        assert exp.snapshots[0]["event"] == ev_snapshot
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,115 @@
+import time
+import logging
+import unittest
+
+import docker
+
+from umbra.scenario.teardown import (
+    Teardown,
+    TEARDOWN_LABEL,
+    TEARDOWN_CONTAINERNET_LABEL,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class FakeContainer:
+    def __init__(self, name, labels=None, error=None):
+        self.name = name
+        self.labels = labels if labels else {}
+        self.error = error
+        self.removed = None
+
+    def remove(self, force=False, v=False):
+        time.sleep(0.1)
+        if self.error:
+            raise self.error
+        self.removed = (force, v)
+
+
+class FakeContainers:
+    def __init__(self, containers):
+        self.containers = containers
+
+    def get(self, name):
+        for container in self.containers:
+            if container.name == name:
+                return container
+        raise docker.errors.NotFound(name)
+
+    def list(self, all=False, filters=None):
+        label = (filters or {}).get("label")
+        if not label:
+            return self.containers
+
+        key, _, value = label.partition("=")
+        return [
+            c
+            for c in self.containers
+            if key in c.labels and (not value or c.labels[key] == value)
+        ]
+
+
+class FakeClient:
+    def __init__(self, containers):
+        self.containers = FakeContainers(containers)
+
+
+class TestScenarioTeardown(unittest.TestCase):
+    def test_select(self):
+        containers = [
+            FakeContainer("peer0", {TEARDOWN_LABEL: "abc"}),
+            FakeContainer("peer1", {TEARDOWN_LABEL: "def"}),
+            FakeContainer("dev-peer0-mycc"),
+            FakeContainer("other"),
+        ]
+        teardown = Teardown(FakeClient(containers))
+
+        names = [c.name for c in teardown.select()]
+        assert sorted(names) == ["dev-peer0-mycc", "peer0", "peer1"]
+
+        names = [c.name for c in teardown.select("abc", patterns=[])]
+        assert names == ["peer0"]
+
+    def test_select_containernet(self):
+        # containers created by an addDocker that drops the umbra label
+        containers = [
+            FakeContainer("mn.peer0", {TEARDOWN_CONTAINERNET_LABEL: ""}),
+            FakeContainer("mn.peer1", {TEARDOWN_CONTAINERNET_LABEL: ""}),
+            FakeContainer("peer0"),
+            FakeContainer("orderer"),
+        ]
+        teardown = Teardown(FakeClient(containers))
+
+        selected = teardown.select("abc", names=["peer0", "orderer", "peer2"])
+        assert sorted(c.name for c in selected) == ["mn.peer0", "orderer"]
+
+        names = [c.name for c in teardown.select()]
+        assert sorted(names) == ["mn.peer0", "mn.peer1"]
+
+    def test_remove_concurrent(self):
+        containers = [
+            FakeContainer(f"peer{i}", {TEARDOWN_LABEL: "abc"}) for i in range(20)
+        ]
+        containers.append(
+            FakeContainer("peer20", {TEARDOWN_LABEL: "abc"}, docker.errors.APIError(""))
+        )
+        containers.append(
+            FakeContainer("peer21", {TEARDOWN_LABEL: "abc"}, docker.errors.NotFound(""))
+        )
+        teardown = Teardown(FakeClient(containers), workers=22)
+
+        start = time.time()
+        removed = teardown.run()
+        assert time.time() - start < 1.0
+
+        assert len(removed) == 22
+        assert removed["peer0"] and removed["peer21"]
+        assert not removed["peer20"]
+        assert containers[0].removed == (True, True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,64 @@
+import time
+import logging
+import unittest
+import asyncio
+
+from umbra.scenario.timeline import Timeline, triggers
+
+
+logger = logging.getLogger(__name__)
+
+
+class TestScenarioTimeline(unittest.TestCase):
+    def test_triggers(self):
+        assert triggers(100.0, {"from": 2}) == [102.0]
+        assert triggers(100.0, {"from": 1, "repeat": 3, "interval": 2}) == [
+            101.0,
+            103.0,
+            105.0,
+        ]
+        assert triggers(0, {"repeat": 10, "interval": 1, "until": 3}) == [0, 1, 2]
+
+    async def run_timeline(self, timeline, start):
+        events = [
+            {"id": 2, "at": start + 0.2, "event": {"target": "b"}},
+            {"id": 1, "at": start + 0.1, "event": {"target": "a"}},
+            {"id": 3, "at": start + 0.1, "event": {"target": "fail"}},
+        ]
+        assert timeline.schedule(events) == 3
+        assert timeline.pending() == 3
+        await asyncio.sleep(0.4)
+
+    def test_timeline_execution(self):
+        executed = []
+
+        def call(event):
+            executed.append(event.get("target"))
+            if event.get("target") == "fail":
+                raise Exception("update failed")
+            return True, {}
+
+        timeline = Timeline(call)
+        start = time.time()
+        asyncio.run(self.run_timeline(timeline, start))
+
+        assert sorted(executed[:2]) == ["a", "fail"]
+        assert executed[2] == "b"
+        assert timeline.pending() == 0
+
+        records = timeline.executed()
+        assert [record["seq"] for record in records] == [1, 2, 3]
+
+        outcomes = {record["id"]: record["outcome"] for record in records}
+        assert outcomes == {1: "ok", 2: "ok", 3: "error"}
+
+        for record in records:
+            assert record["started"] >= record["scheduled"]
+            assert record["started"] - record["scheduled"] < 50
+
+        assert [record["id"] for record in timeline.executed(since=2)] == [2]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
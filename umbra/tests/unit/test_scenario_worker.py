@@ -0,0 +1,104 @@
+import time
+import queue
+import logging
+import unittest
+import asyncio
+import threading
+
+from umbra.scenario.main import Playground, PlaygroundWorker
+
+
+logger = logging.getLogger(__name__)
+
+
+class SlowPlayground(Playground):
+    async def ready(self, options):
+        await asyncio.sleep(1.0)
+        return {"ok": "True", "msg": {"info": {}, "error": ""}}
+
+    def update_event(self, event):
+        self.updated.append(time.time())
+        return True, {}
+
+
+class FakeProcess:
+    def __init__(self, in_queue, out_queue):
+        self.pid = 0
+        self.alive = True
+        self.thread = threading.Thread(
+            target=self.run, args=(in_queue, out_queue), daemon=True
+        )
+        self.thread.start()
+
+    def run(self, in_queue, out_queue):
+        while True:
+            message = in_queue.get()
+            if message is None:
+                break
+            reply = {"ok": "True", "msg": {"info": {}, "error": ""}}
+            out_queue.put({"type": "reply", "id": message.get("id"), "reply": reply})
+
+    def is_alive(self):
+        return self.alive
+
+
+class FakeWorker(PlaygroundWorker):
+    def _start(self):
+        self.in_queue, self.out_queue = queue.Queue(), queue.Queue()
+        self.process = FakeProcess(self.in_queue, self.out_queue)
+
+
+class TestScenarioWorker(unittest.TestCase):
+    def test_concurrent_actions(self):
+        in_queue, out_queue = queue.Queue(), queue.Queue()
+        playground = SlowPlayground(in_queue, out_queue)
+        playground.updated = []
+
+        worker = threading.Thread(target=asyncio.run, args=(playground.run(),))
+        worker.start()
+
+        start = time.time()
+        timeline = {"events": [{"id": 1, "at": start + 0.3, "event": {}}]}
+        in_queue.put({"id": 1, "action": "ready", "scenario": {"timeout": 1}})
+        in_queue.put({"id": 2, "action": "schedule", "scenario": timeline})
+        in_queue.put({"id": 3, "action": "executed", "scenario": {}})
+
+        replies = []
+        while len(replies) < 3:
+            message = out_queue.get(timeout=5)
+            if message.get("type") == "reply":
+                replies.append((message.get("id"), time.time() - start))
+
+        in_queue.put(None)
+        worker.join(5)
+
+        order = [uid for uid, _ in replies]
+        assert order.index(2) < order.index(1)
+        assert order.index(3) < order.index(1)
+        assert dict(replies)[2] < 0.5
+
+        assert len(playground.updated) == 1
+        assert playground.updated[0] - start < 0.8
+
+    async def restarted(self, worker):
+        first = await worker.call("stats", {})
+
+        # the worker process exits while the reader waits on its queue
+        worker.process.alive = False
+        worker.in_queue.put(None)
+        second = await worker.call("stats", {})
+
+        worker.in_queue.put(None)
+        return first, second
+
+    def test_worker_restarted(self):
+        worker = FakeWorker()
+        first, second = asyncio.run(asyncio.wait_for(self.restarted(worker), timeout=3))
+
+        assert first.get("ok") == "True"
+        assert second.get("ok") == "True"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()